@@ -0,0 +1,59 @@
+import sys
+
+import job_waiter
+from group_commit import GroupCommitter
+from storage_backend import SQLiteBackend
+
+
+class AckWriter:
+    """Batch job completions/failures from all worker threads into shared commits.
+
+    With ``durable=True`` each ack blocks until the transaction containing it
+    has committed, so a job is never reported done before it is on disk.
+    With ``durable=False`` acks return immediately; a crash can lose the last
+    few milliseconds of acks, leaving those jobs in 'processing'. As nobody
+    waits on them, a batch that fails to commit is retried one ack at a time
+    and whatever still fails is reported on stderr.
+    """
+
+    def __init__(self, db_path=None, max_batch=256, max_wait=0.005, durable=True, backend=None):
+        self.backend = backend or SQLiteBackend(db_path)
+        self.durable = durable
+        self.committer = GroupCommitter(self._apply, max_batch=max_batch, max_wait=max_wait, name='ack-writer')
+
+    def _apply(self, acks):
+        try:
+            results = self.backend.apply_acks(acks)
+        except Exception as e:
+            if self.durable:
+                # raised to every worker waiting on the batch
+                raise
+            results = self._apply_each(acks, e)
+        # only now is the new state visible to `enqueue --wait` callers
+        job_waiter.notify([a['job_id'] for a in acks])
+        return results
+
+    def _apply_each(self, acks, error):
+        print(f'Ack batch of {len(acks)} failed ({error}); retrying one by one', file=sys.stderr)
+        results = []
+        for ack in acks:
+            try:
+                results.extend(self.backend.apply_acks([ack]))
+            except Exception as e:
+                print(f"Ack for job {ack['job_id']} failed: {e}; it stays processing", file=sys.stderr)
+                results.append(str(e))
+        return results
+
+    def completed(self, job_id, result=None):
+        self.committer.submit({'op': 'completed', 'job_id': job_id, 'result': result}, wait=self.durable)
+
+    def failed(self, job_id, attempts, max_retries, backoff_base=2, delay=None, retryable=True, result=None):
+        self.committer.submit({
+            'op': 'failed', 'job_id': job_id, 'attempts': attempts,
+            'max_retries': max_retries, 'backoff_base': backoff_base,
+            'delay': delay, 'retryable': retryable, 'result': result,
+        }, wait=self.durable)
+
+    def close(self):
+        """Flush outstanding acks."""
+        self.committer.close()
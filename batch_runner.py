@@ -0,0 +1,150 @@
+"""Micro-batched execution of batchable jobs (``enqueue --batchable``).
+
+For thousands of tiny commands most of a job's cost is the overhead around
+it: a claim transaction, a fresh shell, a log write and an ack. A worker
+started with ``worker-run --batch-size N`` claims up to N runnable batchable
+jobs in one transaction and feeds them, one after another, to a long-lived
+``/bin/sh`` reading commands from its stdin; the batch is then logged with
+one index transaction and acked with one commit.
+
+Each command runs in a subshell of its own, so ``exit``, ``cd`` or variable
+assignments do not leak into the next job, with stdin from /dev/null and
+stdout/stderr redirected to scratch files. After it the shell prints a
+delimiter line carrying a random per-job token and the exit status, so exit
+codes, output, results and retry accounting stay per job. A command still
+running after its timeout is stopped together with the shell (its whole
+process group: SIGTERM, then SIGKILL after ``job_kill_grace``) and exits
+with TIMEOUT_EXIT_CODE like any timed-out job; the rest of the batch
+continues in a fresh shell.
+
+Batchable jobs cannot carry cpus/memory_mb requests: a batch runs one
+command at a time in one shell, outside the worker's resource pool. POSIX
+only; elsewhere ``--batch-size`` is ignored and batchable jobs run one by one.
+"""
+import os
+import secrets
+import select
+import shlex
+import shutil
+import signal
+import subprocess
+import tempfile
+import time
+
+
+SHELL = '/bin/sh'
+
+# exit code recorded for a job stopped at its timeout, here and in
+# worker-run's one-by-one runs (the convention of coreutils' timeout(1))
+TIMEOUT_EXIT_CODE = 124
+
+
+def supported():
+    return os.name == 'posix'
+
+
+class ShellRunner:
+    """A long-lived shell running commands one at a time; one per worker thread."""
+
+    def __init__(self, shell=SHELL):
+        self.shell = shell
+        # shells started so far (a timeout or a crashed shell needs a new one)
+        self.spawned = 0
+        # whether the last run was stopped at its timeout
+        self.timed_out = False
+        self._proc = None
+        self._buf = b''
+        self._dir = tempfile.mkdtemp(prefix='queuectl-batch-')
+        self._out = os.path.join(self._dir, 'out')
+        self._err = os.path.join(self._dir, 'err')
+
+    def _start(self):
+        self._proc = subprocess.Popen([self.shell], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                      stderr=subprocess.DEVNULL, start_new_session=True)
+        self._buf = b''
+        self.spawned += 1
+
+    def _kill(self, grace=0):
+        """Stop the shell's process group: SIGTERM first when given a ``grace`` period, then SIGKILL."""
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        if grace:
+            try:
+                os.killpg(proc.pid, signal.SIGTERM)
+                proc.wait(timeout=grace)
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        proc.wait()
+        proc.stdin.close()
+        proc.stdout.close()
+
+    def _read_status(self, token, timeout):
+        """Exit status reported after ``token``; None on timeout, EOFError if the shell died."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        marker = token.encode('ascii') + b' '
+        fd = self._proc.stdout.fileno()
+        while True:
+            while b'\n' in self._buf:
+                line, self._buf = self._buf.split(b'\n', 1)
+                if line.startswith(marker):
+                    return int(line[len(marker):])
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                return None
+            chunk = os.read(fd, 4096)
+            if not chunk:
+                raise EOFError
+            self._buf += chunk
+
+    def _take(self, path):
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.unlink(path)
+        except FileNotFoundError:
+            return ''
+        return data.decode('utf-8', 'replace')
+
+    def run(self, command, timeout=None, grace=5.0):
+        """Run ``command`` as ``sh -c`` would; returns (rc, stdout, stderr)."""
+        if self._proc is None or self._proc.poll() is not None:
+            self._start()
+        token = secrets.token_hex(8)
+        line = (f'( eval {shlex.quote(command)} ) </dev/null >{shlex.quote(self._out)} 2>{shlex.quote(self._err)}; '
+                f'echo "{token} $?"\n')
+        note = ''
+        self.timed_out = False
+        try:
+            self._proc.stdin.write(line.encode('utf-8'))
+            self._proc.stdin.flush()
+            rc = self._read_status(token, timeout)
+            if rc is None:
+                self._kill(grace)
+                self.timed_out = True
+                rc = TIMEOUT_EXIT_CODE
+                note = f'queuectl: timed out after {timeout:g}s\n'
+        except (OSError, EOFError):
+            # the command took the shell down with it (e.g. killed its parent)
+            self._kill()
+            rc = 1
+            note = 'batch shell exited while running the job\n'
+        return rc, self._take(self._out), self._take(self._err) + note
+
+    def close(self):
+        if self._proc is not None:
+            try:
+                self._proc.stdin.close()
+                self._proc.wait(timeout=1)
+                self._proc.stdout.close()
+                self._proc = None
+            except (OSError, subprocess.TimeoutExpired):
+                self._kill()
+        shutil.rmtree(self._dir, ignore_errors=True)
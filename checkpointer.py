@@ -0,0 +1,56 @@
+"""Background WAL checkpointing for worker-run.
+
+SQLite's automatic checkpoint (wal_autocheckpoint) runs inside whichever
+commit crosses the threshold and is PASSIVE: pages still visible to a
+long-running reader (an export, a backup, a slow status query) cannot be
+copied back, the log cannot restart, and under sustained load the -wal file
+keeps growing. A WalCheckpointer thread checkpoints PASSIVE every
+``wal_checkpoint_seconds`` so commits rarely pay for it, and once the file
+is over ``wal_max_bytes`` it runs a TRUNCATE checkpoint instead, which waits
+briefly for the old readers to finish and then shrinks the file to zero. A
+TRUNCATE that runs out of time is counted as busy and retried next round.
+"""
+import sqlite3
+import threading
+
+import job_storage as store
+
+
+class WalCheckpointer(threading.Thread):
+    """Keep the WAL of one DB small; one per worker-run process tree."""
+
+    def __init__(self, shutdown_event, interval=10.0, max_bytes=64 * 1024 * 1024, db_path=None):
+        super().__init__(name='wal-checkpointer', daemon=True)
+        self.shutdown_event = shutdown_event
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.db_path = db_path
+        self._stats = {'runs': 0, 'truncations': 0, 'busy': 0, 'errors': 0, 'frames': 0,
+                       'wal_bytes': 0, 'max_wal_bytes': 0}
+        self._lock = threading.Lock()
+
+    def run(self):
+        while not self.shutdown_event.wait(self.interval):
+            self.run_once()
+
+    def run_once(self):
+        size = store.wal_size(self.db_path)
+        mode = 'TRUNCATE' if size > self.max_bytes else 'PASSIVE'
+        try:
+            busy, _, done = store.checkpoint_wal(mode, db_path=self.db_path)
+        except sqlite3.Error:
+            with self._lock:
+                self._stats['errors'] += 1
+            return
+        with self._lock:
+            s = self._stats
+            s['runs'] += 1
+            s['frames'] += max(done, 0)
+            s['busy'] += busy
+            s['truncations'] += int(mode == 'TRUNCATE' and not busy)
+            s['wal_bytes'] = store.wal_size(self.db_path)
+            s['max_wal_bytes'] = max(s['max_wal_bytes'], size)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._stats)
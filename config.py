@@ -6,8 +6,46 @@ _CFG_PATH = os.path.join(os.getcwd(), 'queuectl_config.json')
 _DEFAULTS = {
     'max_retries': 3,
     'backoff_base': 2,
-    # default job timeout in seconds (0 or null means no timeout)
-    'job_timeout': 0
+    # retry n waits retry_factor * backoff_base ** n seconds, capped at
+    # retry_max_delay, with jitter 'none', 'full' or 'decorrelated'
+    'retry_factor': 1,
+    'retry_max_delay': 3600,
+    'retry_jitter': 'full',
+    # default job timeout in seconds (0 or null means no timeout); a timed-out
+    # job's process group gets SIGTERM, then SIGKILL job_kill_grace seconds later
+    'job_timeout': 0,
+    'job_kill_grace': 5,
+    # job log segments are rotated (and compressed) once they reach this size
+    'log_segment_bytes': 64 * 1024 * 1024,
+    # group-commit ack writer (worker-run --group-acks)
+    'ack_batch_size': 256,
+    'ack_batch_ms': 5,
+    # wait for the batch commit before a worker moves on to its next job
+    'ack_durable': True,
+    # recurring schedule fires later than this many seconds are misfires
+    'schedule_misfire_grace': 60,
+    # stdout kept per job in the result store (`result`, `enqueue --wait`)
+    'result_max_bytes': 64 * 1024,
+    # capacity a worker-run process hands out to jobs' cpus/memory_mb requests
+    # (0 = detect the host's); split across --use-processes children
+    'worker_cpus': 0,
+    'worker_memory_mb': 0,
+    # apply each job's memory_mb request to its process as RLIMIT_AS
+    'enforce_resource_limits': False,
+    # job storage engine: 'sqlite' or 'memory' (QUEUECTL_BACKEND overrides)
+    'storage_backend': 'sqlite',
+    # claim policy across tenants: 'fair' (weighted deficit round-robin) or
+    # 'fifo' (oldest job first); unset means fifo unless tenant_weights are
+    # configured. Weights as {tenant: weight}, default 1
+    'tenant_policy': None,
+    'tenant_weights': {},
+    # SQLite connection tuning: 'durable', 'balanced' or 'throughput' (see
+    # job_storage.PROFILES; QUEUECTL_DB_PROFILE overrides)
+    'db_profile': 'durable',
+    # worker-run checkpoints the WAL this often (0 = only SQLite's own
+    # autocheckpoint) and truncates it once it is over wal_max_bytes
+    'wal_checkpoint_seconds': 10,
+    'wal_max_bytes': 64 * 1024 * 1024,
 }
 
 
@@ -37,10 +75,29 @@ def get_config(key):
 def set_config(key, value):
     cfg = _load()
     # try cast to int for numeric options
-    if key in ('max_retries', 'backoff_base'):
+    if key in ('max_retries', 'backoff_base', 'log_segment_bytes', 'ack_batch_size', 'ack_batch_ms',
+               'schedule_misfire_grace', 'result_max_bytes', 'worker_memory_mb', 'wal_max_bytes'):
         try:
             value = int(value)
         except Exception:
             raise ValueError('value must be integer')
+    if key in ('retry_factor', 'retry_max_delay', 'worker_cpus', 'wal_checkpoint_seconds', 'job_timeout',
+               'job_kill_grace'):
+        try:
+            value = float(value)
+        except Exception:
+            raise ValueError('value must be a number')
+    if key == 'retry_jitter' and value not in ('none', 'full', 'decorrelated'):
+        raise ValueError('value must be one of none, full, decorrelated')
+    if key == 'db_profile' and value not in ('durable', 'balanced', 'throughput'):
+        raise ValueError('value must be one of durable, balanced, throughput')
+    if key == 'tenant_policy' and value not in ('fair', 'fifo'):
+        raise ValueError('value must be one of fair, fifo')
+    if key == 'tenant_weights' and isinstance(value, str):
+        # e.g. "team-a:4,team-b:2"
+        import tenants
+        value = tenants.parse_weights(value)
+    if key in ('ack_durable', 'enforce_resource_limits') and isinstance(value, str):
+        value = value.strip().lower() in ('1', 'true', 'yes', 'on')
     cfg[key] = value
     _save(cfg)
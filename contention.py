@@ -0,0 +1,202 @@
+"""SQLite lock-contention counters and the adaptive claim throttle.
+
+job_storage._retry_on_lock records every storage operation here: calls,
+SQLITE_BUSY errors, retries, give-ups, other errors, seconds slept in
+backoff and total seconds spent (including SQLite's own busy-handler
+waits). Counters are per process; ``worker-run`` publishes them every few
+seconds to ``queuectl_stats/contention-<pid>.json`` next to the DB
+(override with QUEUECTL_STATS_DIR), which ``queuectl contention`` adds up.
+
+This module is imported by the CLI fast path, so it avoids threading and
+takes its lock from the builtin _thread module.
+"""
+import _thread
+import json
+import os
+import time
+
+import job_storage as store
+
+
+FIELDS = ('calls', 'busy', 'retries', 'gave_up', 'errors', 'wait', 'elapsed')
+
+# seconds between worker-run snapshots
+PUBLISH_INTERVAL = 5.0
+
+_lock = _thread.allocate_lock()
+_counters = {}
+
+
+def record(op, elapsed, busy=0, retries=0, wait=0.0, gave_up=False, error=False):
+    with _lock:
+        c = _counters.get(op)
+        if c is None:
+            c = _counters[op] = dict.fromkeys(FIELDS, 0)
+        c['calls'] += 1
+        c['busy'] += busy
+        c['retries'] += retries
+        c['gave_up'] += int(gave_up)
+        c['errors'] += int(error)
+        c['wait'] += wait
+        c['elapsed'] += elapsed
+
+
+def busy_count(op=None):
+    """SQLITE_BUSY errors seen so far by ``op`` (or by every operation)."""
+    with _lock:
+        if op is not None:
+            return _counters.get(op, {}).get('busy', 0)
+        return sum(c['busy'] for c in _counters.values())
+
+
+def snapshot():
+    with _lock:
+        return {op: dict(c) for op, c in _counters.items()}
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+
+
+def default_dir():
+    """QUEUECTL_STATS_DIR, else queuectl_stats/ next to the DB."""
+    env = os.environ.get('QUEUECTL_STATS_DIR')
+    if env:
+        return env
+    return os.path.join(os.path.dirname(os.path.abspath(store.DB_PATH)), 'queuectl_stats')
+
+
+def publish(stats_dir=None, extra=None):
+    """Atomically write this process's counters (plus ``extra`` fields) to the stats directory."""
+    stats_dir = stats_dir or default_dir()
+    os.makedirs(stats_dir, exist_ok=True)
+    path = os.path.join(stats_dir, f'contention-{os.getpid()}.json')
+    data = {'pid': os.getpid(), 'updated_at': time.time(), 'ops': snapshot()}
+    data.update(extra or {})
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+    return path
+
+
+def start_publisher(shutdown_event, extra=None, stats_dir=None, interval=PUBLISH_INTERVAL):
+    """Publish this process's counters every ``interval`` seconds and once more at shutdown.
+
+    ``extra`` is an optional callable returning more fields to include.
+    Returns the thread; join it after setting ``shutdown_event`` to get the final snapshot written."""
+    import threading
+
+    def _loop():
+        while True:
+            stopping = shutdown_event.wait(interval)
+            try:
+                publish(stats_dir, extra() if extra else None)
+            except OSError:
+                pass
+            if stopping:
+                return
+
+    thread = threading.Thread(target=_loop, name='contention-publisher', daemon=True)
+    thread.start()
+    return thread
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        pass
+    return True
+
+
+def read_all(stats_dir=None):
+    """Published snapshots, each with an ``alive`` flag for its process."""
+    stats_dir = stats_dir or default_dir()
+    try:
+        names = sorted(os.listdir(stats_dir))
+    except OSError:
+        return []
+    out = []
+    for name in names:
+        if not (name.startswith('contention-') and name.endswith('.json')):
+            continue
+        try:
+            with open(os.path.join(stats_dir, name), encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        data['alive'] = _alive(data.get('pid', 0))
+        out.append(data)
+    return out
+
+
+def clear(stats_dir=None):
+    """Remove published snapshots of processes that are no longer running; returns how many."""
+    removed = 0
+    stats_dir = stats_dir or default_dir()
+    for data in read_all(stats_dir):
+        if not data['alive']:
+            try:
+                os.unlink(os.path.join(stats_dir, f"contention-{data['pid']}.json"))
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+def totals(snapshots):
+    """Per-operation sums over several snapshots."""
+    out = {}
+    for data in snapshots:
+        for op, c in data.get('ops', {}).items():
+            t = out.setdefault(op, dict.fromkeys(FIELDS, 0))
+            for k in FIELDS:
+                t[k] += c.get(k, 0)
+    return out
+
+
+class ClaimThrottle:
+    """Per-process claim pacing: an exponentially growing and decaying pause between claims.
+
+    A claim that hit SQLITE_BUSY, gave up, or took longer than
+    ``SATURATED_SECONDS`` (time spent queueing in SQLite's busy handler)
+    marks the DB as saturated and doubles the pause every worker thread
+    takes before its next claim, up to ``MAX_PAUSE``. Each unsaturated claim
+    halves it again, and below ``MIN_PAUSE`` it drops to zero, so an
+    uncontended pool is not slowed down at all. Pauses are fully jittered
+    so the threads do not retry in lockstep."""
+
+    SATURATED_SECONDS = 0.25
+    MIN_PAUSE = 0.01
+    MAX_PAUSE = 2.0
+
+    def __init__(self):
+        self.pause = 0.0
+        self.saturated = 0
+
+    def delay(self):
+        """Seconds to wait before the next claim."""
+        if not self.pause:
+            return 0.0
+        import random
+        return random.uniform(0, self.pause)
+
+    def start(self):
+        """Token for after(), taken right before claiming."""
+        return busy_count(), time.perf_counter()
+
+    def after(self, token, failed=False):
+        """Adjust the pause from how the claim went; returns True if the DB looked saturated."""
+        busy_before, started = token
+        saturated = failed or busy_count() > busy_before or time.perf_counter() - started > self.SATURATED_SECONDS
+        # plain attribute updates: losing one under a thread race only nudges the pacing
+        if saturated:
+            self.saturated += 1
+            self.pause = min(self.MAX_PAUSE, max(self.MIN_PAUSE, self.pause * 2))
+        elif self.pause:
+            self.pause = self.pause / 2 if self.pause / 2 >= self.MIN_PAUSE else 0.0
+        return saturated
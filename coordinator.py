@@ -0,0 +1,498 @@
+"""Serve job claims to workers on other machines.
+
+SQLite must not be shared over a network filesystem, so remote workers talk
+to a coordinator running next to the DB instead. The coordinator speaks the
+enqueue daemon's newline-delimited JSON protocol over TCP:
+
+- ``{"op": "claim", "worker": w, "max": n, "free": [cpus, mb], "total": [cpus, mb]}``
+  leases up to ``n`` jobs (capacity optional) -> ``{"jobs": [...], "lease_seconds": s}``;
+  with ``"batch": true`` the jobs are batchable ones claimed in one transaction
+- ``{"op": "ack", "worker": w, "acks": [...]}`` applies job_storage.apply_acks
+  style acks for jobs the worker holds, group-committed with other workers' acks
+- ``{"op": "heartbeat", "worker": w, "jobs": [ids]}`` extends those leases ->
+  ``{"lost": [ids]}`` for leases the worker no longer holds
+- ``{"op": "release", "worker": w, "jobs": [ids]}`` hands unstarted jobs back
+- ``{"op": "next_run_at"}`` -> ``{"at": null | "now" | timestamp}`` for idle waits
+- ``{"op": "tenants"}`` -> ``{"tenants": [...]}``, the tenants with pending jobs, for
+  the workers' fair schedulers (a claim's ``"tenant"`` is then tried first)
+
+Every response carries ``"ok"``. A lease that is not renewed within
+``lease_seconds`` (the worker died or lost its network) is expired and its
+job put back to pending without counting an attempt; a late ack for it is
+rejected (and reported on the worker's stderr). Lease owners are recorded on
+the job rows, so a restarted coordinator takes over the leases of jobs still
+processing instead of rejecting their acks and stranding them. When QUEUECTL_COORDINATOR_TOKEN is set, requests must carry the
+same ``"token"``.
+
+RemoteBackend is the worker side (``worker-run --coordinator host:port``): a
+StorageBackend that forwards claims and acks, prefetches ``lease_batch`` jobs
+per round-trip and heartbeats every lease it holds.
+"""
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import job_storage as store
+import resources
+from ack_writer import AckWriter
+from enqueue_client import parse_address
+from enqueue_daemon import make_line_server, token_matches
+from storage_backend import SQLiteBackend, StorageBackend, get_backend
+
+
+DEFAULT_ADDRESS = '127.0.0.1:7879'
+
+LEASE_SECONDS = 30
+
+# upper bound on jobs leased by one claim request
+MAX_LEASE_BATCH = 256
+
+
+class CoordinatorError(Exception):
+    pass
+
+
+def _token():
+    return os.environ.get('QUEUECTL_COORDINATOR_TOKEN') or None
+
+
+class Coordinator:
+    """Lease jobs from the local backend to remote workers."""
+
+    def __init__(self, address=None, db_path=None, backend=None, lease_seconds=LEASE_SECONDS, token=None):
+        self.address = address or DEFAULT_ADDRESS
+        self.backend = backend or (SQLiteBackend(db_path) if db_path else get_backend())
+        self.lease_seconds = lease_seconds
+        self.token = token if token is not None else _token()
+        # acks from all connections share commits (and wake `enqueue --wait` callers)
+        self.acks = AckWriter(backend=self.backend, max_wait=0.002)
+        # job id -> [worker, expiry (monotonic); None while its ack is being applied]
+        self._leases = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._server = None
+        self._ops = {
+            'claim': self._claim,
+            'ack': self._ack,
+            'heartbeat': self._heartbeat,
+            'release': self._release,
+            'next_run_at': self._next_run_at,
+            'tenants': self._tenants,
+        }
+
+    def handle_request(self, req):
+        if self.token and not token_matches(req.get('token'), self.token):
+            return {'ok': False, 'error': 'invalid token'}
+        op = self._ops.get(req.get('op'))
+        if op is None:
+            return {'ok': False, 'error': f"unknown op {req.get('op')!r}"}
+        try:
+            return op(req)
+        except store.DatabaseBusy as e:
+            # lets remote workers throttle their claims like local ones
+            return {'ok': False, 'error': str(e), 'busy': True}
+
+    def _claim(self, req):
+        worker = req['worker']
+        n = max(1, min(int(req.get('max') or 1), MAX_LEASE_BATCH))
+        kwargs = {'queues': req['queues']} if req.get('queues') else {}
+        if req.get('batch'):
+            jobs = self.backend.claim_batch(n, **kwargs)
+        else:
+            if req.get('tenant'):
+                kwargs['tenant'] = req['tenant']
+            jobs = self._claim_each(n, req.get('free'), req.get('total'), kwargs)
+        if jobs:
+            expires = time.monotonic() + self.lease_seconds
+            with self._lock:
+                for job in jobs:
+                    self._leases[job['id']] = [worker, expires]
+            try:
+                self.backend.lease_jobs([job['id'] for job in jobs], worker)
+            except Exception:
+                # the jobs are leased either way; only a coordinator restart
+                # before they finish would now leave them to an operator
+                pass
+        return {'ok': True, 'jobs': jobs, 'lease_seconds': self.lease_seconds}
+
+    def _claim_each(self, n, free, total, kwargs):
+        jobs = []
+        for _ in range(n):
+            try:
+                if free is None:
+                    job = self.backend.claim_job(**kwargs)
+                else:
+                    job = self.backend.claim_job(free=tuple(free), total=tuple(total), **kwargs)
+            except Exception:
+                if not jobs:
+                    raise
+                # lease what was already claimed rather than strand it in processing
+                break
+            if not job:
+                break
+            jobs.append(job)
+            if free is not None:
+                # later jobs of the batch must fit next to the earlier ones
+                c, m = resources.demand(job.get('cpus'), job.get('memory_mb'), total)
+                free = (free[0] - c, free[1] - m)
+        return jobs
+
+    def _ack(self, req):
+        worker = req['worker']
+        acks = req.get('acks') or []
+        results = []
+        valid = []
+        with self._lock:
+            for ack in acks:
+                lease = self._leases.get(ack['job_id'])
+                if lease is None or lease[0] != worker or lease[1] is None:
+                    results.append('lease expired or held by another worker')
+                    continue
+                # the reaper must not expire it while the ack is being applied
+                lease[1] = None
+                valid.append(ack)
+                results.append(None)
+        try:
+            self.acks.committer.submit_many(valid)
+        except Exception:
+            expires = time.monotonic() + self.lease_seconds
+            with self._lock:
+                for ack in valid:
+                    self._leases[ack['job_id']][1] = expires
+            raise
+        with self._lock:
+            for ack in valid:
+                self._leases.pop(ack['job_id'], None)
+        return {'ok': True, 'results': results}
+
+    def _heartbeat(self, req):
+        worker = req['worker']
+        expires = time.monotonic() + self.lease_seconds
+        lost = []
+        with self._lock:
+            for job_id in req.get('jobs') or []:
+                lease = self._leases.get(job_id)
+                if lease is None or lease[0] != worker:
+                    lost.append(job_id)
+                elif lease[1] is not None:
+                    lease[1] = expires
+        return {'ok': True, 'lost': lost}
+
+    def _release(self, req):
+        worker = req['worker']
+        released = []
+        with self._lock:
+            for job_id in req.get('jobs') or []:
+                lease = self._leases.get(job_id)
+                if lease is not None and lease[0] == worker and lease[1] is not None:
+                    del self._leases[job_id]
+                    released.append(job_id)
+        for job_id in released:
+            self.backend.requeue_job(job_id)
+        return {'ok': True, 'released': released}
+
+    def _next_run_at(self, req):
+        queues = req.get('queues')
+        at = self.backend.next_pending_run_at(queues) if queues else self.backend.next_pending_run_at()
+        if at is not None:
+            at = 'now' if at == datetime.min else store._now_iso(at)
+        return {'ok': True, 'at': at}
+
+    def _tenants(self, req):
+        return {'ok': True, 'tenants': self.backend.pending_tenants()}
+
+    def expire_leases(self, now=None):
+        """Requeue the jobs of leases that were not renewed in time; returns their ids."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            expired = [job_id for job_id, (_, expires) in self._leases.items() if expires is not None and expires <= now]
+            for job_id in expired:
+                del self._leases[job_id]
+        for job_id in expired:
+            try:
+                self.backend.requeue_job(job_id)
+            except Exception:
+                # leave it processing rather than crash the reaper
+                pass
+        return expired
+
+    def restore_leases(self):
+        """Take over the leases of jobs a previous coordinator handed out; returns how many.
+
+        Each gets a fresh ``lease_seconds``: its worker keeps it by
+        heartbeating (and may ack it) as before, otherwise it expires and the
+        job is requeued."""
+        leased = self.backend.leased_jobs()
+        expires = time.monotonic() + self.lease_seconds
+        with self._lock:
+            for job_id, worker in leased.items():
+                self._leases.setdefault(job_id, [worker, expires])
+        return len(leased)
+
+    def _reap(self):
+        interval = min(1.0, self.lease_seconds / 3.0)
+        while not self._stop.wait(interval):
+            self.expire_leases()
+
+    def _make_server(self):
+        self.restore_leases()
+        server = make_line_server(self.address, self.handle_request)
+        if isinstance(server.server_address, tuple):
+            # report the real port when bound to port 0
+            host, port = server.server_address[:2]
+            self.address = f'{host}:{port}'
+        threading.Thread(target=self._reap, name='lease-reaper', daemon=True).start()
+        return server
+
+    def start(self):
+        """Bind and serve in a background thread (returns immediately)."""
+        self._server = self._make_server()
+        t = threading.Thread(target=self._server.serve_forever, name='coordinator', daemon=True)
+        t.start()
+        return t
+
+    def serve_forever(self):
+        self._server = self._make_server()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self._server = None
+            self._stop.set()
+            self.acks.close()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        self._stop.set()
+        self.acks.close()
+
+
+class RemoteBackend(StorageBackend):
+    """StorageBackend for workers on another machine, backed by a Coordinator.
+
+    Thread-safe: all threads of a worker process share one connection. Only
+    the calls a worker makes are supported.
+    """
+
+    name = 'remote'
+
+    # attempts (with a short pause) before an ack is given up on; its lease
+    # then expires and the job runs again
+    ACK_ATTEMPTS = 5
+
+    def __init__(self, address, lease_batch=1, token=None, timeout=30):
+        self.address = address
+        self.lease_batch = max(1, int(lease_batch))
+        self.token = token if token is not None else _token()
+        self.timeout = timeout
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{id(self):x}'
+        self.lease_seconds = LEASE_SECONDS
+        self._io_lock = threading.Lock()
+        self._sock = None
+        self._rfile = None
+        self._lock = threading.Lock()
+        self._buffer = deque()
+        self._held = set()
+        self._stop = threading.Event()
+        self._heartbeat_thread = None
+
+    def init(self):
+        pass
+
+    def _connect(self):
+        family, sockaddr = parse_address(self.address)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(sockaddr)
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+        self._rfile = sock.makefile('rb')
+
+    def _disconnect(self):
+        if self._sock is not None:
+            try:
+                self._rfile.close()
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = self._rfile = None
+
+    def _call(self, op, **payload):
+        req = dict(payload, op=op, worker=self.worker_id)
+        if self.token:
+            req['token'] = self.token
+        data = json.dumps(req).encode('utf-8') + b'\n'
+        with self._io_lock:
+            # one reconnect per call, e.g. after the coordinator restarted
+            for attempt in (0, 1):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    self._sock.sendall(data)
+                    line = self._rfile.readline()
+                    if not line:
+                        raise OSError('coordinator closed the connection')
+                    break
+                except OSError:
+                    self._disconnect()
+                    if attempt:
+                        raise
+        resp = json.loads(line)
+        if not resp.get('ok'):
+            if resp.get('busy'):
+                raise store.DatabaseBusy(resp['error'])
+            raise CoordinatorError(resp.get('error', f'{op} failed'))
+        return resp
+
+    def _take_buffered(self, free, total):
+        for job in self._buffer:
+            if free is not None:
+                c, m = resources.demand(job.get('cpus'), job.get('memory_mb'), total)
+                if c > free[0] + 1e-9 or m > free[1]:
+                    continue
+            self._buffer.remove(job)
+            return job
+        return None
+
+    def claim_job(self, free=None, total=None, queues=None, tenant=None):
+        with self._lock:
+            job = self._take_buffered(free, total)
+        if job is not None:
+            return job
+        payload = {'max': self.lease_batch}
+        if free is not None:
+            payload.update(free=list(free), total=list(total))
+        if queues:
+            payload['queues'] = list(queues)
+        if tenant:
+            payload['tenant'] = tenant
+        try:
+            resp = self._call('claim', **payload)
+        except (OSError, ValueError):
+            # coordinator unreachable: behave like an empty queue and retry later
+            return None
+        self.lease_seconds = resp.get('lease_seconds', self.lease_seconds)
+        jobs = resp['jobs']
+        if not jobs:
+            return None
+        with self._lock:
+            self._held.update(j['id'] for j in jobs)
+            self._buffer.extend(jobs[1:])
+        self._ensure_heartbeat()
+        return jobs[0]
+
+    def claim_batch(self, limit, queues=None):
+        payload = {'max': limit, 'batch': True}
+        if queues:
+            payload['queues'] = list(queues)
+        try:
+            resp = self._call('claim', **payload)
+        except (OSError, ValueError):
+            return []
+        self.lease_seconds = resp.get('lease_seconds', self.lease_seconds)
+        jobs = resp['jobs']
+        if jobs:
+            with self._lock:
+                self._held.update(j['id'] for j in jobs)
+            self._ensure_heartbeat()
+        return jobs
+
+    def _ensure_heartbeat(self):
+        if self._heartbeat_thread is None:
+            self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name='lease-heartbeat', daemon=True)
+            self._heartbeat_thread.start()
+
+    def heartbeat(self):
+        """Renew every held lease; jobs the coordinator no longer leases to us are dropped."""
+        with self._lock:
+            held = list(self._held)
+        if not held:
+            return []
+        lost = self._call('heartbeat', jobs=held)['lost']
+        if lost:
+            with self._lock:
+                self._held.difference_update(lost)
+                gone = set(lost)
+                for job in [j for j in self._buffer if j['id'] in gone]:
+                    self._buffer.remove(job)
+        return lost
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.lease_seconds / 3.0):
+            try:
+                self.heartbeat()
+            except (OSError, CoordinatorError, ValueError):
+                pass
+
+    def apply_acks(self, acks):
+        for attempt in range(self.ACK_ATTEMPTS):
+            try:
+                results = self._call('ack', acks=acks)['results']
+                break
+            except (OSError, ValueError, store.DatabaseBusy):
+                if attempt + 1 == self.ACK_ATTEMPTS:
+                    raise
+                time.sleep(0.5 * (attempt + 1))
+        with self._lock:
+            self._held.difference_update(a['job_id'] for a in acks)
+        for ack, error in zip(acks, results):
+            if error:
+                # its lease was lost: the job runs again elsewhere and this run's outcome is dropped
+                print(f"Ack for job {ack['job_id']} rejected by coordinator: {error}", file=sys.stderr)
+        return results
+
+    def requeue_job(self, job_id):
+        """Hand a leased job back to the coordinator unrun; True if it was released."""
+        with self._lock:
+            self._held.discard(job_id)
+        try:
+            released = self._call('release', jobs=[job_id])['released']
+        except (OSError, CoordinatorError, ValueError, store.DatabaseBusy):
+            # its lease expires instead
+            return False
+        return job_id in released
+
+    def mark_job_completed(self, job_id, result=None):
+        self.apply_acks([{'op': 'completed', 'job_id': job_id, 'result': result}])
+
+    def mark_job_failed(self, job_id, attempts, max_retries, backoff_base=2, delay=None, retryable=True, result=None):
+        self.apply_acks([{
+            'op': 'failed', 'job_id': job_id, 'attempts': attempts, 'max_retries': max_retries,
+            'backoff_base': backoff_base, 'delay': delay, 'retryable': retryable, 'result': result,
+        }])
+
+    def pending_tenants(self):
+        return self._call('tenants')['tenants']
+
+    def next_pending_run_at(self, queues=None):
+        at = self._call('next_run_at', queues=list(queues) if queues else None)['at']
+        if at is None:
+            return None
+        return datetime.min if at == 'now' else store.parse_iso(at)
+
+    def close(self):
+        """Hand prefetched, unstarted jobs back and stop heartbeating."""
+        self._stop.set()
+        with self._lock:
+            unstarted = [j['id'] for j in self._buffer]
+            self._buffer.clear()
+            self._held.difference_update(unstarted)
+        if unstarted:
+            try:
+                self._call('release', jobs=unstarted)
+            except (OSError, CoordinatorError, ValueError, store.DatabaseBusy):
+                # their leases expire instead
+                pass
+        with self._io_lock:
+            self._disconnect()
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+
+
+_ALIASES = {
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+    '@monthly': '0 0 1 * *',
+    '@weekly': '0 0 * * 0',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@hourly': '0 * * * *',
+}
+
+# (min, max) for minute, hour, day of month, month, day of week
+_BOUNDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+
+def _parse_field(text, lo, hi):
+    values = set()
+    for part in text.split(','):
+        step = 1
+        if '/' in part:
+            part, step_s = part.split('/', 1)
+            step = int(step_s)
+            if step <= 0:
+                raise ValueError(f'invalid step in cron field: {text!r}')
+        if part == '*':
+            start, end = lo, hi
+        elif '-' in part:
+            a, b = part.split('-', 1)
+            start, end = int(a), int(b)
+        else:
+            start = int(part)
+            end = hi if step != 1 else start
+        if start < lo or end > hi or start > end:
+            raise ValueError(f'cron field {text!r} out of range {lo}-{hi}')
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronExpr:
+    """Standard 5-field cron expression (minute hour day-of-month month day-of-week), evaluated in UTC.
+
+    Supports ``*``, lists, ranges, steps and the ``@hourly``/``@daily``/...
+    aliases. As in Vixie cron, when both day fields are restricted a day
+    matches if either one does.
+    """
+
+    def __init__(self, expr):
+        self.expr = expr
+        fields = _ALIASES.get(expr.strip(), expr).split()
+        if len(fields) != 5:
+            raise ValueError(f'cron expression must have 5 fields: {expr!r}')
+        try:
+            parsed = [_parse_field(f, lo, hi) for f, (lo, hi) in zip(fields, _BOUNDS)]
+        except ValueError as e:
+            raise ValueError(str(e) if 'cron' in str(e) else f'invalid cron expression: {expr!r}')
+        self.minutes, self.hours, self.days, self.months, dow = parsed
+        # 7 is an alias for Sunday
+        self.weekdays = {d % 7 for d in dow}
+        self._dom_any = fields[2] == '*'
+        self._dow_any = fields[4] == '*'
+
+    def _day_matches(self, dt):
+        dom = dt.day in self.days
+        # datetime.weekday() is Monday=0; cron uses Sunday=0
+        dow = (dt.weekday() + 1) % 7 in self.weekdays
+        if self._dom_any and self._dow_any:
+            return True
+        if self._dom_any:
+            return dow
+        if self._dow_any:
+            return dom
+        return dom or dow
+
+    def next_after(self, dt):
+        """Return the first matching minute strictly after ``dt`` (naive UTC)."""
+        t = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in self.months:
+                t = datetime(t.year + (t.month == 12), t.month % 12 + 1, 1)
+                continue
+            if not self._day_matches(t):
+                t = datetime(t.year, t.month, t.day) + timedelta(days=1)
+                continue
+            if t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+                continue
+            if t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+                continue
+            return t
+        raise ValueError(f'cron expression never fires: {self.expr!r}')
@@ -1,15 +1,15 @@
-import job_storage as store
+from storage_backend import get_backend
 
 
 def list_dead():
-    return store.list_jobs_by_state('dead')
+    return get_backend().list_jobs_by_state('dead')
 
 
 def retry(job_id):
     # returns True if retried
-    # job_storage.retry_dead_job will only update if state='dead'
+    # retry_dead_job will only update if state='dead'
     try:
-        store.retry_dead_job(job_id)
+        get_backend().retry_dead_job(job_id)
         return True
     except Exception:
         return False
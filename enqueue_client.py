@@ -0,0 +1,146 @@
+"""Thin client for the queuectl enqueue daemon.
+
+Only uses the standard library socket/json modules so producers avoid the
+cost of importing click and sqlite. Usable as a library::
+
+    from enqueue_client import EnqueueClient
+    with EnqueueClient() as c:
+        job_id = c.enqueue('echo hello')
+
+or from the shell::
+
+    python enqueue_client.py --command "echo hello"
+"""
+import json
+import os
+import socket
+import sys
+
+
+DEFAULT_TCP_ADDRESS = '127.0.0.1:7878'
+
+
+class EnqueueError(Exception):
+    pass
+
+
+def default_token():
+    """Shared secret the daemon requires, from QUEUECTL_DAEMON_TOKEN (None if unset)."""
+    return os.environ.get('QUEUECTL_DAEMON_TOKEN') or None
+
+
+def default_address():
+    """Daemon address from QUEUECTL_DAEMON_ADDR, else a socket next to the DB."""
+    env = os.environ.get('QUEUECTL_DAEMON_ADDR')
+    if env:
+        return env
+    if not hasattr(socket, 'AF_UNIX'):
+        return DEFAULT_TCP_ADDRESS
+    db_path = os.environ.get('QUEUECTL_DB_PATH', os.path.join(os.getcwd(), 'queuectl.db'))
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), 'queuectl.sock')
+
+
+def parse_address(address):
+    """Return (family, sockaddr). ``host:port`` is TCP, anything else a unix socket path."""
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit() and os.sep not in address:
+        return socket.AF_INET, (host or '127.0.0.1', int(port))
+    return socket.AF_UNIX, address
+
+
+class EnqueueClient:
+    """Persistent connection to the enqueue daemon.
+
+    Each call returns once the daemon has committed the job(s) to the DB.
+    A client instance is not thread-safe; use one per thread.
+    """
+
+    def __init__(self, address=None, timeout=30, token=None):
+        self.address = address or default_address()
+        self.token = token if token is not None else default_token()
+        family, sockaddr = parse_address(self.address)
+        self._sock = socket.socket(family, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        try:
+            self._sock.connect(sockaddr)
+        except OSError as e:
+            self._sock.close()
+            raise EnqueueError(f'cannot connect to enqueue daemon at {self.address}: {e}')
+        self._rfile = self._sock.makefile('rb')
+
+    def _call(self, payload):
+        if self.token:
+            payload = dict(payload, token=self.token)
+        self._sock.sendall(json.dumps(payload).encode('utf-8') + b'\n')
+        line = self._rfile.readline()
+        if not line:
+            raise EnqueueError('enqueue daemon closed the connection')
+        return json.loads(line)
+
+    def enqueue(self, command, job_id=None, max_retries=None, delay=None, run_at=None, **fields):
+        """Enqueue one job and return its id; ``fields`` may add retry_policy, cpus, memory_mb, queue, batchable, tenant or timeout."""
+        req = {'command': command}
+        for k, v in (('id', job_id), ('max_retries', max_retries), ('delay', delay), ('run_at', run_at)) + tuple(fields.items()):
+            if v is not None:
+                req[k] = v
+        resp = self._call(req)
+        if not resp.get('ok'):
+            raise EnqueueError(resp.get('error', 'enqueue failed'))
+        return resp['id']
+
+    def enqueue_many(self, jobs):
+        """Enqueue a list of job dicts (same keys as ``enqueue``) in one round-trip.
+
+        Returns a list of ``{'ok': bool, 'id': ..., 'error': ...}`` per job."""
+        resp = self._call({'jobs': jobs})
+        if 'results' not in resp:
+            raise EnqueueError(resp.get('error', 'enqueue failed'))
+        return resp['results']
+
+    def close(self):
+        try:
+            self._rfile.close()
+        finally:
+            self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv=None):
+    import argparse
+    p = argparse.ArgumentParser(description='Enqueue a job through the queuectl enqueue daemon')
+    p.add_argument('--command', required=True)
+    p.add_argument('--id', dest='job_id', default=None)
+    p.add_argument('--max-retries', type=int, default=None)
+    p.add_argument('--delay', type=int, default=None)
+    p.add_argument('--run-at', default=None)
+    p.add_argument('--queue', default=None)
+    p.add_argument('--batchable', action='store_true')
+    p.add_argument('--tenant', default=None)
+    p.add_argument('--job-timeout', type=float, default=None)
+    p.add_argument('--address', default=None)
+    args = p.parse_args(argv)
+    try:
+        with EnqueueClient(args.address) as c:
+            fields = {'queue': args.queue} if args.queue else {}
+            if args.batchable:
+                fields['batchable'] = True
+            if args.tenant:
+                fields['tenant'] = args.tenant
+            if args.job_timeout:
+                fields['timeout'] = args.job_timeout
+            job_id = c.enqueue(args.command, job_id=args.job_id, max_retries=args.max_retries,
+                               delay=args.delay, run_at=args.run_at, **fields)
+    except EnqueueError as e:
+        print(f'Failed to enqueue job: {e}', file=sys.stderr)
+        return 1
+    print(f'Enqueued job: {job_id}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,182 @@
+import hmac
+import ipaddress
+import json
+import os
+import socket
+import socketserver
+import threading
+from datetime import datetime, timedelta
+
+import job_storage as store
+import config
+import queues
+import resources
+import retry_policy
+import tenants
+from group_commit import GroupCommitter
+from storage_backend import SQLiteBackend, get_backend
+from enqueue_client import default_address, default_token, parse_address
+
+
+def _job_from_request(req):
+    command = req.get('command')
+    if not command:
+        raise ValueError('job must include a "command" field')
+    max_retries = req.get('max_retries')
+    if max_retries is None:
+        max_retries = config.get_config('max_retries')
+    next_run_at = None
+    if req.get('delay') is not None:
+        next_run_at = store.schedule_ts(datetime.utcnow() + timedelta(seconds=int(req['delay'])))
+    elif req.get('run_at'):
+        next_run_at = store.normalize_run_at(req['run_at'])
+    cpus, memory_mb = resources.validate(req.get('cpus'), req.get('memory_mb'))
+    batchable = 1 if req.get('batchable') else None
+    if batchable and (cpus or memory_mb):
+        raise ValueError('batchable jobs cannot request cpus or memory: a batch runs outside the resource pool')
+    return store.new_job(command, job_id=req.get('id'), max_retries=int(max_retries), next_run_at=next_run_at,
+                         retry_policy=retry_policy.validate(req.get('retry_policy')), cpus=cpus, memory_mb=memory_mb,
+                         queue=queues.validate_name(req.get('queue')), batchable=batchable,
+                         tenant=tenants.validate_name(req.get('tenant')), timeout=store.validate_timeout(req.get('timeout')))
+
+
+def token_matches(given, expected):
+    """Constant-time check of a request's ``token`` against the expected one."""
+    return hmac.compare_digest(str(given or '').encode('utf-8'), expected.encode('utf-8'))
+
+
+def is_local(address):
+    """Whether ``address`` only accepts connections from this host (a unix socket or a loopback host:port)."""
+    family, sockaddr = parse_address(address)
+    if family != socket.AF_INET:
+        return True
+    host = sockaddr[0]
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def make_line_server(address, handle_request):
+    """Threaded TCP or unix-socket server answering newline-delimited JSON
+    requests with ``handle_request(req) -> dict``, one response line each."""
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    resp = handle_request(json.loads(line))
+                except Exception as e:
+                    resp = {'ok': False, 'error': str(e)}
+                self.wfile.write(json.dumps(resp).encode('utf-8') + b'\n')
+                self.wfile.flush()
+
+    family, sockaddr = parse_address(address)
+    if family == socket.AF_INET:
+        class Server(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+            request_queue_size = 128
+    else:
+        if os.path.exists(sockaddr):
+            os.remove(sockaddr)
+
+        class Server(socketserver.ThreadingUnixStreamServer):
+            daemon_threads = True
+            request_queue_size = 128
+    return Server(sockaddr, Handler)
+
+
+class EnqueueDaemon:
+    """Accept enqueue requests over a socket and group-commit them.
+
+    Requests are newline-delimited JSON objects, either a single job
+    (``{"command": ..., "id": ..., "max_retries": ..., "delay": ..., "run_at": ..., "retry_policy": {...}, "cpus": ..., "memory_mb": ...}``)
+    or ``{"jobs": [...]}``. Jobs from all connections are coalesced by a
+    GroupCommitter into one SQLite transaction per batch, and each request is
+    answered only after its batch has committed.
+
+    Jobs are shell commands, so when a token is set (QUEUECTL_DAEMON_TOKEN)
+    every request must carry it as ``"token"``, and the daemon refuses to
+    listen on anything but a unix socket or a loopback address without one.
+    """
+
+    def __init__(self, address=None, db_path=None, max_batch=1000, max_wait=0.002, backend=None, token=None):
+        self.address = address or default_address()
+        self.token = token if token is not None else default_token()
+        if not self.token and not is_local(self.address):
+            raise ValueError(f'refusing to accept commands on {self.address} without a token: '
+                             'set QUEUECTL_DAEMON_TOKEN or bind a loopback address or unix socket')
+        self.backend = backend or (SQLiteBackend(db_path) if db_path else get_backend())
+        self.committer = GroupCommitter(self._apply, max_batch=max_batch, max_wait=max_wait, name='enqueue-commit')
+        self._server = None
+
+    def _apply(self, jobs):
+        return self.backend.add_jobs(jobs)
+
+    def _enqueue_one(self, req):
+        try:
+            job = _job_from_request(req)
+        except (ValueError, TypeError) as e:
+            return {'ok': False, 'error': str(e)}
+        err = self.committer.submit(job)
+        if err:
+            return {'ok': False, 'id': job['id'], 'error': err}
+        return {'ok': True, 'id': job['id']}
+
+    def handle_request(self, req):
+        if self.token and not token_matches(req.get('token'), self.token):
+            return {'ok': False, 'error': 'invalid token'}
+        if 'jobs' in req:
+            jobs, results, idx = [], [], []
+            for r in req['jobs']:
+                try:
+                    jobs.append(_job_from_request(r))
+                    idx.append(len(results))
+                    results.append(None)
+                except (ValueError, TypeError) as e:
+                    results.append({'ok': False, 'error': str(e)})
+            # queue the whole request at once so it lands in as few batches as possible
+            errs = self.committer.submit_many(jobs)
+            for i, job, err in zip(idx, jobs, errs):
+                results[i] = {'ok': False, 'id': job['id'], 'error': err} if err else {'ok': True, 'id': job['id']}
+            return {'results': results}
+        return self._enqueue_one(req)
+
+    def _make_server(self):
+        return make_line_server(self.address, self.handle_request)
+
+    def start(self):
+        """Bind and serve in a background thread (returns immediately)."""
+        self._server = self._make_server()
+        t = threading.Thread(target=self._server.serve_forever, name='enqueue-daemon', daemon=True)
+        t.start()
+        return t
+
+    def serve_forever(self):
+        self._server = self._make_server()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self._remove_socket()
+            self._server = None
+            self.committer.close()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._remove_socket()
+            self._server = None
+        self.committer.close()
+
+    def _remove_socket(self):
+        family, sockaddr = parse_address(self.address)
+        if family != socket.AF_INET and os.path.exists(sockaddr):
+            os.remove(sockaddr)
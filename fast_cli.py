@@ -0,0 +1,249 @@
+"""Click-free fast path for the hot CLI commands.
+
+``main.py`` hands ``enqueue`` and ``status`` invocations to ``main()`` here
+before importing click or any worker machinery. Anything this parser does not
+understand (``--help``, malformed values, unknown options) returns None so the
+full click CLI handles it and produces its usual messages.
+"""
+import os
+import sys
+
+
+HOT_COMMANDS = ('enqueue', 'status')
+
+# option -> (destination, converter); a None converter marks a flag
+_ENQUEUE_OPTIONS = {
+    '--id': ('job_id', str),
+    '--command': ('command', str),
+    '--command-file': ('command_file', str),
+    '--job-file': ('job_file', str),
+    '--delay': ('delay', int),
+    '--run-at': ('run_at', str),
+    '--max-retries': ('max_retries', int),
+    '--retry-base': ('retry_base', float),
+    '--retry-factor': ('retry_factor', float),
+    '--retry-max-delay': ('retry_max_delay', float),
+    '--retry-jitter': ('retry_jitter', str),
+    '--retry-on-exit-codes': ('retry_on_exit_codes', str),
+    '--cpus': ('cpus', float),
+    '--memory-mb': ('memory_mb', int),
+    '--queue': ('queue', str),
+    '--batchable': ('batchable', None),
+    '--tenant': ('tenant', str),
+    '--job-timeout': ('job_timeout', float),
+    '--wait': ('wait', None),
+    '--timeout': ('timeout', float),
+}
+
+# enqueue option destination -> retry policy key (see retry_policy.py)
+RETRY_OPTIONS = {
+    'retry_base': 'base',
+    'retry_factor': 'factor',
+    'retry_max_delay': 'max_delay',
+    'retry_jitter': 'jitter',
+    'retry_on_exit_codes': 'retry_on',
+}
+
+
+def retry_policy_from_options(opts):
+    """Pop the --retry-* options out of ``opts`` into a policy dict (None if none were given)."""
+    policy = {}
+    for dest, key in RETRY_OPTIONS.items():
+        value = opts.pop(dest, None)
+        if value is not None:
+            policy[key] = value
+    return policy or None
+
+
+def build_enqueue_job(job_id=None, command=None, command_file=None, job_file=None, delay=None, run_at=None, max_retries=3,
+                      retry_policy=None, cpus=None, memory_mb=None, queue=None, batchable=False,
+                      tenant=None, job_timeout=None):
+    """Build the job dict for ``enqueue``; raises ValueError with a user-facing message."""
+    from datetime import datetime, timedelta
+    import job_storage as store
+
+    # allow full job payload via --job-file
+    if job_file:
+        import json
+        with open(job_file, 'r', encoding='utf-8') as f:
+            job_data = json.load(f)
+        # ensure minimal fields
+        if 'id' not in job_data or not job_data.get('id'):
+            import uuid
+            job_data['id'] = job_id or str(uuid.uuid4())
+        if 'command' not in job_data:
+            raise ValueError('job JSON must include a "command" field')
+        # normalize state/details
+        now = store.current_time()
+        job_data.setdefault('state', 'pending')
+        job_data.setdefault('attempts', 0)
+        job_data.setdefault('max_retries', max_retries)
+        job_data['created_at'] = job_data.get('created_at', now)
+        job_data['updated_at'] = job_data.get('updated_at', now)
+    else:
+        if command_file:
+            with open(command_file, 'r', encoding='utf-8') as f:
+                command = f.read().strip()
+
+        if not command:
+            raise ValueError('Either --command or --command-file or --job-file must be provided')
+
+        job_data = store.new_job(command, job_id=job_id, max_retries=max_retries)
+
+    # scheduling: set next_run_at based on delay or run_at
+    if delay is not None:
+        try:
+            delay_int = int(delay)
+            next_run = datetime.utcnow() + timedelta(seconds=delay_int)
+            job_data['next_run_at'] = store.schedule_ts(next_run)
+        except Exception:
+            raise ValueError('Invalid --delay value')
+    elif run_at:
+        job_data['next_run_at'] = store.normalize_run_at(run_at)
+    elif job_data.get('next_run_at'):
+        job_data['next_run_at'] = store.normalize_run_at(job_data['next_run_at'])
+
+    # resource requests; command-line values override the job file
+    if cpus is not None:
+        job_data['cpus'] = cpus
+    if memory_mb is not None:
+        job_data['memory_mb'] = memory_mb
+    if job_data.get('cpus') is not None or job_data.get('memory_mb') is not None:
+        import resources
+        job_data['cpus'], job_data['memory_mb'] = resources.validate(job_data.get('cpus'), job_data.get('memory_mb'))
+
+    if batchable:
+        job_data['batchable'] = 1
+    if job_data.get('batchable') and (job_data.get('cpus') or job_data.get('memory_mb')):
+        raise ValueError('batchable jobs cannot request cpus or memory: a batch runs outside the resource pool')
+
+    if queue is not None or job_data.get('queue') is not None:
+        import queues
+        job_data['queue'] = queues.validate_name(queue if queue is not None else job_data.get('queue'))
+
+    # command-line timeout overrides one from the job file
+    if job_timeout is not None or job_data.get('timeout') is not None:
+        job_data['timeout'] = store.validate_timeout(job_timeout if job_timeout is not None else job_data.get('timeout'))
+
+    if tenant is not None or job_data.get('tenant') is not None:
+        import tenants
+        job_data['tenant'] = tenants.validate_name(tenant if tenant is not None else job_data.get('tenant'))
+
+    # command-line retry options override a policy from the job file
+    policy = dict(job_data.get('retry_policy') or {}, **(retry_policy or {}))
+    if policy:
+        import retry_policy as retry_mod
+        job_data['retry_policy'] = retry_mod.validate(policy)
+    return job_data
+
+
+def _parse_options(args, spec):
+    """Parse ``--opt value`` / ``--opt=value`` pairs; None if anything is unexpected."""
+    out = {}
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        name, eq, value = arg.partition('=')
+        if name not in spec:
+            return None
+        dest, conv = spec[name]
+        if conv is None:
+            if eq:
+                return None
+            out[dest] = True
+            i += 1
+            continue
+        if not eq:
+            if i + 1 >= len(args):
+                return None
+            value = args[i + 1]
+            i += 1
+        try:
+            out[dest] = conv(value)
+        except ValueError:
+            return None
+        i += 1
+    return out
+
+
+def wait_for_result(backend, job_id, timeout=None):
+    """Block until the job is completed, dead or cancelled, print its captured stdout and return an exit status.
+
+    The status is 0 for a completed job, the job's own exit code (or 1) for a
+    dead one, 1 for a cancelled one and 124 on timeout."""
+    import job_waiter
+    job = job_waiter.wait_for(job_id, timeout=timeout, backend=backend)
+    if job is None:
+        print(f'Job {job_id} not found', file=sys.stderr)
+        return 1
+    if job['state'] not in job_waiter.TERMINAL_STATES:
+        print(f"Timed out waiting for job {job_id} (state: {job['state']})", file=sys.stderr)
+        return 124
+    result = backend.get_result(job_id)
+    if result and result['output']:
+        sys.stdout.write(result['output'])
+        sys.stdout.flush()
+    if job['state'] == 'completed':
+        return 0
+    rc = result['exit_code'] if result else None
+    return rc if rc and 0 < rc < 256 else 1
+
+
+def _enqueue(args):
+    opts = _parse_options(args, _ENQUEUE_OPTIONS)
+    if opts is None:
+        return None
+    for key in ('command_file', 'job_file'):
+        if key in opts and not os.path.exists(opts[key]):
+            return None
+    wait = opts.pop('wait', False)
+    timeout = opts.pop('timeout', None)
+    from storage_backend import get_backend
+    try:
+        job_data = build_enqueue_job(retry_policy=retry_policy_from_options(opts), **opts)
+    except ValueError as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+    backend = get_backend()
+    try:
+        backend.add_job(job_data)
+    except Exception as e:
+        print(f'Failed to enqueue job: {e}', file=sys.stderr)
+        return 1 if wait else 0
+    # with --wait stdout carries the job's own output
+    print(f"Enqueued job: {job_data['id']}", file=sys.stderr if wait else sys.stdout)
+    if wait:
+        return wait_for_result(backend, job_data['id'], timeout)
+    return 0
+
+
+def _status(args):
+    if args:
+        return None
+    from storage_backend import get_backend
+    backend = get_backend()
+    stats = backend.get_stats()
+    print('Job counts by state:')
+    for k, v in stats.items():
+        print(f'  {k}: {v}')
+    print_queue_depths(backend.get_queue_stats())
+    return 0
+
+
+def print_queue_depths(queue_stats, echo=print):
+    """The per-queue part of ``status``; omitted while every job is in the default queue."""
+    if not queue_stats or list(queue_stats) == ['default']:
+        return
+    echo('Queue depth (pending/processing):')
+    for name in sorted(queue_stats):
+        counts = queue_stats[name]
+        echo(f"  {name}: {counts.get('pending', 0)}/{counts.get('processing', 0)}")
+
+
+def main(argv):
+    """Run a hot command; return its exit code, or None to fall back to click."""
+    if not argv or argv[0] not in HOT_COMMANDS:
+        return None
+    if argv[0] == 'enqueue':
+        return _enqueue(argv[1:])
+    return _status(argv[1:])
@@ -0,0 +1,127 @@
+import queue
+import threading
+
+
+class _Pending:
+    __slots__ = ('item', 'event', 'result', 'error')
+
+    def __init__(self, item):
+        self.item = item
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class GroupCommitter:
+    """Coalesce items submitted from many threads into batched commits.
+
+    ``apply_batch(items)`` is called from a single background thread with up to
+    ``max_batch`` items collected within ``max_wait`` seconds of the first one,
+    and must return one result per item. It is expected to write the whole
+    batch in one transaction, so N concurrent submitters pay for one commit.
+    """
+
+    def __init__(self, apply_batch, max_batch=500, max_wait=0.002, name='group-commit'):
+        self.apply_batch = apply_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.items = 0
+        self._q = queue.Queue()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item, wait=True, timeout=None):
+        """Queue ``item``; if ``wait`` block until its batch is committed and return its result."""
+        if self._stopped:
+            raise RuntimeError('group committer is stopped')
+        p = _Pending(item)
+        self._q.put(p)
+        if not wait:
+            return None
+        if not p.event.wait(timeout):
+            raise TimeoutError('timed out waiting for batch commit')
+        if p.error is not None:
+            raise p.error
+        return p.result
+
+    def submit_many(self, items, timeout=None):
+        """Queue all ``items`` at once and return their results once committed."""
+        if self._stopped:
+            raise RuntimeError('group committer is stopped')
+        pending = [_Pending(item) for item in items]
+        for p in pending:
+            self._q.put(p)
+        for p in pending:
+            if not p.event.wait(timeout):
+                raise TimeoutError('timed out waiting for batch commit')
+            if p.error is not None:
+                raise p.error
+        return [p.result for p in pending]
+
+    def _drain(self, batch):
+        """Move already-queued items into ``batch``; return True if the close sentinel was seen."""
+        while len(batch) < self.max_batch:
+            try:
+                p = self._q.get_nowait()
+            except queue.Empty:
+                return False
+            if p is None:
+                return True
+            batch.append(p)
+        return False
+
+    def _collect(self, first):
+        """Return (batch, stop) where stop is True once the close sentinel is seen."""
+        batch = [first]
+        if self._drain(batch):
+            return batch, True
+        if len(batch) < self.max_batch and self.max_wait:
+            # give concurrent submitters one short window to join this batch
+            try:
+                p = self._q.get(timeout=self.max_wait)
+            except queue.Empty:
+                return batch, False
+            if p is None:
+                return batch, True
+            batch.append(p)
+            if self._drain(batch):
+                return batch, True
+        return batch, False
+
+    def _run(self):
+        stop = False
+        while not stop:
+            first = self._q.get()
+            if first is None:
+                break
+            batch, stop = self._collect(first)
+            try:
+                results = self.apply_batch([p.item for p in batch])
+                for p, r in zip(batch, results):
+                    p.result = r
+            except Exception as e:
+                for p in batch:
+                    p.error = e
+            self.batches += 1
+            self.items += len(batch)
+            for p in batch:
+                p.event.set()
+        # fail anything that raced with close() instead of leaving it blocked
+        while True:
+            try:
+                p = self._q.get_nowait()
+            except queue.Empty:
+                break
+            if p is not None:
+                p.error = RuntimeError('group committer is stopped')
+                p.event.set()
+
+    def close(self, timeout=None):
+        """Flush pending items and stop the background thread."""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._q.put(None)
+        self._thread.join(timeout)
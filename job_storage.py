@@ -1,36 +1,183 @@
 import sqlite3
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import os
 import time
 
+import contention
+from queues import DEFAULT_QUEUE
+from tenants import DEFAULT_TENANT
+
 
 DB_PATH = os.environ.get('QUEUECTL_DB_PATH', os.path.join(os.getcwd(), "queuectl.db"))
 
+# job_results keeps the outcome of roughly this many most recent job runs
+RESULT_RETENTION = 10000
+
 
 def current_time():
-    return datetime.utcnow().isoformat() + "Z"
+    return schedule_ts()
 
 
 def _now_iso(dt=None):
+    # fixed width: isoformat() drops the fraction when it is 0, and timestamps
+    # are compared as strings in SQL (next_run_at <= now, ORDER BY created_at)
+    return schedule_ts(dt)
+
+
+# Columns added to jobs after the original schema, in migration order
+_EXTRA_COLUMNS = [
+    ('next_run_at', 'TEXT'),
+    # per-job retry policy as JSON (see retry_policy.py); NULL uses the config defaults
+    ('retry_policy', 'TEXT'),
+    ('last_retry_delay', 'REAL'),
+    # resource requests (see resources.py); NULL reserves nothing
+    ('cpus', 'REAL'),
+    ('memory_mb', 'INTEGER'),
+    # named queue (see queues.py)
+    ('queue', 'TEXT'),
+    # 1 if the job may run in a micro-batch (see batch_runner.py)
+    ('batchable', 'INTEGER'),
+    # owner of the job for fair claiming (see tenants.py)
+    ('tenant', 'TEXT'),
+    # per-job run time limit in seconds; NULL uses the job_timeout config
+    ('timeout', 'REAL'),
+]
+
+JOB_FIELDS = ('id', 'command', 'state', 'attempts', 'max_retries', 'created_at', 'updated_at') + tuple(c for c, _ in _EXTRA_COLUMNS)
+_JOB_SELECT = ', '.join(JOB_FIELDS)
+_JOB_INSERT = f"INSERT INTO jobs ({_JOB_SELECT}) VALUES ({', '.join('?' * len(JOB_FIELDS))})"
+# fields stored as JSON text
+_JSON_FIELDS = ('retry_policy',)
+
+
+def _job_values(job):
+    values = []
+    for f in JOB_FIELDS:
+        v = job.get(f)
+        if f == 'queue' and v is None:
+            v = DEFAULT_QUEUE
+        elif f == 'tenant' and v is None:
+            v = DEFAULT_TENANT
+        elif f in _JSON_FIELDS and v is not None and not isinstance(v, str):
+            import json
+            v = json.dumps(v)
+        values.append(v)
+    return tuple(values)
+
+
+def _job_row(r):
+    job = dict(zip(JOB_FIELDS, r))
+    for f in _JSON_FIELDS:
+        if job.get(f):
+            import json
+            job[f] = json.loads(job[f])
+    return job
+
+
+def schedule_ts(dt=None):
+    """Fixed-width timestamp used for schedule columns so they compare correctly as strings."""
     if dt is None:
-        return datetime.utcnow().isoformat() + "Z"
-    return dt.isoformat() + "Z"
+        dt = datetime.utcnow()
+    return dt.isoformat(timespec='microseconds') + "Z"
+
+
+# Connection tuning profiles (db_profile config, QUEUECTL_DB_PROFILE overrides).
+# durable fsyncs every commit; balanced fsyncs only at checkpoints, so a power
+# loss can drop the last commits but never corrupts the DB; throughput does not
+# fsync at all and survives process crashes only.
+PROFILES = {
+    'durable': {'synchronous': 'FULL', 'cache_size': -16384, 'mmap_size': 0, 'temp_store': 'DEFAULT',
+                'wal_autocheckpoint': 1000, 'journal_size_limit': 64 * 1024 * 1024},
+    'balanced': {'synchronous': 'NORMAL', 'cache_size': -32768, 'mmap_size': 128 * 1024 * 1024,
+                 'temp_store': 'MEMORY', 'wal_autocheckpoint': 1000, 'journal_size_limit': 64 * 1024 * 1024},
+    'throughput': {'synchronous': 'OFF', 'cache_size': -65536, 'mmap_size': 256 * 1024 * 1024,
+                   'temp_store': 'MEMORY', 'wal_autocheckpoint': 4000, 'journal_size_limit': 256 * 1024 * 1024},
+}
+DEFAULT_PROFILE = 'durable'
+
+# (name, PRAGMA statements) of the active profile, resolved once per process
+_tuning = None
+
+
+def db_profile():
+    """Name of the active tuning profile."""
+    name = os.environ.get('QUEUECTL_DB_PROFILE')
+    if not name:
+        import config
+        name = config.get_config('db_profile') or DEFAULT_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"unknown db profile {name!r}: use one of {', '.join(PROFILES)}")
+    return name
+
+
+def set_db_profile(name=None):
+    """Switch this process's new connections to profile ``name`` (None: re-read env/config)."""
+    global _tuning
+    if name is not None and name not in PROFILES:
+        raise ValueError(f"unknown db profile {name!r}: use one of {', '.join(PROFILES)}")
+    name = name or db_profile()
+    _tuning = (name, [f'PRAGMA {k}={v};' for k, v in PROFILES[name].items()])
 
 
 def _get_conn(db_path=None):
     """Centralize connection options"""
     if db_path is None:
         db_path = DB_PATH
+    if _tuning is None:
+        set_db_profile()
     conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
     # Enable WAL for better concurrency and set busy timeout
     try:
         conn.execute('PRAGMA journal_mode=WAL;')
         conn.execute('PRAGMA busy_timeout=30000;')
+        for stmt in _tuning[1]:
+            conn.execute(stmt)
     except Exception:
         pass
     return conn
 
 
+def checkpoint_wal(mode='PASSIVE', db_path=None, busy_timeout_ms=1000):
+    """Run a WAL checkpoint; returns (busy, wal_frames, checkpointed_frames).
+
+    PASSIVE copies what it can without waiting. RESTART and TRUNCATE also wait
+    up to busy_timeout_ms for readers of old snapshots (blocking new writers
+    meanwhile) so the WAL can start over; TRUNCATE then shrinks the file to 0.
+    busy is 1 when that wait ran out."""
+    if mode not in ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'):
+        raise ValueError(f'invalid checkpoint mode {mode!r}')
+    if db_path is None:
+        db_path = DB_PATH
+    conn = _get_conn(db_path)
+    try:
+        conn.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)};')
+        return tuple(conn.execute(f'PRAGMA wal_checkpoint({mode});').fetchone())
+    finally:
+        conn.close()
+
+
+def wal_size(db_path=None):
+    """Size of the DB's write-ahead log file in bytes (0 if there is none)."""
+    try:
+        return os.path.getsize((db_path or DB_PATH) + '-wal')
+    except OSError:
+        return 0
+
+
+def get_db_stats(db_path=None):
+    """File sizes, page counts and the effective connection settings of the DB."""
+    if db_path is None:
+        db_path = DB_PATH
+    conn = _get_conn(db_path)
+    stats = {'profile': _tuning[0], 'db_bytes': os.path.getsize(db_path), 'wal_bytes': wal_size(db_path)}
+    for pragma in ('journal_mode', 'page_size', 'page_count', 'freelist_count') + tuple(PROFILES[DEFAULT_PROFILE]):
+        stats[pragma] = conn.execute(f'PRAGMA {pragma};').fetchone()[0]
+    stats['synchronous'] = ('OFF', 'NORMAL', 'FULL', 'EXTRA')[stats['synchronous']]
+    stats['temp_store'] = ('DEFAULT', 'FILE', 'MEMORY')[stats['temp_store']]
+    conn.close()
+    return stats
+
+
 def init_db(db_path=None):
     if db_path is None:
         db_path = DB_PATH
@@ -50,16 +197,85 @@ def init_db(db_path=None):
     ''')
     conn.commit()
 
-    # Migration: ensure next_run_at column exists
+    # Migration: ensure columns added since the original schema exist
     cursor.execute("PRAGMA table_info(jobs)")
     cols = [r[1] for r in cursor.fetchall()]
-    if 'next_run_at' not in cols:
+    for name, sql_type in _EXTRA_COLUMNS:
+        if name in cols:
+            continue
         try:
-            cursor.execute("ALTER TABLE jobs ADD COLUMN next_run_at TEXT")
+            cursor.execute(f"ALTER TABLE jobs ADD COLUMN {name} {sql_type}")
+            if name == 'queue':
+                # existing jobs join the default queue
+                cursor.execute("UPDATE jobs SET queue = ? WHERE queue IS NULL", (DEFAULT_QUEUE,))
+            elif name == 'tenant':
+                cursor.execute("UPDATE jobs SET tenant = ? WHERE tenant IS NULL", (DEFAULT_TENANT,))
             conn.commit()
         except Exception:
             # If alter fails, ignore; table may be locked or migration unnecessary
             pass
+    # remote worker holding the job through a coordinator lease (see
+    # coordinator.py); not a job field, so exports and job dicts leave it out
+    if 'lease_owner' not in cols:
+        try:
+            cursor.execute("ALTER TABLE jobs ADD COLUMN lease_owner TEXT")
+            conn.commit()
+        except Exception:
+            pass
+
+    # lets idle workers find the earliest due pending job with an index lookup
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_state_next_run ON jobs(state, next_run_at)')
+    # per-queue claims and idle lookups only touch their own queue's rows
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_queue_state_next_run ON jobs(queue, state, next_run_at)')
+    # claims take the oldest runnable job: walking these in created_at order
+    # stops at the first due row instead of sorting every pending one
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_state_created ON jobs(state, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_queue_state_created ON jobs(queue, state, created_at)')
+    # batch claims only look at batchable rows
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_batchable ON jobs(state, queue, next_run_at) WHERE batchable = 1')
+    # a tenant's oldest pending job is an index walk, and the tenants with
+    # pending work a loose scan of it (see tenants.py)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_state_tenant_created ON jobs(state, tenant, created_at)')
+
+    # Recurring job templates materialized by the scheduler in worker-run
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schedules (
+            id TEXT PRIMARY KEY,
+            command TEXT NOT NULL,
+            cron TEXT,
+            interval_seconds INTEGER,
+            max_retries INTEGER NOT NULL,
+            misfire_policy TEXT NOT NULL DEFAULT 'fire_once',
+            next_fire_at TEXT NOT NULL,
+            last_fired_at TEXT,
+            enabled INTEGER NOT NULL DEFAULT 1,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+    ''')
+    # schedulers pick up changes incrementally by updated_at instead of rescanning
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_schedules_updated_at ON schedules(updated_at)')
+
+    # outcome of each job's latest run; rowid order is recording order, so
+    # pruning the oldest rows is a rowid range delete
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS job_results (
+            job_id TEXT PRIMARY KEY,
+            exit_code INTEGER,
+            output TEXT,
+            truncated INTEGER NOT NULL DEFAULT 0,
+            finished_at TEXT NOT NULL,
+            timed_out INTEGER NOT NULL DEFAULT 0
+        );
+    ''')
+    conn.commit()
+    cursor.execute("PRAGMA table_info(job_results)")
+    if 'timed_out' not in [r[1] for r in cursor.fetchall()]:
+        try:
+            cursor.execute("ALTER TABLE job_results ADD COLUMN timed_out INTEGER NOT NULL DEFAULT 0")
+            conn.commit()
+        except Exception:
+            pass
     conn.close()
 
 
@@ -68,19 +284,76 @@ def add_job(job, db_path=None):
         db_path = DB_PATH
     conn = _get_conn(db_path)
     cursor = conn.cursor()
-    sql = '''
-        INSERT INTO jobs (id, command, state, attempts, max_retries, created_at, updated_at, next_run_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    '''
-    cursor.execute(sql, (
-        job['id'], job['command'], job['state'],
-        job['attempts'], job['max_retries'],
-        job['created_at'], job['updated_at'], job.get('next_run_at')
-    ))
+    cursor.execute(_JOB_INSERT, _job_values(job))
     conn.commit()
     conn.close()
 
 
+def add_jobs(jobs, db_path=None):
+    """Insert many jobs in one transaction.
+
+    Returns one entry per job: None on success or an error string (e.g. a
+    duplicate id), so one bad job does not fail the rest of the batch."""
+    if db_path is None:
+        db_path = DB_PATH
+
+    def _work():
+        conn = _get_conn(db_path)
+        cursor = conn.cursor()
+        results = []
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            for job in jobs:
+                try:
+                    cursor.execute(_JOB_INSERT, _job_values(job))
+                    results.append(None)
+                except sqlite3.IntegrityError as e:
+                    results.append(str(e))
+            conn.commit()
+            return results
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    return _retry_on_lock(_work)
+
+
+def new_job(command, job_id=None, max_retries=3, next_run_at=None, **fields):
+    """Build a pending job dict with the standard defaults; extra job fields may be passed as keywords."""
+    if job_id is None:
+        import uuid
+        job_id = str(uuid.uuid4())
+    now = current_time()
+    return {
+        'id': job_id,
+        'command': command,
+        'state': 'pending',
+        'attempts': 0,
+        'max_retries': max_retries,
+        'created_at': now,
+        'updated_at': now,
+        'next_run_at': next_run_at,
+        'queue': DEFAULT_QUEUE,
+        'tenant': DEFAULT_TENANT,
+        **fields,
+    }
+
+
+def validate_timeout(value):
+    """A job's own timeout in seconds (None: use job_timeout); raises ValueError."""
+    if value is None:
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'invalid timeout {value!r}: give seconds as a number')
+    if not value > 0:
+        raise ValueError('timeout must be greater than 0 seconds')
+    return value
+
+
 def list_jobs_by_state(state=None, db_path=None):
     if db_path is None:
         db_path = DB_PATH
@@ -88,22 +361,83 @@ def list_jobs_by_state(state=None, db_path=None):
     cursor = conn.cursor()
     if state:
         cursor.execute(
-            'SELECT id, command, state, attempts, max_retries, created_at, updated_at, next_run_at FROM jobs WHERE state = ? ORDER BY created_at',
+            f'SELECT {_JOB_SELECT} FROM jobs WHERE state = ? ORDER BY created_at',
             (state,)
         )
     else:
         cursor.execute(
-            'SELECT id, command, state, attempts, max_retries, created_at, updated_at, next_run_at FROM jobs ORDER BY created_at'
+            f'SELECT {_JOB_SELECT} FROM jobs ORDER BY created_at'
         )
     rows = cursor.fetchall()
     conn.close()
-    jobs = []
-    for r in rows:
-        jobs.append({
-            'id': r[0], 'command': r[1], 'state': r[2], 'attempts': r[3],
-            'max_retries': r[4], 'created_at': r[5], 'updated_at': r[6], 'next_run_at': r[7]
-        })
-    return jobs
+    return [_job_row(r) for r in rows]
+
+
+def get_job(job_id, db_path=None):
+    if db_path is None:
+        db_path = DB_PATH
+    conn = _get_conn(db_path)
+    cursor = conn.cursor()
+    cursor.execute(
+        f'SELECT {_JOB_SELECT} FROM jobs WHERE id = ?',
+        (job_id,)
+    )
+    r = cursor.fetchone()
+    conn.close()
+    if not r:
+        return None
+    return _job_row(r)
+
+
+def parse_iso(value):
+    """Parse a stored timestamp (with or without the trailing Z) as naive UTC; None if unparseable."""
+    try:
+        dt = datetime.fromisoformat(value.rstrip('Z'))
+    except (AttributeError, ValueError):
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def normalize_run_at(value):
+    """A user-supplied run time (ISO-8601, naive = UTC, any offset) as a stored UTC timestamp.
+
+    Stored timestamps are compared as strings, so they all need the same
+    fixed-width ``...Z`` form. Raises ValueError."""
+    dt = parse_iso(value)
+    if dt is None:
+        raise ValueError(f"invalid run time {value!r}: use an ISO-8601 timestamp, e.g. 2025-11-09T12:00:00Z")
+    return schedule_ts(dt)
+
+
+def next_pending_run_at(db_path=None, queues=None):
+    """Earliest time a pending job (in one of ``queues``, if given) becomes runnable, without taking the write lock.
+
+    Returns None when there are no pending jobs and datetime.min when one is
+    runnable right away (next_run_at NULL or unparseable)."""
+    if db_path is None:
+        db_path = DB_PATH
+    conn = _get_conn(db_path)
+    cursor = conn.cursor()
+    found = []
+    # one indexed lookup per queue rather than one MIN over an IN list
+    for queue in queues or (None,):
+        where = "state = 'pending'" if queue is None else "queue = ? AND state = 'pending'"
+        params = () if queue is None else (queue, queue)
+        cursor.execute(
+            f"SELECT EXISTS(SELECT 1 FROM jobs WHERE {where} AND next_run_at IS NULL), "
+            f"(SELECT MIN(next_run_at) FROM jobs WHERE {where})",
+            params
+        )
+        has_null, earliest = cursor.fetchone()
+        if has_null:
+            conn.close()
+            return datetime.min
+        if earliest is not None:
+            found.append(parse_iso(earliest) or datetime.min)
+    conn.close()
+    return min(found) if found else None
 
 
 def get_stats(db_path=None):
@@ -118,110 +452,424 @@ def get_stats(db_path=None):
     return stats
 
 
-def _retry_on_lock(func, retries=5, backoff=0.05):
-    for attempt in range(retries):
-        try:
-            return func()
-        except sqlite3.OperationalError as e:
-            if 'locked' in str(e).lower() and attempt + 1 < retries:
-                time.sleep(backoff * (attempt + 1))
+def get_queue_stats(db_path=None):
+    """Mapping of queue -> {state: count} for the unfinished (pending and processing) jobs."""
+    if db_path is None:
+        db_path = DB_PATH
+    conn = _get_conn(db_path)
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT queue, state, COUNT(*) FROM jobs WHERE state IN ('pending', 'processing') GROUP BY queue, state"
+    )
+    stats = {}
+    for queue, state, n in cursor.fetchall():
+        stats.setdefault(queue or DEFAULT_QUEUE, {})[state] = n
+    conn.close()
+    return stats
+
+
+def pending_tenants(db_path=None):
+    """Tenants with pending jobs, by a loose scan of the (state, tenant, created_at) index."""
+    if db_path is None:
+        db_path = DB_PATH
+    conn = _get_conn(db_path)
+    # one index seek per tenant instead of a DISTINCT over every pending row
+    rows = conn.execute(
+        "WITH RECURSIVE t(name) AS ("
+        " SELECT (SELECT MIN(tenant) FROM jobs WHERE state = 'pending')"
+        " UNION ALL"
+        " SELECT (SELECT MIN(tenant) FROM jobs WHERE state = 'pending' AND tenant > t.name) FROM t WHERE t.name IS NOT NULL"
+        ") SELECT name FROM t WHERE name IS NOT NULL"
+    ).fetchall()
+    conn.close()
+    return [r[0] for r in rows]
+
+
+def get_tenant_stats(db_path=None):
+    """Mapping of tenant -> {'pending', 'processing', 'waiting_since'} where
+    waiting_since is when the longest-waiting runnable pending job became runnable."""
+    if db_path is None:
+        db_path = DB_PATH
+    conn = _get_conn(db_path)
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT tenant, state, COUNT(*), "
+        "MIN(CASE WHEN state = 'pending' AND (next_run_at IS NULL OR next_run_at <= ?) "
+        "THEN MAX(created_at, COALESCE(next_run_at, '')) END) "
+        "FROM jobs WHERE state IN ('pending', 'processing') GROUP BY tenant, state",
+        (_now_iso(),)
+    )
+    stats = {}
+    for tenant, state, n, since in cursor.fetchall():
+        t = stats.setdefault(tenant or DEFAULT_TENANT, {'pending': 0, 'processing': 0, 'waiting_since': None})
+        t[state] = n
+        if since is not None:
+            t['waiting_since'] = since
+    conn.close()
+    return stats
+
+
+def get_result(job_id, db_path=None):
+    """Recorded outcome of a job's latest run, or None."""
+    if db_path is None:
+        db_path = DB_PATH
+    conn = _get_conn(db_path)
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT job_id, exit_code, output, truncated, finished_at, timed_out FROM job_results WHERE job_id = ?", (job_id,)
+    )
+    r = cursor.fetchone()
+    conn.close()
+    if not r:
+        return None
+    return {'job_id': r[0], 'exit_code': r[1], 'output': r[2], 'truncated': bool(r[3]), 'finished_at': r[4],
+            'timed_out': bool(r[5])}
+
+
+# called with the seconds about to be slept whenever _retry_on_lock backs off
+# (set by tracing.Tracer); None when nobody is listening
+on_lock_sleep = None
+
+# _retry_on_lock backoff: full jitter over base * 2 ** retry, capped
+LOCK_BACKOFF_CAP = 2.0
+
+# claims wait at most this long in SQLite's busy handler, so a saturated DB
+# surfaces as SQLITE_BUSY (which workers throttle on) rather than as slow claims
+CLAIM_BUSY_TIMEOUT_MS = 1000
+
+
+class DatabaseBusy(sqlite3.OperationalError):
+    """The database stayed locked through every retry of an operation."""
+
+
+def is_busy(exc):
+    """True if ``exc`` is SQLITE_BUSY/SQLITE_LOCKED rather than a real error."""
+    code = getattr(exc, 'sqlite_errorcode', None)
+    if code is not None:
+        # extended codes (e.g. SQLITE_BUSY_SNAPSHOT) keep the primary code in the low byte
+        return code & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    # Python < 3.11 does not expose the code
+    return isinstance(exc, sqlite3.OperationalError) and 'locked' in str(exc).lower()
+
+
+def _retry_on_lock(func, retries=5, backoff=0.05, op=None):
+    """Run ``func``, retrying with jittered exponential backoff while the DB is busy.
+
+    Other errors propagate at once; if every attempt is busy, DatabaseBusy
+    is raised. Calls, busy errors, sleeps and elapsed time are counted per
+    ``op`` (default: the name of the function defining ``func``) in the
+    contention module."""
+    if op is None:
+        op = func.__qualname__.split('.', 1)[0]
+    started = time.perf_counter()
+    busy = 0
+    slept = 0.0
+    try:
+        for attempt in range(retries):
+            try:
+                result = func()
+            except sqlite3.Error as e:
+                if not is_busy(e):
+                    raise
+                busy += 1
+                if attempt + 1 >= retries:
+                    raise DatabaseBusy(f'{op}: {e} (gave up after {retries} attempts)') from e
+                import random
+                delay = random.uniform(0, min(LOCK_BACKOFF_CAP, backoff * 2 ** attempt))
+                if on_lock_sleep is not None:
+                    on_lock_sleep(delay)
+                time.sleep(delay)
+                slept += delay
                 continue
-            raise
+            contention.record(op, time.perf_counter() - started, busy=busy, retries=busy, wait=slept)
+            return result
+    except DatabaseBusy:
+        contention.record(op, time.perf_counter() - started, busy=busy, retries=busy - 1, wait=slept, gave_up=True)
+        raise
+    except Exception:
+        contention.record(op, time.perf_counter() - started, busy=busy, retries=busy, wait=slept, error=True)
+        raise
 
 
-def claim_job(db_path=None):
+def claim_job(db_path=None, free=None, total=None, queues=None, tenant=None):
     """Atomically pick one pending job whose next_run_at is null or <= now and mark it processing.
-    Returns the job dict or None."""
+    Returns the job dict or None; raises DatabaseBusy if the DB stayed locked.
+
+    With ``free``/``total`` capacity tuples (cpus, memory_mb) only a job whose
+    resource requests fit is taken, chosen by resources.choose among the
+    oldest CLAIM_WINDOW runnable jobs. With ``queues`` only those queues are
+    considered, in the given order: the first with a runnable job wins. With
+    ``tenant`` that tenant's jobs are tried first, then everyone's (see
+    tenants.FairScheduler)."""
     if db_path is None:
         db_path = DB_PATH
 
     def _work():
         conn = _get_conn(db_path)
+        conn.execute(f'PRAGMA busy_timeout={CLAIM_BUSY_TIMEOUT_MS}')
         cursor = conn.cursor()
-        now = _now_iso()
+        now_dt = datetime.utcnow()
+        now = _now_iso(now_dt)
         try:
+            # an idle poll must not take the write lock just to find nothing
+            if not _any_runnable(cursor, now, queues):
+                return None
             cursor.execute('BEGIN IMMEDIATE')
-            cursor.execute(
-                "SELECT id, command, attempts, max_retries, created_at, updated_at, next_run_at FROM jobs WHERE state = 'pending' AND (next_run_at IS NULL OR next_run_at <= ?) ORDER BY created_at LIMIT 1",
-                (now,)
-            )
-            row = cursor.fetchone()
+            row = None
+            for queue in queues or (None,):
+                for owner in ((tenant, None) if tenant else (None,)):
+                    if free is None:
+                        row = _oldest_runnable(cursor, now, queue, owner)
+                    else:
+                        row = _choose_fitting(cursor, now_dt, free, total, queue, owner)
+                    if row:
+                        break
+                if row:
+                    break
             if not row:
                 conn.rollback()
                 return None
             job_id = row[0]
             cursor.execute(
-                "UPDATE jobs SET state = 'processing', updated_at = ? WHERE id = ? AND state = 'pending'",
+                "UPDATE jobs SET state = 'processing', updated_at = ?, lease_owner = NULL WHERE id = ? AND state = 'pending'",
                 (now, job_id)
             )
             if cursor.rowcount != 1:
                 conn.rollback()
                 return None
             conn.commit()
-            return {
-                'id': row[0], 'command': row[1], 'attempts': row[2], 'max_retries': row[3],
-                'created_at': row[4], 'updated_at': row[5], 'next_run_at': row[6]
-            }
+            job = _job_row(row)
+            job['state'] = 'processing'
+            job['updated_at'] = now
+            return job
         except Exception:
-            try:
-                conn.rollback()
-            except Exception:
-                pass
-            return None
+            conn.rollback()
+            raise
         finally:
             conn.close()
 
     return _retry_on_lock(_work)
 
 
-def mark_job_completed(job_id, db_path=None):
+def claim_batch(limit, db_path=None, queues=None):
+    """Atomically claim up to ``limit`` runnable batchable jobs, oldest first, in one transaction.
+
+    Returns the list of jobs (empty if none are runnable); raises DatabaseBusy
+    if the DB stayed locked. With ``queues`` those queues are drained in the
+    given order until ``limit`` jobs are claimed."""
     if db_path is None:
         db_path = DB_PATH
 
     def _work():
         conn = _get_conn(db_path)
+        conn.execute(f'PRAGMA busy_timeout={CLAIM_BUSY_TIMEOUT_MS}')
         cursor = conn.cursor()
         now = _now_iso()
+        try:
+            if not _any_runnable(cursor, now, queues, batchable=True):
+                return []
+            cursor.execute('BEGIN IMMEDIATE')
+            rows = []
+            for queue in queues or (None,):
+                where, params = _runnable(now, queue)
+                cursor.execute(
+                    f"SELECT {_JOB_SELECT} FROM jobs WHERE {where} AND batchable = 1 ORDER BY created_at LIMIT ?",
+                    params + (limit - len(rows),)
+                )
+                rows.extend(cursor.fetchall())
+                if len(rows) >= limit:
+                    break
+            if not rows:
+                conn.rollback()
+                return []
+            cursor.execute(
+                f"UPDATE jobs SET state = 'processing', updated_at = ?, lease_owner = NULL "
+                f"WHERE id IN ({', '.join('?' * len(rows))})",
+                [now] + [r[0] for r in rows]
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        jobs = []
+        for row in rows:
+            job = _job_row(row)
+            job['state'] = 'processing'
+            job['updated_at'] = now
+            jobs.append(job)
+        return jobs
+
+    return _retry_on_lock(_work)
+
+
+def _any_runnable(cursor, now, queues=None, batchable=False):
+    """Whether a runnable pending job (of ``queues``) exists, checked outside any transaction.
+
+    Claims call this before BEGIN IMMEDIATE: in WAL mode the read takes no
+    lock writers wait on, so idle workers cause no write-lock traffic. Two
+    index seeks per queue (NULL next_run_at, then next_run_at <= now) rather
+    than an OR that would scan every delayed job. A job committed right after
+    the check is found by the next poll."""
+    extra = ' AND batchable = 1' if batchable else ''
+    for queue in queues or (None,):
+        where = "state = 'pending'" if queue is None else "queue = ? AND state = 'pending'"
+        params = () if queue is None else (queue,)
         cursor.execute(
-            "UPDATE jobs SET state = 'completed', updated_at = ? WHERE id = ?",
-            (now, job_id)
+            f"SELECT EXISTS(SELECT 1 FROM jobs WHERE {where}{extra} AND next_run_at IS NULL) "
+            f"OR EXISTS(SELECT 1 FROM jobs WHERE {where}{extra} AND next_run_at <= ?)",
+            params + params + (now,)
         )
+        if cursor.fetchone()[0]:
+            return True
+    return False
+
+
+def _runnable(now, queue=None, tenant=None):
+    """WHERE clause and params for runnable pending jobs, in one queue (and of one tenant) or all."""
+    where, params = "state = 'pending' AND (next_run_at IS NULL OR next_run_at <= ?)", (now,)
+    if tenant is not None:
+        where, params = "tenant = ? AND " + where, (tenant,) + params
+    if queue is not None:
+        where, params = "queue = ? AND " + where, (queue,) + params
+    return where, params
+
+
+def _oldest_runnable(cursor, now, queue=None, tenant=None):
+    where, params = _runnable(now, queue, tenant)
+    cursor.execute(f"SELECT {_JOB_SELECT} FROM jobs WHERE {where} ORDER BY created_at LIMIT 1", params)
+    return cursor.fetchone()
+
+
+def _choose_fitting(cursor, now_dt, free, total, queue=None, tenant=None):
+    import resources
+    where, params = _runnable(_now_iso(now_dt), queue, tenant)
+    cursor.execute(
+        f"SELECT id, cpus, memory_mb, MAX(created_at, COALESCE(next_run_at, '')) FROM jobs "
+        f"WHERE {where} ORDER BY created_at LIMIT ?",
+        params + (resources.CLAIM_WINDOW,)
+    )
+    starved_before = _now_iso(now_dt - timedelta(seconds=resources.STARVATION_SECONDS))
+    job_id = resources.choose(cursor.fetchall(), free, total, starved_before)
+    if job_id is None:
+        return None
+    cursor.execute(f"SELECT {_JOB_SELECT} FROM jobs WHERE id = ?", (job_id,))
+    return cursor.fetchone()
+
+
+def _record_result(cursor, job_id, result, now_dt):
+    # REPLACE gives the row a fresh rowid, so it is the newest again
+    cursor.execute(
+        "INSERT OR REPLACE INTO job_results (job_id, exit_code, output, truncated, finished_at, timed_out) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (job_id, result.get('exit_code'), result.get('output'), int(bool(result.get('truncated'))), _now_iso(now_dt),
+         int(bool(result.get('timed_out'))))
+    )
+    cursor.execute(
+        "DELETE FROM job_results WHERE rowid <= (SELECT MAX(rowid) FROM job_results) - ?",
+        (RESULT_RETENTION,)
+    )
+
+
+def _complete(cursor, job_id, now_dt, result=None):
+    cursor.execute(
+        "UPDATE jobs SET state = 'completed', updated_at = ? WHERE id = ?",
+        (_now_iso(now_dt), job_id)
+    )
+    if result is not None:
+        _record_result(cursor, job_id, result, now_dt)
+
+
+def _fail(cursor, job_id, attempts, max_retries, backoff_base, now_dt, delay=None, retryable=True, result=None):
+    if result is not None:
+        _record_result(cursor, job_id, result, now_dt)
+    attempts_local = attempts + 1
+    if attempts_local > max_retries or not retryable:
+        # Move to dead
+        cursor.execute(
+            "UPDATE jobs SET state = 'dead', attempts = ?, updated_at = ? WHERE id = ?",
+            (attempts_local, _now_iso(now_dt), job_id)
+        )
+    else:
+        if delay is None:
+            # Schedule next run with exponential backoff (base ** attempts) seconds
+            delay = (backoff_base ** attempts_local)
+        next_run = now_dt + timedelta(seconds=delay)
+        cursor.execute(
+            "UPDATE jobs SET attempts = ?, state = 'pending', next_run_at = ?, last_retry_delay = ?, updated_at = ? WHERE id = ?",
+            (attempts_local, _now_iso(next_run), delay, _now_iso(now_dt), job_id)
+        )
+
+
+def mark_job_completed(job_id, db_path=None, result=None):
+    """Mark a job completed, recording ``result`` (exit_code/output/truncated) in the same commit."""
+    if db_path is None:
+        db_path = DB_PATH
+
+    def _work():
+        conn = _get_conn(db_path)
+        cursor = conn.cursor()
+        _complete(cursor, job_id, datetime.utcnow(), result=result)
         conn.commit()
         conn.close()
 
     return _retry_on_lock(_work)
 
 
-def mark_job_failed(job_id, attempts, max_retries, backoff_base=2, db_path=None):
-    """Increment attempts and either reschedule with backoff or mark dead."""
+def mark_job_failed(job_id, attempts, max_retries, backoff_base=2, db_path=None, delay=None, retryable=True, result=None):
+    """Increment attempts and either reschedule with backoff or mark dead.
+
+    ``delay`` overrides the plain ``backoff_base ** attempts`` backoff (see
+    retry_policy.next_delay); ``retryable=False`` sends the job straight to dead.
+    ``result`` is recorded as for mark_job_completed."""
     if db_path is None:
         db_path = DB_PATH
 
     def _work():
         conn = _get_conn(db_path)
         cursor = conn.cursor()
-        now_dt = datetime.utcnow()
-        attempts_local = attempts + 1
-        if attempts_local > max_retries:
-            # Move to dead
-            cursor.execute(
-                "UPDATE jobs SET state = 'dead', attempts = ?, updated_at = ? WHERE id = ?",
-                (attempts_local, _now_iso(now_dt), job_id)
-            )
-        else:
-            # Schedule next run with exponential backoff (base ** attempts) seconds
-            delay = (backoff_base ** attempts_local)
-            next_run = now_dt + timedelta(seconds=delay)
-            cursor.execute(
-                "UPDATE jobs SET attempts = ?, state = 'pending', next_run_at = ?, updated_at = ? WHERE id = ?",
-                (attempts_local, _now_iso(next_run), _now_iso(now_dt), job_id)
-            )
+        _fail(cursor, job_id, attempts, max_retries, backoff_base, datetime.utcnow(), delay=delay, retryable=retryable,
+              result=result)
         conn.commit()
         conn.close()
 
     return _retry_on_lock(_work)
 
 
+def apply_acks(acks, db_path=None):
+    """Apply many job state transitions in one transaction.
+
+    Each ack is a dict with ``op`` ('completed' or 'failed') and ``job_id``;
+    failed acks also carry ``attempts``, ``max_retries``, ``backoff_base`` and
+    optionally ``delay``/``retryable`` exactly as passed to mark_job_failed.
+    Either kind may carry a ``result``."""
+    if db_path is None:
+        db_path = DB_PATH
+
+    def _work():
+        conn = _get_conn(db_path)
+        cursor = conn.cursor()
+        now_dt = datetime.utcnow()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            for ack in acks:
+                if ack['op'] == 'completed':
+                    _complete(cursor, ack['job_id'], now_dt, result=ack.get('result'))
+                else:
+                    _fail(cursor, ack['job_id'], ack['attempts'], ack['max_retries'], ack['backoff_base'], now_dt,
+                          delay=ack.get('delay'), retryable=ack.get('retryable', True), result=ack.get('result'))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return [None] * len(acks)
+
+    return _retry_on_lock(_work)
+
+
 def retry_dead_job(job_id, db_path=None):
     if db_path is None:
         db_path = DB_PATH
@@ -231,10 +879,302 @@ def retry_dead_job(job_id, db_path=None):
         cursor = conn.cursor()
         now = _now_iso()
         cursor.execute(
-            "UPDATE jobs SET state = 'pending', attempts = 0, next_run_at = NULL, updated_at = ? WHERE id = ? AND state = 'dead'",
+            "UPDATE jobs SET state = 'pending', attempts = 0, next_run_at = NULL, last_retry_delay = NULL, updated_at = ? WHERE id = ? AND state = 'dead'",
             (now, job_id)
         )
         conn.commit()
         conn.close()
+        return cursor.rowcount == 1
+
+    return _retry_on_lock(_work)
+
+
+def requeue_job(job_id, db_path=None):
+    """Put a job claimed by a worker that went away back to pending, without
+    counting an attempt; True if it was processing."""
+    if db_path is None:
+        db_path = DB_PATH
+
+    def _work():
+        conn = _get_conn(db_path)
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE jobs SET state = 'pending', updated_at = ? WHERE id = ? AND state = 'processing'",
+            (_now_iso(), job_id)
+        )
+        conn.commit()
+        conn.close()
+        return cursor.rowcount == 1
+
+    return _retry_on_lock(_work)
+
+
+def lease_jobs(job_ids, owner, db_path=None):
+    """Record ``owner`` as the holder of these processing jobs, so a restarted coordinator can restore their leases."""
+    if db_path is None:
+        db_path = DB_PATH
+    if not job_ids:
+        return
+
+    def _work():
+        conn = _get_conn(db_path)
+        try:
+            conn.execute(
+                f"UPDATE jobs SET lease_owner = ? WHERE state = 'processing' AND id IN ({', '.join('?' * len(job_ids))})",
+                [owner] + list(job_ids)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    return _retry_on_lock(_work)
+
+
+def leased_jobs(db_path=None):
+    """{job id: lease owner} of the processing jobs leased out by a coordinator."""
+    if db_path is None:
+        db_path = DB_PATH
+    conn = _get_conn(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT id, lease_owner FROM jobs WHERE state = 'processing' AND lease_owner IS NOT NULL"
+        ).fetchall()
+    finally:
+        conn.close()
+    return dict(rows)
+
+
+# rows changed per transaction by bulk_update, so workers are never locked
+# out for long
+BULK_CHUNK = 1000
+
+# action -> (state it applies to, SET clause with one ``updated_at`` placeholder);
+# purge deletes jobs of the state it is given instead
+BULK_ACTIONS = {
+    'retry': ('dead', "state = 'pending', attempts = 0, next_run_at = NULL, last_retry_delay = NULL, updated_at = ?"),
+    'cancel': ('pending', "state = 'cancelled', updated_at = ?"),
+    'requeue': ('processing', "state = 'pending', updated_at = ?"),
+    'purge': (None, None),
+}
+# only finished jobs may be purged
+PURGE_STATES = ('completed', 'dead', 'cancelled')
+
+
+def parse_cutoff(value, now=None):
+    """A ``--since``/``--before`` value: an ISO-8601 UTC time or an age like ``90s``, ``15m``, ``2h``, ``7d``.
+
+    Raises ValueError."""
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    value = value.strip()
+    if value and value[-1] in units and value[:-1].replace('.', '', 1).isdigit():
+        now = now or datetime.utcnow()
+        return now - timedelta(seconds=float(value[:-1]) * units[value[-1]])
+    dt = parse_iso(value)
+    if dt is None:
+        raise ValueError(f"invalid time {value!r}: use an ISO-8601 UTC timestamp or an age like 30m, 2h, 7d")
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def bulk_filter(action, state=None):
+    """The state ``action`` applies to; raises ValueError."""
+    if action not in BULK_ACTIONS:
+        raise ValueError(f"unknown bulk action {action!r}")
+    if action == 'purge':
+        if state not in PURGE_STATES:
+            raise ValueError(f"purge needs one of the states {', '.join(PURGE_STATES)}")
+        return state
+    return BULK_ACTIONS[action][0]
+
+
+def job_filter(states=None, since=None, before=None, command_like=None):
+    """WHERE clause and params matching jobs in ``states`` last updated in
+    [``since``, ``before``) whose command matches the LIKE ``command_like``."""
+    clauses, params = [], []
+    if states:
+        clauses.append(f"state IN ({', '.join('?' * len(states))})")
+        params.extend(states)
+    # cutoffs are cut to whole seconds without the Z, which sorts before
+    # every stored timestamp of that second
+    if since is not None:
+        clauses.append('updated_at >= ?')
+        params.append(since.isoformat(timespec='seconds'))
+    if before is not None:
+        clauses.append('updated_at < ?')
+        params.append(before.isoformat(timespec='seconds'))
+    if command_like is not None:
+        clauses.append('command LIKE ?')
+        params.append(command_like)
+    return ' AND '.join(clauses) or '1', params
+
+
+def bulk_update(action, state=None, since=None, before=None, command_like=None, dry_run=False,
+                chunk_size=BULK_CHUNK, on_chunk=None, db_path=None):
+    """Apply an admin action to every matching job; returns how many were changed.
+
+    ``action`` is a key of BULK_ACTIONS (``state`` is only used by purge).
+    Jobs are filtered by updated_at (``since``/``before`` datetimes) and a SQL
+    LIKE pattern on the command, then changed with one set-based UPDATE (or
+    DELETE) per ``chunk_size`` jobs, each chunk in its own transaction and in
+    rowid order, so rows that match again later (e.g. a retried job that dies
+    again) are not revisited. ``on_chunk(job_ids, done, total)`` is called
+    after every commit. With ``dry_run`` only the count of matching jobs is
+    returned."""
+    if db_path is None:
+        db_path = DB_PATH
+    state = bulk_filter(action, state)
+    set_sql = BULK_ACTIONS[action][1]
+    where, params = job_filter((state,), since, before, command_like)
+
+    conn = _get_conn(db_path)
+    total = conn.execute(f"SELECT COUNT(*) FROM jobs WHERE {where}", params).fetchone()[0]
+    conn.close()
+    if dry_run or not total:
+        return total
+
+    def _chunk(after):
+        conn = _get_conn(db_path)
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute(
+                f"SELECT rowid, id FROM jobs WHERE {where} AND rowid > ? ORDER BY rowid LIMIT ?",
+                params + [after, chunk_size]
+            )
+            rows = cursor.fetchall()
+            if rows:
+                span = f"{where} AND rowid > ? AND rowid <= ?"
+                span_params = params + [after, rows[-1][0]]
+                if set_sql is None:
+                    cursor.execute(f"DELETE FROM job_results WHERE job_id IN (SELECT id FROM jobs WHERE {span})", span_params)
+                    cursor.execute(f"DELETE FROM jobs WHERE {span}", span_params)
+                else:
+                    cursor.execute(f"UPDATE jobs SET {set_sql} WHERE {span}", [_now_iso()] + span_params)
+            conn.commit()
+            return rows
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    done, after = 0, 0
+    while True:
+        rows = _retry_on_lock(lambda: _chunk(after))
+        if not rows:
+            return done
+        done += len(rows)
+        after = rows[-1][0]
+        if on_chunk is not None:
+            on_chunk([r[1] for r in rows], done, max(total, done))
+
+
+_SCHEDULE_COLS = 'id, command, cron, interval_seconds, max_retries, misfire_policy, next_fire_at, last_fired_at, enabled, created_at, updated_at'
+
+
+def _schedule_row(r):
+    return {
+        'id': r[0], 'command': r[1], 'cron': r[2], 'interval_seconds': r[3], 'max_retries': r[4],
+        'misfire_policy': r[5], 'next_fire_at': r[6], 'last_fired_at': r[7], 'enabled': bool(r[8]),
+        'created_at': r[9], 'updated_at': r[10]
+    }
+
+
+def add_schedule(schedule, db_path=None):
+    if db_path is None:
+        db_path = DB_PATH
+    conn = _get_conn(db_path)
+    now = schedule_ts()
+    conn.execute(
+        f'INSERT INTO schedules ({_SCHEDULE_COLS}) VALUES (?, ?, ?, ?, ?, ?, ?, NULL, 1, ?, ?)',
+        (schedule['id'], schedule['command'], schedule.get('cron'), schedule.get('interval_seconds'),
+         schedule['max_retries'], schedule.get('misfire_policy', 'fire_once'), schedule['next_fire_at'], now, now)
+    )
+    conn.commit()
+    conn.close()
+
+
+def list_schedules(include_disabled=False, db_path=None):
+    if db_path is None:
+        db_path = DB_PATH
+    conn = _get_conn(db_path)
+    where = '' if include_disabled else 'WHERE enabled = 1 '
+    rows = conn.execute(f'SELECT {_SCHEDULE_COLS} FROM schedules {where}ORDER BY id').fetchall()
+    conn.close()
+    return [_schedule_row(r) for r in rows]
+
+
+def get_schedule(schedule_id, db_path=None):
+    if db_path is None:
+        db_path = DB_PATH
+    conn = _get_conn(db_path)
+    r = conn.execute(f'SELECT {_SCHEDULE_COLS} FROM schedules WHERE id = ?', (schedule_id,)).fetchone()
+    conn.close()
+    return _schedule_row(r) if r else None
+
+
+def schedules_changed_since(since, db_path=None):
+    """Schedules (including disabled ones) whose updated_at is >= ``since``; uses the updated_at index."""
+    if db_path is None:
+        db_path = DB_PATH
+    conn = _get_conn(db_path)
+    rows = conn.execute(
+        f'SELECT {_SCHEDULE_COLS} FROM schedules WHERE updated_at >= ? ORDER BY updated_at',
+        (since,)
+    ).fetchall()
+    conn.close()
+    return [_schedule_row(r) for r in rows]
+
+
+def disable_schedule(schedule_id, db_path=None):
+    """Soft-delete so running schedulers notice the change through updated_at."""
+    if db_path is None:
+        db_path = DB_PATH
+
+    def _work():
+        conn = _get_conn(db_path)
+        cur = conn.execute(
+            'UPDATE schedules SET enabled = 0, updated_at = ? WHERE id = ? AND enabled = 1',
+            (schedule_ts(), schedule_id)
+        )
+        conn.commit()
+        conn.close()
+        return cur.rowcount == 1
 
-    return _retry_on_lock(_work)
\ No newline at end of file
+    return _retry_on_lock(_work)
+
+
+def fire_schedule(schedule_id, expected_next_fire_at, new_next_fire_at, jobs, db_path=None):
+    """Atomically advance a schedule and insert its job instances.
+
+    The UPDATE only matches if next_fire_at is still ``expected_next_fire_at``,
+    so when several worker processes race for the same fire time exactly one
+    of them materializes the jobs. Returns True if this caller won."""
+    if db_path is None:
+        db_path = DB_PATH
+
+    def _work():
+        conn = _get_conn(db_path)
+        cursor = conn.cursor()
+        now = schedule_ts()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute(
+                'UPDATE schedules SET next_fire_at = ?, last_fired_at = ?, updated_at = ? WHERE id = ? AND next_fire_at = ? AND enabled = 1',
+                (new_next_fire_at, now, now, schedule_id, expected_next_fire_at)
+            )
+            if cursor.rowcount != 1:
+                conn.rollback()
+                return False
+            for job in jobs:
+                cursor.execute(_JOB_INSERT.replace('INSERT', 'INSERT OR IGNORE', 1), _job_values(job))
+            conn.commit()
+            return True
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    return _retry_on_lock(_work)
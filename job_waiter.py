@@ -0,0 +1,127 @@
+"""Wake processes blocked in ``enqueue --wait`` as soon as their job is acked.
+
+A waiter binds a Unix datagram socket named after the job in a directory next
+to the DB, then re-reads the job each time it is woken. Whoever acks a job
+sends a one-byte datagram to every socket registered for it. Notifications are
+only hints - a lost one costs at most one ``recheck`` interval - so platforms
+without AF_UNIX (or with an over-long socket path) simply fall back to slow
+polling.
+"""
+import hashlib
+import itertools
+import os
+import socket
+import time
+
+import job_storage as store
+
+
+TERMINAL_STATES = ('completed', 'dead', 'cancelled')
+
+# seconds between job rechecks when no notification arrives
+RECHECK_INTERVAL = 1.0
+
+_counter = itertools.count()
+
+
+def default_dir():
+    """QUEUECTL_WAIT_DIR, else queuectl_wait/ next to the DB."""
+    env = os.environ.get('QUEUECTL_WAIT_DIR')
+    if env:
+        return env
+    return os.path.join(os.path.dirname(os.path.abspath(store.DB_PATH)), 'queuectl_wait')
+
+
+def _key(job_id):
+    # job ids are arbitrary strings; keep socket names short and path-safe
+    return hashlib.sha1(job_id.encode('utf-8')).hexdigest()[:20]
+
+
+def notify(job_ids, wait_dir=None):
+    """Wake everyone waiting on any of ``job_ids``; returns the number of waiters signalled."""
+    wait_dir = wait_dir or default_dir()
+    try:
+        names = os.listdir(wait_dir)
+    except OSError:
+        return 0
+    if not names:
+        return 0
+    keys = {_key(j) for j in job_ids}
+    sock = None
+    sent = 0
+    try:
+        for name in names:
+            if name.split('.', 1)[0] not in keys:
+                continue
+            if sock is None:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                sock.setblocking(False)
+            path = os.path.join(wait_dir, name)
+            try:
+                sock.sendto(b'!', path)
+                sent += 1
+            except ConnectionRefusedError:
+                # left behind by a waiter that died
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            except OSError:
+                # e.g. the waiter's buffer is full, so it is already awake
+                pass
+    finally:
+        if sock is not None:
+            sock.close()
+    return sent
+
+
+def _register(job_id, wait_dir):
+    if not hasattr(socket, 'AF_UNIX'):
+        return None, None
+    path = os.path.join(wait_dir, f'{_key(job_id)}.{os.getpid()}.{next(_counter)}')
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        os.makedirs(wait_dir, exist_ok=True)
+        sock.bind(path)
+    except OSError:
+        sock.close()
+        return None, None
+    return sock, path
+
+
+def wait_for(job_id, timeout=None, backend=None, wait_dir=None, recheck=RECHECK_INTERVAL):
+    """Block until the job is completed, dead or cancelled, or ``timeout`` seconds pass.
+
+    Returns the job as last read (check its state to tell a timeout apart),
+    or None if there is no such job."""
+    if backend is None:
+        from storage_backend import get_backend
+        backend = get_backend()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    # register before the first read so an ack in between still wakes us
+    sock, path = _register(job_id, wait_dir or default_dir())
+    try:
+        while True:
+            job = backend.get_job(job_id)
+            if job is None or job['state'] in TERMINAL_STATES:
+                return job
+            wait = recheck
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    return job
+            if sock is None:
+                time.sleep(wait)
+                continue
+            sock.settimeout(wait)
+            try:
+                sock.recv(16)
+            except socket.timeout:
+                pass
+    finally:
+        if sock is not None:
+            sock.close()
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
@@ -0,0 +1,251 @@
+import gzip
+import os
+import sqlite3
+import threading
+import time
+
+import job_storage as store
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
+
+DEFAULT_SEGMENT_BYTES = 64 * 1024 * 1024
+
+
+def default_log_dir():
+    """Logs live next to the database so the worker's cwd does not matter."""
+    env = os.environ.get('QUEUECTL_LOG_DIR')
+    if env:
+        return env
+    return os.path.join(os.path.dirname(os.path.abspath(store.DB_PATH)), 'job_logs')
+
+
+class LogStore:
+    """Append-only segmented log store.
+
+    Job output is appended to a small number of large segment files
+    (``segment-000001.log``, ...). An sqlite index maps every run, numbered
+    by a store-wide sequence, to its job_id, attempt and (segment, offset,
+    length) so a record can be read with a single seek. Runs are never
+    replaced: a job retried from the DLQ starts counting attempts at 1
+    again, and its earlier runs stay readable.
+    When the active segment grows past ``segment_bytes`` a new one is started
+    and the sealed segment is rewritten as a gzip file in which every record is
+    its own gzip member, which keeps direct seeks possible after compression.
+    """
+
+    def __init__(self, log_dir=None, segment_bytes=None, compress=True):
+        self.log_dir = log_dir or default_log_dir()
+        self.segment_bytes = int(segment_bytes or DEFAULT_SEGMENT_BYTES)
+        self.compress = compress
+        self._lock = threading.Lock()
+        os.makedirs(self.log_dir, exist_ok=True)
+        self._index_path = os.path.join(self.log_dir, 'index.db')
+        self._lock_path = os.path.join(self.log_dir, '.lock')
+        conn = self._index_conn()
+        conn.execute('BEGIN IMMEDIATE')
+        cols = [r[1] for r in conn.execute('PRAGMA table_info(records)')]
+        if cols and 'seq' not in cols:
+            # indexes written before runs were numbered were keyed (job_id,
+            # attempt); keep their records, in the order they were written
+            conn.execute('ALTER TABLE records RENAME TO records_old')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS records (
+                seq INTEGER PRIMARY KEY,
+                job_id TEXT NOT NULL,
+                attempt INTEGER NOT NULL,
+                segment TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                compressed INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL
+            );
+        ''')
+        if cols and 'seq' not in cols:
+            conn.execute('INSERT INTO records (job_id, attempt, segment, offset, length, compressed, created_at) '
+                         'SELECT job_id, attempt, segment, offset, length, compressed, created_at '
+                         'FROM records_old ORDER BY rowid')
+            conn.execute('DROP TABLE records_old')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_records_job ON records(job_id, seq)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_records_segment ON records(segment)')
+        conn.commit()
+        conn.close()
+
+    def _index_conn(self):
+        conn = sqlite3.connect(self._index_path, timeout=30, check_same_thread=False)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL;')
+            conn.execute('PRAGMA busy_timeout=30000;')
+        except Exception:
+            pass
+        return conn
+
+    def _segment_path(self, name):
+        return os.path.join(self.log_dir, name)
+
+    def _active_segment(self):
+        """Return the name of the highest-numbered uncompressed segment."""
+        names = sorted(n for n in os.listdir(self.log_dir) if n.startswith('segment-') and n.endswith('.log'))
+        if names:
+            return names[-1]
+        sealed = sorted(n for n in os.listdir(self.log_dir) if n.startswith('segment-') and n.endswith('.log.gz'))
+        seq = int(sealed[-1][len('segment-'):-len('.log.gz')]) + 1 if sealed else 1
+        return f'segment-{seq:06d}.log'
+
+    def _acquire(self):
+        self._lock.acquire()
+        fh = None
+        if fcntl is not None:
+            fh = open(self._lock_path, 'a')
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        return fh
+
+    def _release(self, fh):
+        if fh is not None:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+            fh.close()
+        self._lock.release()
+
+    def append(self, job_id, attempt, text):
+        """Append one attempt's output for ``job_id`` and index it."""
+        self.append_many([(job_id, attempt, text)])
+
+    def append_many(self, records):
+        """Append several (job_id, attempt, text) records with one write and one index commit."""
+        offsets = []
+        chunks = []
+        pos = 0
+        for job_id, attempt, text in records:
+            data = text.encode('utf-8')
+            offsets.append((job_id, attempt, pos, len(data)))
+            chunks.append(data)
+            pos += len(data)
+        sealed = None
+        fh = self._acquire()
+        try:
+            name = self._active_segment()
+            path = self._segment_path(name)
+            with open(path, 'ab') as f:
+                f.seek(0, os.SEEK_END)
+                base = f.tell()
+                f.write(b''.join(chunks))
+                f.flush()
+                end = f.tell()
+            now = store.current_time()
+            conn = self._index_conn()
+            conn.executemany(
+                'INSERT INTO records (job_id, attempt, segment, offset, length, compressed, created_at) VALUES (?, ?, ?, ?, ?, 0, ?)',
+                [(job_id, attempt, name, base + offset, length, now) for job_id, attempt, offset, length in offsets]
+            )
+            conn.commit()
+            conn.close()
+            if end >= self.segment_bytes:
+                seq = int(name[len('segment-'):-len('.log')])
+                # touching the next segment makes it the active one for all writers
+                open(self._segment_path(f'segment-{seq + 1:06d}.log'), 'ab').close()
+                sealed = name
+        finally:
+            self._release(fh)
+        if sealed and self.compress:
+            self.compress_segment(sealed)
+
+    def compress_segment(self, name):
+        """Rewrite a sealed segment as per-record gzip members and repoint the index."""
+        src = self._segment_path(name)
+        gz_name = name + '.gz'
+        dst = self._segment_path(gz_name)
+        conn = self._index_conn()
+        rows = conn.execute(
+            'SELECT seq, offset, length FROM records WHERE segment = ? ORDER BY offset',
+            (name,)
+        ).fetchall()
+        updates = []
+        with open(src, 'rb') as fin, open(dst + '.tmp', 'wb') as fout:
+            for seq, offset, length in rows:
+                fin.seek(offset)
+                member = gzip.compress(fin.read(length))
+                updates.append((gz_name, fout.tell(), len(member), seq))
+                fout.write(member)
+        os.replace(dst + '.tmp', dst)
+        conn.executemany(
+            'UPDATE records SET segment = ?, offset = ?, length = ?, compressed = 1 WHERE seq = ?',
+            updates
+        )
+        conn.commit()
+        conn.close()
+        os.remove(src)
+
+    def runs(self, job_id):
+        """(run, attempt) of every logged run of ``job_id``, oldest first."""
+        conn = self._index_conn()
+        rows = conn.execute('SELECT seq, attempt FROM records WHERE job_id = ? ORDER BY seq', (job_id,)).fetchall()
+        conn.close()
+        return rows
+
+    def attempts(self, job_id):
+        """Attempt number of every logged run, oldest first (repeats after a DLQ retry)."""
+        return [attempt for _, attempt in self.runs(job_id)]
+
+    def read(self, job_id, attempt=None, run=None):
+        """Return the record text of one run (see runs()), else the latest run of
+        ``attempt``, else the latest run; None if there is none."""
+        for _ in range(3):
+            conn = self._index_conn()
+            if run is not None:
+                row = conn.execute(
+                    'SELECT segment, offset, length, compressed FROM records WHERE job_id = ? AND seq = ?',
+                    (job_id, run)
+                ).fetchone()
+            elif attempt is None:
+                row = conn.execute(
+                    'SELECT segment, offset, length, compressed FROM records WHERE job_id = ? ORDER BY seq DESC LIMIT 1',
+                    (job_id,)
+                ).fetchone()
+            else:
+                row = conn.execute(
+                    'SELECT segment, offset, length, compressed FROM records WHERE job_id = ? AND attempt = ? '
+                    'ORDER BY seq DESC LIMIT 1',
+                    (job_id, attempt)
+                ).fetchone()
+            conn.close()
+            if not row:
+                return None
+            segment, offset, length, compressed = row
+            try:
+                with open(self._segment_path(segment), 'rb') as f:
+                    f.seek(offset)
+                    data = f.read(length)
+            except FileNotFoundError:
+                # segment was compressed between the index lookup and the open
+                time.sleep(0.05)
+                continue
+            if compressed:
+                data = gzip.decompress(data)
+            return data.decode('utf-8', errors='replace')
+        return None
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_default():
+    """Process-wide LogStore configured from config/env."""
+    global _default
+    with _default_lock:
+        if _default is None or _default.log_dir != default_log_dir():
+            import config
+            _default = LogStore(segment_bytes=config.get_config('log_segment_bytes'))
+        return _default
+
+
+def format_record(attempt, rc, out, err):
+    lines = [f"--- {time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())} attempt={attempt} rc={rc}\n"]
+    if out:
+        lines.append("OUT:\n" + out + "\n")
+    if err:
+        lines.append("ERR:\n" + err + "\n")
+    return ''.join(lines)
@@ -1,19 +1,19 @@
-import click
-import uuid
-import multiprocessing
-import threading
-import time
-import os
 import sys
-import signal
-import subprocess
-import json
-from datetime import datetime, timedelta
 
-from job_storage import init_db, add_job, current_time, list_jobs_by_state, get_stats
-import worker as worker_mod
-import dead_letter_queue as dlq_mod
-import config as cfg
+if __name__ == "__main__" and len(sys.argv) > 1 and sys.argv[1] in ('enqueue', 'status'):
+    # hot commands skip click and the worker machinery entirely
+    import fast_cli
+    _rc = fast_cli.main(sys.argv[1:])
+    if _rc is not None:
+        sys.exit(_rc)
+
+import os
+import time
+
+import click
+
+# Heavier modules (worker, subprocess, multiprocessing, job_storage, ...) are
+# imported inside the commands that use them to keep CLI startup fast.
 
 @click.group()
 def cli():
@@ -23,7 +23,8 @@ def cli():
 @cli.command()
 def init():
     """Initialize database (run on first setup)."""
-    init_db()
+    from storage_backend import get_backend
+    get_backend().init()
     click.echo("Database initialized.")
 
 @cli.command()
@@ -34,73 +35,141 @@ def init():
 @click.option('--delay', type=int, default=None, help='Delay in seconds before first run')
 @click.option('--run-at', default=None, help='ISO timestamp (UTC) for when the job should run, e.g. 2025-11-09T12:00:00Z')
 @click.option('--max-retries', default=3, type=int, help='Max retries allowed (default 3)')
-def enqueue(job_id, command, command_file, job_file, delay, run_at, max_retries):
+@click.option('--retry-base', type=float, default=None, help='Backoff base: retry n waits factor * base ** n seconds (default: backoff_base config)')
+@click.option('--retry-factor', type=float, default=None, help='Backoff multiplier (default: retry_factor config)')
+@click.option('--retry-max-delay', type=float, default=None, help='Cap on a single retry delay in seconds (default: retry_max_delay config)')
+@click.option('--retry-jitter', type=click.Choice(['none', 'full', 'decorrelated']), default=None, help='Jitter mode (default: retry_jitter config)')
+@click.option('--retry-on-exit-codes', default=None, help='Comma-separated exit codes to retry on; other failures go straight to the DLQ')
+@click.option('--cpus', type=float, default=None, help='CPUs the job needs; workers only start it when that much capacity is free')
+@click.option('--memory-mb', type=int, default=None, help='Memory (MB) the job needs; also its rlimit with --enforce-limits workers')
+@click.option('--queue', default=None, help="Named queue to put the job in (default: 'default')")
+@click.option('--batchable', is_flag=True, default=False, help='Let `worker-run --batch-size` workers run the job in a micro-batch with other small jobs')
+@click.option('--tenant', default=None, help="Tenant the job is accounted to for fair claiming (default: 'default')")
+@click.option('--job-timeout', type=float, default=None, help='Stop the job after this many seconds (default: job_timeout config)')
+@click.option('--wait', is_flag=True, default=False, help="Block until the job is completed or dead, print its output and exit with its status")
+@click.option('--timeout', type=float, default=None, help='With --wait, give up after this many seconds (exit status 124)')
+def enqueue(job_id, command, command_file, job_file, delay, run_at, max_retries, cpus, memory_mb, queue, batchable, tenant,
+            job_timeout, wait, timeout, **retry_opts):
     """Add a new job to the queue."""
-    # allow full job payload via --job-file
-    if job_file:
-        with open(job_file, 'r', encoding='utf-8') as f:
-            job_data = json.load(f)
-        # ensure minimal fields
-        if 'id' not in job_data or not job_data.get('id'):
-            job_data['id'] = job_id or str(uuid.uuid4())
-        if 'command' not in job_data:
-            raise click.ClickException('job JSON must include a "command" field')
-        # normalize state/details
-        now = current_time()
-        job_data.setdefault('state', 'pending')
-        job_data.setdefault('attempts', 0)
-        job_data.setdefault('max_retries', max_retries)
-        job_data['created_at'] = job_data.get('created_at', now)
-        job_data['updated_at'] = job_data.get('updated_at', now)
-    else:
-        if command_file:
-            with open(command_file, 'r', encoding='utf-8') as f:
-                command = f.read().strip()
-
-        if not command:
-            raise click.ClickException('Either --command or --command-file or --job-file must be provided')
-
-        if job_id is None:
-            job_id = str(uuid.uuid4())
-        now = current_time()
-        job_data = {
-            'id': job_id,
-            'command': command,
-            'state': 'pending',
-            'attempts': 0,
-            'max_retries': max_retries,
-            'created_at': now,
-            'updated_at': now
-        }
-
-    # scheduling: set next_run_at based on delay or run_at
-    if delay is not None:
-        try:
-            delay_int = int(delay)
-            next_run = datetime.utcnow() + timedelta(seconds=delay_int)
-            job_data['next_run_at'] = next_run.isoformat() + 'Z'
-        except Exception:
-            raise click.ClickException('Invalid --delay value')
-    elif run_at:
-        # naive validation - accept given string
-        job_data['next_run_at'] = run_at
+    from fast_cli import build_enqueue_job, retry_policy_from_options, wait_for_result
+    from storage_backend import get_backend
     try:
-        add_job(job_data)
-        click.echo(f"Enqueued job: {job_data['id']}")
+        job_data = build_enqueue_job(job_id, command, command_file, job_file, delay, run_at, max_retries,
+                                     retry_policy=retry_policy_from_options(retry_opts), cpus=cpus, memory_mb=memory_mb,
+                                     queue=queue, batchable=batchable, tenant=tenant,
+                                     job_timeout=job_timeout)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    backend = get_backend()
+    try:
+        backend.add_job(job_data)
     except Exception as e:
         click.echo(f"Failed to enqueue job: {e}", err=True)
+        if wait:
+            sys.exit(1)
+        return
+    click.echo(f"Enqueued job: {job_data['id']}", err=wait)
+    if wait:
+        sys.exit(wait_for_result(backend, job_data['id'], timeout))
 
 
+@cli.command()
+@click.argument('job_id')
+@click.option('--output-only', is_flag=True, default=False, help='Print only the captured stdout')
+def result(job_id, output_only):
+    """Show the exit code and captured stdout of a job's latest run."""
+    from storage_backend import get_backend
+    res = get_backend().get_result(job_id)
+    if res is None:
+        raise click.ClickException(f"No result recorded for job {job_id}")
+    if not output_only:
+        click.echo(f"Job: {res['job_id']}")
+        click.echo(f"Exit code: {res['exit_code']}" + (" (timed out)" if res.get('timed_out') else ""))
+        click.echo(f"Finished: {res['finished_at']}")
+        click.echo("Output (truncated):" if res['truncated'] else "Output:")
+    click.echo(res['output'] or '', nl=False)
+
+
+@cli.command(name='enqueue-daemon')
+@click.option('--address', default=None, help='Unix socket path or host:port (default: queuectl.sock next to the DB, or $QUEUECTL_DAEMON_ADDR)')
+@click.option('--max-batch', default=1000, type=int, help='Maximum jobs per group commit')
+@click.option('--max-wait-ms', default=2.0, type=float, help='How long a batch waits for more jobs before committing')
+def enqueue_daemon(address, max_batch, max_wait_ms):
+    """Run a long-lived enqueue server that group-commits jobs (see enqueue_client.py)."""
+    import enqueue_daemon as daemon_mod
+    try:
+        d = daemon_mod.EnqueueDaemon(address=address, max_batch=max_batch, max_wait=max_wait_ms / 1000.0)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Enqueue daemon listening on {d.address}")
+    try:
+        d.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
 
+@cli.command()
+@click.option('--address', default='127.0.0.1:7879', help='HOST:PORT to listen on (use 0.0.0.0:PORT for workers on other machines)')
+@click.option('--lease-seconds', default=30, type=int, help='Requeue a leased job when its worker has not renewed the lease for this long')
+def coordinator(address, lease_seconds):
+    """Serve claims and acks to `worker-run --coordinator` workers on other machines."""
+    import threading
+    import contention
+    import coordinator as coordinator_mod
+    c = coordinator_mod.Coordinator(address=address, lease_seconds=lease_seconds)
+    click.echo(f"Coordinator listening on {c.address}")
+    stop = threading.Event()
+    publisher = contention.start_publisher(stop)
+    try:
+        c.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        publisher.join(timeout=5)
+
+
+def _parse_queues(ctx, param, value):
+    if value is None:
+        return None
+    import queues
+    try:
+        return queues.parse(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
 
 
 @cli.command(name='worker-run')
 @click.option('--count', default=1, type=int, help='Number of workers')
 @click.option('--poll-interval', default=1.0, type=float)
 @click.option('--use-processes', default=False, is_flag=True, help='Spawn multiple processes instead of threads')
-def worker_run(count, poll_interval, use_processes):
+@click.option('--group-acks', default=False, is_flag=True, help='Batch job completions/failures into shared transactions')
+@click.option('--no-scheduler', default=False, is_flag=True, help='Do not materialize recurring schedules in this process')
+@click.option('--cpus', type=float, default=None, help='CPUs this worker process may hand out to jobs (default: worker_cpus config, else all)')
+@click.option('--memory-mb', type=int, default=None, help='Memory (MB) this worker process may hand out to jobs (default: worker_memory_mb config, else all)')
+@click.option('--enforce-limits/--no-enforce-limits', default=None, help="Apply each job's memory_mb as an rlimit (default: enforce_resource_limits config)")
+@click.option('--trace', 'trace', default=None, type=click.Path(dir_okay=False), help='Append per-job phase timings (claim/spawn/run/log/ack) to FILE')
+@click.option('--trace-format', type=click.Choice(['jsonl', 'chrome']), default=None, help='Trace file format (default: chrome for *.json, else jsonl)')
+@click.option('--profile-dir', default=None, type=click.Path(file_okay=False), help='Write sampled cProfile dumps of the worker threads to DIR')
+@click.option('--profile-every', default=100, type=int, help='With --profile-dir, profile one job in N per thread')
+@click.option('--coordinator', default=None, help='Lease jobs from a coordinator at HOST:PORT instead of the local DB')
+@click.option('--lease-batch', default=None, type=int, help='With --coordinator, jobs leased per round-trip (default: --count)')
+@click.option('--queues', default=None, callback=_parse_queues, help='Only take jobs from these queues, e.g. interactive:4,batch:1 (weights default to 1)')
+@click.option('--batch-size', default=None, type=click.IntRange(min=1), help='Claim batchable jobs up to N at a time and run them in one long-lived shell per worker')
+@click.option('--tenant-policy', type=click.Choice(['fair', 'fifo']), default=None, help='Claim weighted-fairly across tenants or oldest-first (default: tenant_policy config)')
+def worker_run(count, poll_interval, use_processes, group_acks, no_scheduler, cpus, memory_mb, enforce_limits,
+               trace, trace_format, profile_dir, profile_every, coordinator, lease_batch, queues, batch_size,
+               tenant_policy):
     """Internal command: run workers in foreground. Intended for use by --background launcher."""
-    worker_mod.start_workers(count=count, poll_interval=poll_interval, use_processes=use_processes)
+    import worker as worker_mod
+    tracing = None
+    if trace or profile_dir:
+        tracing = {'trace': trace, 'trace_format': trace_format, 'profile_dir': profile_dir, 'profile_every': profile_every}
+    worker_mod.start_workers(count=count, poll_interval=poll_interval, use_processes=use_processes,
+                             group_acks=group_acks, scheduler=not no_scheduler, cpus=cpus, memory_mb=memory_mb,
+                             enforce_limits=enforce_limits, tracing=tracing, coordinator=coordinator,
+                             lease_batch=lease_batch, queues=queues, batch_size=batch_size,
+                             tenant_policy=tenant_policy)
 
 
 @cli.command(name='worker-start')
@@ -108,22 +177,52 @@ def worker_run(count, poll_interval, use_processes):
 @click.option('--poll-interval', default=1.0, type=float, help='Polling interval seconds')
 @click.option('--background', is_flag=True, default=False, help='Start worker(s) in background (detached)')
 @click.option('--use-processes', is_flag=True, default=False, help='Run each worker in a separate process')
-def worker_start_background(count, poll_interval, background, use_processes):
+@click.option('--group-acks', is_flag=True, default=False, help='Batch job completions/failures into shared transactions')
+@click.option('--no-scheduler', is_flag=True, default=False, help='Do not materialize recurring schedules in this process')
+@click.option('--cpus', type=float, default=None, help='CPUs this worker process may hand out to jobs (default: worker_cpus config, else all)')
+@click.option('--memory-mb', type=int, default=None, help='Memory (MB) this worker process may hand out to jobs (default: worker_memory_mb config, else all)')
+@click.option('--enforce-limits/--no-enforce-limits', default=None, help="Apply each job's memory_mb as an rlimit (default: enforce_resource_limits config)")
+@click.option('--queues', default=None, callback=_parse_queues, help='Only take jobs from these queues, e.g. interactive:4,batch:1 (weights default to 1)')
+@click.option('--batch-size', default=None, type=click.IntRange(min=1), help='Claim batchable jobs up to N at a time and run them in one long-lived shell per worker')
+@click.option('--tenant-policy', type=click.Choice(['fair', 'fifo']), default=None, help='Claim weighted-fairly across tenants or oldest-first (default: tenant_policy config)')
+def worker_start_background(count, poll_interval, background, use_processes, group_acks, no_scheduler, cpus, memory_mb,
+                            enforce_limits, queues, batch_size, tenant_policy):
     """Start worker(s). By default runs in foreground; use --background to spawn a detached process and write PID file."""
     pidfile = os.path.join(os.getcwd(), 'queuectl.pid')
     if not background:
+        import worker as worker_mod
         click.echo(f"Starting {count} worker(s) in foreground. Press Ctrl+C to stop.")
         try:
-            worker_mod.start_workers(count=count, poll_interval=poll_interval, use_processes=use_processes)
+            worker_mod.start_workers(count=count, poll_interval=poll_interval, use_processes=use_processes,
+                                     group_acks=group_acks, scheduler=not no_scheduler, cpus=cpus, memory_mb=memory_mb,
+                                     enforce_limits=enforce_limits, queues=queues, batch_size=batch_size,
+                                     tenant_policy=tenant_policy)
         except KeyboardInterrupt:
             click.echo("Stopping workers...")
         return
 
     # spawn a detached background process that runs 'worker-run'
+    import subprocess
     python = sys.executable
     cmd = [python, os.path.abspath(__file__), 'worker-run', '--count', str(count), '--poll-interval', str(poll_interval)]
     if use_processes:
         cmd.append('--use-processes')
+    if group_acks:
+        cmd.append('--group-acks')
+    if no_scheduler:
+        cmd.append('--no-scheduler')
+    if cpus:
+        cmd += ['--cpus', str(cpus)]
+    if memory_mb:
+        cmd += ['--memory-mb', str(memory_mb)]
+    if enforce_limits is not None:
+        cmd.append('--enforce-limits' if enforce_limits else '--no-enforce-limits')
+    if queues:
+        cmd += ['--queues', ','.join(f'{name}:{weight}' for name, weight in queues.items())]
+    if batch_size:
+        cmd += ['--batch-size', str(batch_size)]
+    if tenant_policy:
+        cmd += ['--tenant-policy', tenant_policy]
 
     # platform-specific detach
     creationflags = 0
@@ -145,6 +244,8 @@ def worker_start_background(count, poll_interval, background, use_processes):
 
 @cli.command(name='worker-stop')
 def worker_stop():
+    import signal
+    import subprocess
     pidfile = os.path.join(os.getcwd(), 'queuectl.pid')
     if not os.path.exists(pidfile):
         click.echo('No pidfile found; are workers running?')
@@ -178,10 +279,11 @@ def worker_stop():
 
 
 @cli.command()
-@click.option('--state', default=None, help='Filter by state (pending, processing, completed, failed, dead)')
+@click.option('--state', default=None, help='Filter by state (pending, processing, completed, failed, dead, cancelled)')
 def list(state):
     """List jobs, optionally filtered by state."""
-    jobs = list_jobs_by_state(state)
+    from storage_backend import get_backend
+    jobs = get_backend().list_jobs_by_state(state)
     if not jobs:
         click.echo("No jobs found.")
         return
@@ -192,10 +294,135 @@ def list(state):
 @cli.command()
 def status():
     """Show summary of job states."""
-    stats = get_stats()
+    from fast_cli import print_queue_depths
+    from storage_backend import get_backend
+    backend = get_backend()
+    stats = backend.get_stats()
     click.echo("Job counts by state:")
     for k, v in stats.items():
         click.echo(f"  {k}: {v}")
+    print_queue_depths(backend.get_queue_stats(), echo=click.echo)
+
+
+@cli.command(name='contention')
+@click.option('--json', 'as_json', is_flag=True, default=False, help='Print the raw snapshots as JSON')
+@click.option('--clear', is_flag=True, default=False, help='Forget the snapshots of processes that have exited')
+def contention_cmd(as_json, clear):
+    """Show SQLite lock-contention counters published by worker-run and coordinator processes."""
+    import json
+    import contention
+    if clear:
+        click.echo(f"Removed {contention.clear()} snapshot(s) of exited processes")
+        return
+    snapshots = contention.read_all()
+    if as_json:
+        click.echo(json.dumps(snapshots, indent=2))
+        return
+    if not snapshots:
+        click.echo("No contention stats published yet (worker-run publishes them every few seconds).")
+        return
+    click.echo(f"{'operation':<16} {'calls':>9} {'busy':>7} {'retries':>7} {'gave_up':>7} {'errors':>6} "
+               f"{'backoff_s':>9} {'total_s':>9} {'avg_ms':>7}")
+    for op, c in sorted(contention.totals(snapshots).items()):
+        avg = c['elapsed'] / c['calls'] * 1000 if c['calls'] else 0.0
+        click.echo(f"{op:<16} {c['calls']:>9} {c['busy']:>7} {c['retries']:>7} {c['gave_up']:>7} {c['errors']:>6} "
+                   f"{c['wait']:>9.3f} {c['elapsed']:>9.3f} {avg:>7.2f}")
+    click.echo("Processes:")
+    for data in snapshots:
+        state = 'running' if data['alive'] else 'exited'
+        line = f"  pid {data['pid']} ({state})"
+        if 'claim_pause' in data:
+            line += f" claim pause {data['claim_pause'] * 1000:.0f}ms, {data['saturated_claims']} saturated claim(s)"
+        click.echo(line)
+
+
+@cli.command(name='tenants')
+@click.option('--json', 'as_json', is_flag=True, default=False, help='Print the stats as JSON')
+def tenants_cmd(as_json):
+    """Show per-tenant backlog, weights and claim wait times."""
+    import json
+    import contention
+    import tenants
+    from storage_backend import get_backend
+    stats = get_backend().get_tenant_stats()
+    waits = tenants.wait_totals(contention.read_all())
+    weights = tenants.configured_weights()
+    rows = {}
+    for name in sorted(set(stats) | set(waits)):
+        s = stats.get(name, {})
+        w = waits.get(name, {'claims': 0, 'wait': 0.0, 'max_wait': 0.0})
+        rows[name] = {'weight': weights.get(name, 1), 'pending': s.get('pending', 0),
+                      'processing': s.get('processing', 0), 'waiting_since': s.get('waiting_since'),
+                      'claims': w['claims'], 'avg_wait': w['wait'] / w['claims'] if w['claims'] else None,
+                      'max_wait': w['max_wait']}
+    if as_json:
+        click.echo(json.dumps(rows, indent=2))
+        return
+    if not rows:
+        click.echo("No tenants with jobs or published claim stats.")
+        return
+    import job_storage as store
+    from datetime import datetime
+    now = datetime.utcnow()
+    click.echo(f"{'tenant':<20} {'weight':>6} {'pending':>8} {'processing':>10} {'oldest_s':>9} "
+               f"{'claims':>8} {'avg_wait_s':>10} {'max_wait_s':>10}")
+    for name, r in rows.items():
+        since = store.parse_iso(r['waiting_since'] or '')
+        oldest = f"{max(0.0, (now - since).total_seconds()):.1f}" if since else '-'
+        avg = f"{r['avg_wait']:.3f}" if r['avg_wait'] is not None else '-'
+        click.echo(f"{name:<20} {r['weight']:>6} {r['pending']:>8} {r['processing']:>10} {oldest:>9} "
+                   f"{r['claims']:>8} {avg:>10} {r['max_wait']:>10.3f}")
+
+
+@cli.command()
+@click.argument('job_id')
+@click.option('--attempt', type=int, default=None, help='Show a specific attempt (default: all attempts)')
+@click.option('--tail', type=int, default=None, help='Only show the last N lines of each record')
+@click.option('--follow', is_flag=True, default=False, help='Keep printing new attempts until the job finishes')
+def logs(job_id, attempt, tail, follow):
+    """Show captured output for a job."""
+    import log_store
+    from storage_backend import get_backend
+    get_job = get_backend().get_job
+    ls = log_store.get_default()
+
+    def _show(run):
+        text = ls.read(job_id, run=run) or ''
+        if tail is not None:
+            text = ''.join(text.splitlines(keepends=True)[-tail:]) if tail > 0 else ''
+        click.echo(text, nl=False)
+
+    if attempt is not None:
+        # after a DLQ retry the same attempt number has run more than once
+        runs = [run for run, n in ls.runs(job_id) if n == attempt]
+        if not runs:
+            raise click.ClickException(f'No log for job {job_id} attempt {attempt}')
+        for run in runs:
+            _show(run)
+        return
+
+    seen = set()
+    while True:
+        for run, _ in ls.runs(job_id):
+            if run not in seen:
+                seen.add(run)
+                _show(run)
+        if not follow:
+            break
+        job = get_job(job_id)
+        if job is None or job['state'] in ('completed', 'dead', 'cancelled'):
+            # the final attempt may be indexed just before the state flips
+            for run, _ in ls.runs(job_id):
+                if run not in seen:
+                    seen.add(run)
+                    _show(run)
+            break
+        try:
+            time.sleep(0.5)
+        except KeyboardInterrupt:
+            break
+    if not seen:
+        click.echo(f'No logs for job {job_id}')
 
 
 @cli.group()
@@ -206,6 +433,7 @@ def dlq():
 
 @dlq.command('list')
 def dlq_list():
+    import dead_letter_queue as dlq_mod
     jobs = dlq_mod.list_dead()
     if not jobs:
         click.echo('DLQ empty')
@@ -214,9 +442,64 @@ def dlq_list():
         click.echo(f"{j['id']} | attempts={j['attempts']}/{j['max_retries']} | cmd={j['command']}")
 
 
+def _bulk_options(f):
+    """Filters and switches shared by the bulk admin commands."""
+    options = [
+        click.option('--since', default=None, help='Only jobs last updated at or after this ISO time or age (e.g. 2h, 7d)'),
+        click.option('--before', default=None, help='Only jobs last updated before this ISO time or age (e.g. 30m)'),
+        click.option('--command-like', default=None, help="Only jobs whose command matches this SQL LIKE pattern, e.g. '%backup%'"),
+        click.option('--dry-run', is_flag=True, default=False, help='Only print how many jobs match'),
+        click.option('--chunk-size', default=1000, type=click.IntRange(min=1), help='Jobs changed per transaction'),
+    ]
+    for option in reversed(options):
+        f = option(f)
+    return f
+
+
+def _run_bulk(action, verb, state=None, since=None, before=None, command_like=None, dry_run=False, chunk_size=1000):
+    """Run a chunked bulk action, printing progress after each committed chunk."""
+    import job_storage as store
+    from storage_backend import get_backend
+    try:
+        since = store.parse_cutoff(since) if since else None
+        before = store.parse_cutoff(before) if before else None
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+    def _progress(job_ids, done, total):
+        if action in ('cancel', 'purge'):
+            # wake `enqueue --wait` callers of jobs that will never run now
+            import job_waiter
+            job_waiter.notify(job_ids)
+        click.echo(f"  {verb} {done}/{total}", err=True)
+
+    n = get_backend().bulk_update(action, state=state, since=since, before=before, command_like=command_like,
+                                  dry_run=dry_run, chunk_size=chunk_size, on_chunk=_progress)
+    if dry_run:
+        click.echo(f"{n} job(s) would be {verb}")
+    else:
+        click.echo(f"{verb.capitalize()} {n} job(s)")
+
+
+def _require_selection(all_jobs, since, before, command_like):
+    if not (all_jobs or since or before or command_like):
+        raise click.UsageError('Select jobs with --all, --since, --before or --command-like')
+
+
 @dlq.command('retry')
-@click.argument('job_id')
-def dlq_retry(job_id):
+@click.argument('job_id', required=False)
+@click.option('--all', 'all_jobs', is_flag=True, default=False, help='Retry every dead job')
+@_bulk_options
+def dlq_retry(job_id, all_jobs, since, before, command_like, dry_run, chunk_size):
+    """Retry one dead job, or every dead job matching the filters."""
+    if job_id is None:
+        _require_selection(all_jobs, since, before, command_like)
+        _run_bulk('retry', 'retried', since=since, before=before, command_like=command_like, dry_run=dry_run,
+                  chunk_size=chunk_size)
+        return
+    if all_jobs or since or before or command_like or dry_run:
+        raise click.UsageError('Give either a JOB_ID or bulk options, not both')
+    import dead_letter_queue as dlq_mod
     ok = dlq_mod.retry(job_id)
     if ok:
         click.echo(f"Retried job {job_id}")
@@ -224,6 +507,194 @@ def dlq_retry(job_id):
         click.echo(f"Job {job_id} not found in DLQ or retry failed", err=True)
 
 
+@cli.command()
+@click.option('--all', 'all_jobs', is_flag=True, default=False, help='Cancel every pending job')
+@_bulk_options
+def cancel(all_jobs, since, before, command_like, dry_run, chunk_size):
+    """Cancel pending jobs matching the filters (they move to 'cancelled')."""
+    _require_selection(all_jobs, since, before, command_like)
+    _run_bulk('cancel', 'cancelled', since=since, before=before, command_like=command_like, dry_run=dry_run,
+              chunk_size=chunk_size)
+
+
+@cli.command()
+@click.argument('state', type=click.Choice(['processing']))
+@_bulk_options
+def requeue(state, since, before, command_like, dry_run, chunk_size):
+    """Move jobs stuck in processing (e.g. after a worker crash) back to pending.
+
+    Jobs still running on a live worker would run twice, so narrow the
+    selection with --before when workers are up."""
+    _run_bulk('requeue', 'requeued', since=since, before=before, command_like=command_like, dry_run=dry_run,
+              chunk_size=chunk_size)
+
+
+@cli.command()
+@click.argument('state', type=click.Choice(['completed', 'dead', 'cancelled']))
+@_bulk_options
+def purge(state, since, before, command_like, dry_run, chunk_size):
+    """Delete finished jobs in STATE and their recorded results."""
+    _run_bulk('purge', 'purged', state=state, since=since, before=before, command_like=command_like,
+              dry_run=dry_run, chunk_size=chunk_size)
+
+
+@cli.command()
+@click.argument('path')
+@click.option('--state', 'states', multiple=True,
+              type=click.Choice(['pending', 'processing', 'completed', 'dead', 'cancelled']),
+              help='Only jobs in this state (repeatable)')
+@click.option('--since', default=None, help='Only jobs last updated at or after this ISO time or age (e.g. 2h, 7d)')
+@click.option('--before', default=None, help='Only jobs last updated before this ISO time or age')
+@click.option('--full', is_flag=True, default=False, help='Write a consistent copy of the whole database instead (SQLite online backup)')
+def export(path, states, since, before, full):
+    """Stream jobs to PATH as JSONL (gzip-compressed for *.gz; - for stdout)."""
+    import job_storage as store
+    import snapshot
+    if full:
+        if states or since or before or path == '-':
+            raise click.UsageError('--full copies the whole database to a file; it takes no filters')
+        snapshot.backup(path, on_progress=lambda remaining, total: click.echo(
+            f"  copied {total - remaining}/{total} pages", err=True))
+        click.echo(f"Wrote database snapshot to {path}", err=True)
+        return
+    try:
+        since = store.parse_cutoff(since) if since else None
+        before = store.parse_cutoff(before) if before else None
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    n = snapshot.export_jobs(path, states=states, since=since, before=before,
+                             on_chunk=lambda done: click.echo(f"  exported {done}", err=True))
+    click.echo(f"Exported {n} job(s)", err=True)
+
+
+@cli.command(name='import')
+@click.argument('path')
+@click.option('--on-conflict', type=click.Choice(['skip', 'replace', 'fail']), default='skip',
+              help='What to do with job ids that already exist (default: skip)')
+@click.option('--chunk-size', default=10000, type=click.IntRange(min=1), help='Jobs inserted per transaction')
+def import_cmd(path, on_conflict, chunk_size):
+    """Load jobs from an `export` file (plain or gzip JSONL; - for stdin)."""
+    import sqlite3
+    import job_storage as store
+    import snapshot
+    store.init_db()
+    try:
+        read, written = snapshot.import_jobs(path, on_conflict=on_conflict, chunk_size=chunk_size,
+                                             on_chunk=lambda done: click.echo(f"  read {done}", err=True))
+    except (ValueError, sqlite3.IntegrityError) as e:
+        raise click.ClickException(f"Import stopped: {e}")
+    click.echo(f"Imported {written} of {read} job(s)")
+
+
+@cli.group()
+def db():
+    """SQLite maintenance: WAL checkpoints and file stats."""
+    pass
+
+
+@db.command('checkpoint')
+@click.option('--mode', type=click.Choice(['passive', 'full', 'restart', 'truncate']), default='truncate',
+              help='passive copies what it can without waiting; truncate (default) also waits for old readers and empties the WAL file')
+@click.option('--busy-timeout', type=float, default=5.0, help='Seconds to wait for readers and writers before giving up')
+def db_checkpoint(mode, busy_timeout):
+    """Copy the write-ahead log back into the DB now."""
+    import job_storage as store
+    before = store.wal_size()
+    busy, frames, done = store.checkpoint_wal(mode.upper(), busy_timeout_ms=busy_timeout * 1000)
+    click.echo(f"Checkpointed {max(done, 0)} of {max(frames, 0)} WAL frame(s); "
+               f"WAL {before / 1048576:.1f} MiB -> {store.wal_size() / 1048576:.1f} MiB")
+    if busy:
+        click.echo("Readers or writers were still active; run it again later for a complete checkpoint.", err=True)
+        sys.exit(1)
+
+
+@db.command('stats')
+@click.option('--json', 'as_json', is_flag=True, default=False, help='Print the stats as JSON')
+def db_stats(as_json):
+    """Show DB and WAL file sizes, the tuning profile in effect and worker-run checkpoint counters."""
+    import json
+    import contention
+    import job_storage as store
+    stats = store.get_db_stats()
+    checkpoints = {}
+    for data in contention.read_all():
+        for k, v in (data.get('checkpoints') or {}).items():
+            checkpoints[k] = max(checkpoints.get(k, 0), v) if k.endswith('bytes') else checkpoints.get(k, 0) + v
+    stats['checkpoints'] = checkpoints
+    if as_json:
+        click.echo(json.dumps(stats, indent=2))
+        return
+    click.echo(f"DB file:   {stats['db_bytes'] / 1048576:.1f} MiB ({stats['page_count']} pages of {stats['page_size']} bytes, "
+               f"{stats['freelist_count']} free)")
+    click.echo(f"WAL file:  {stats['wal_bytes'] / 1048576:.1f} MiB")
+    click.echo(f"Profile:   {stats['profile']} (synchronous={stats['synchronous']}, cache_size={stats['cache_size']}, "
+               f"mmap_size={stats['mmap_size']}, temp_store={stats['temp_store']}, "
+               f"wal_autocheckpoint={stats['wal_autocheckpoint']}, journal_size_limit={stats['journal_size_limit']})")
+    if checkpoints:
+        click.echo(f"Checkpointer: {checkpoints['runs']} run(s), {checkpoints['truncations']} truncation(s), "
+                   f"{checkpoints['busy']} busy, {checkpoints['errors']} error(s), {checkpoints['frames']} frame(s) copied, "
+                   f"largest WAL seen {checkpoints['max_wal_bytes'] / 1048576:.1f} MiB")
+    else:
+        click.echo("Checkpointer: no stats published (worker-run publishes them every few seconds)")
+
+
+@cli.group()
+def schedule():
+    """Recurring job schedules (materialized by worker-run)."""
+    pass
+
+
+@schedule.command('add')
+@click.option('--id', 'schedule_id', required=True, help='Schedule ID; job instances are named <id>@<fire time>')
+@click.option('--command', required=True, help='Shell command to run on each fire')
+@click.option('--cron', default=None, help='5-field cron expression in UTC, e.g. "*/5 * * * *" or @hourly')
+@click.option('--every', type=int, default=None, help='Fixed interval in seconds')
+@click.option('--max-retries', default=3, type=int, help='Max retries for each job instance')
+@click.option('--misfire', type=click.Choice(['fire_once', 'fire_all', 'skip']), default='fire_once',
+              help='What to do with fires missed while no worker was running')
+def schedule_add(schedule_id, command, cron, every, max_retries, misfire):
+    import job_storage as store
+    import scheduler as sched_mod
+    if bool(cron) == bool(every):
+        raise click.ClickException('Exactly one of --cron or --every must be given')
+    if every is not None and every <= 0:
+        raise click.ClickException('--every must be a positive number of seconds')
+    try:
+        first = sched_mod.first_fire(cron=cron, interval_seconds=every)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    try:
+        store.add_schedule({
+            'id': schedule_id, 'command': command, 'cron': cron, 'interval_seconds': every,
+            'max_retries': max_retries, 'misfire_policy': misfire, 'next_fire_at': store.schedule_ts(first),
+        })
+    except Exception as e:
+        raise click.ClickException(f'Failed to add schedule: {e}')
+    click.echo(f"Added schedule {schedule_id}; next fire at {store.schedule_ts(first)}")
+
+
+@schedule.command('list')
+def schedule_list():
+    import job_storage as store
+    rows = store.list_schedules()
+    if not rows:
+        click.echo('No schedules.')
+        return
+    for s in rows:
+        spec = f"cron={s['cron']}" if s['cron'] else f"every={s['interval_seconds']}s"
+        click.echo(f"{s['id']} | {spec} | misfire={s['misfire_policy']} | next={s['next_fire_at']} | last={s['last_fired_at']} | cmd={s['command']}")
+
+
+@schedule.command('remove')
+@click.argument('schedule_id')
+def schedule_remove(schedule_id):
+    import job_storage as store
+    if store.disable_schedule(schedule_id):
+        click.echo(f"Removed schedule {schedule_id}")
+    else:
+        click.echo(f"Schedule {schedule_id} not found", err=True)
+
+
 @cli.group()
 def config():
     """Configuration commands."""
@@ -234,6 +705,7 @@ def config():
 @click.argument('key')
 @click.argument('value')
 def config_set(key, value):
+    import config as cfg
     cfg.set_config(key, value)
     click.echo(f"Set {key} = {value}")
 
@@ -241,6 +713,7 @@ def config_set(key, value):
 @config.command('get')
 @click.argument('key')
 def config_get(key):
+    import config as cfg
     v = cfg.get_config(key)
     click.echo(f"{key} = {v}")
 
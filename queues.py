@@ -0,0 +1,71 @@
+"""Named queues and weighted worker subscriptions.
+
+Every job belongs to one queue (``default`` unless enqueued with
+``--queue``). ``worker-run --queues batch:1,interactive:4`` subscribes a
+worker process to some queues with relative weights: before each claim a
+QueueSelector orders the subscribed queues by smooth weighted round-robin,
+and the claim takes the oldest runnable job of the first queue in that
+order that has one. Over time each busy queue gets claims in proportion to
+its weight, and a queue with nothing runnable gives its turn to the others.
+"""
+import re
+
+
+DEFAULT_QUEUE = 'default'
+
+_NAME = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+
+def validate_name(name):
+    """Return the queue name, or raise ValueError."""
+    if name is None:
+        return DEFAULT_QUEUE
+    if not isinstance(name, str) or not _NAME.match(name):
+        raise ValueError(f'invalid queue name {name!r}: use 1-64 letters, digits, "_", "-" or "."')
+    return name
+
+
+def parse(spec):
+    """``a,b:3`` -> {'a': 1, 'b': 3}; raises ValueError."""
+    weights = {}
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, weight = part.partition(':')
+        name = validate_name(name.strip())
+        try:
+            weight = int(weight) if weight else 1
+        except ValueError:
+            raise ValueError(f'invalid weight for queue {name!r}: {weight!r}')
+        if weight < 1:
+            raise ValueError(f'weight for queue {name!r} must be at least 1')
+        weights[name] = weight
+    if not weights:
+        raise ValueError('no queues given')
+    return weights
+
+
+class QueueSelector:
+    """Claim order for a weighted queue subscription, shared by the threads of a process."""
+
+    def __init__(self, weights):
+        # imported here so the CLI fast path stays free of threading
+        import threading
+        self.weights = dict(weights)
+        self._total = sum(self.weights.values())
+        self._current = dict.fromkeys(self.weights, 0)
+        # fallback order after the chosen queue: heaviest first
+        self._by_weight = sorted(self.weights, key=lambda q: -self.weights[q])
+        self._lock = threading.Lock()
+
+    def order(self):
+        """Queues to try for the next claim, the one whose turn it is first."""
+        if len(self.weights) == 1:
+            return self._by_weight
+        with self._lock:
+            for q, w in self.weights.items():
+                self._current[q] += w
+            chosen = max(self._current, key=self._current.get)
+            self._current[chosen] -= self._total
+        return [chosen] + [q for q in self._by_weight if q != chosen]
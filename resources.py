@@ -0,0 +1,149 @@
+"""Resource-aware admission for worker processes.
+
+Jobs may request ``cpus`` and ``memory_mb``. Each worker process owns a
+ResourcePool with the capacity it may hand out; its threads claim through the
+pool, passing the free and total capacity down to ``claim_job`` so that only
+jobs that fit are taken. Jobs without requests reserve nothing, and a job
+asking for more than the whole pool is clamped to it, i.e. it runs alone.
+"""
+import math
+import os
+
+
+# how many of the oldest runnable jobs a resource-aware claim considers
+CLAIM_WINDOW = 32
+
+# once the oldest runnable job has waited this long for capacity, smaller
+# jobs stop being backfilled around it so the pool drains until it fits
+STARVATION_SECONDS = 60
+
+
+def detect_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+
+def detect_memory_mb():
+    """Physical memory in MB, or inf when it cannot be determined."""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        return math.inf
+
+
+def validate(cpus=None, memory_mb=None):
+    """Normalize enqueue-time requests; raises ValueError."""
+    try:
+        cpus = None if cpus is None else float(cpus)
+        memory_mb = None if memory_mb is None else int(memory_mb)
+    except (TypeError, ValueError):
+        raise ValueError('cpus and memory_mb must be numbers')
+    if (cpus is not None and cpus < 0) or (memory_mb is not None and memory_mb < 0):
+        raise ValueError('cpus and memory_mb must not be negative')
+    return cpus, memory_mb
+
+
+def demand(cpus, memory_mb, total):
+    """A job's (cpus, memory_mb) reservation, clamped to the pool total."""
+    return min(cpus or 0.0, total[0]), min(memory_mb or 0, total[1])
+
+
+def choose(candidates, free, total, starved_before=None):
+    """Pick the job to claim; ``candidates`` are (id, cpus, memory_mb, waiting_since) in FIFO order.
+
+    The oldest job is taken whenever it fits. Otherwise a younger job is
+    backfilled into the free capacity, best fit first (largest share of the
+    pool, oldest on ties), unless the oldest job has been waiting since before
+    ``starved_before`` - then nothing is chosen so capacity frees up for it.
+    Returns the chosen id or None.
+    """
+    best = None
+    best_size = -1.0
+    for i, (job_id, cpus, memory_mb, since) in enumerate(candidates):
+        c, m = demand(cpus, memory_mb, total)
+        if c > free[0] + 1e-9 or m > free[1]:
+            if i == 0 and starved_before is not None and since and since < starved_before:
+                return None
+            continue
+        if i == 0:
+            return job_id
+        size = (c / total[0] if total[0] else 0.0) + (m / total[1] if total[1] and total[1] != math.inf else 0.0)
+        if size > best_size:
+            best, best_size = job_id, size
+    return best
+
+
+class ResourcePool:
+    """CPU/memory capacity of one worker process, shared by its threads.
+
+    Claims go through claim(): the DB claim runs against a snapshot of the
+    free capacity without holding the pool lock, so threads claim in parallel
+    and release() never waits on a claim; the job's resources are reserved
+    afterwards. release() returns the reservation and wakes threads waiting
+    for capacity."""
+
+    def __init__(self, cpus=None, memory_mb=None):
+        # imported here so the CLI fast path stays free of threading
+        import threading
+        self.total = (float(cpus or detect_cpus()), memory_mb or detect_memory_mb())
+        self._used = (0.0, 0)
+        self._running = 0
+        self._cond = threading.Condition()
+
+    def free(self):
+        return max(0.0, self.total[0] - self._used[0]), max(0, self.total[1] - self._used[1])
+
+    def busy(self):
+        return self._running > 0
+
+    def claim(self, claim_fn, unclaim_fn=None):
+        """Call ``claim_fn(free, total)`` and reserve the returned job's resources.
+
+        If other threads reserved capacity while the claim ran and the job no
+        longer fits, it is handed back with ``unclaim_fn(job)`` and None is
+        returned; without ``unclaim_fn`` (or when nothing else is running, so
+        it could never fit better) the pool is overcommitted instead."""
+        with self._cond:
+            free = self.free()
+        job = claim_fn(free, self.total)
+        if not job:
+            return job
+        c, m = demand(job.get('cpus'), job.get('memory_mb'), self.total)
+        with self._cond:
+            free = self.free()
+            fits = c <= free[0] + 1e-9 and m <= free[1]
+            if fits or unclaim_fn is None or self._running == 0:
+                self._used = (self._used[0] + c, self._used[1] + m)
+                self._running += 1
+                return job
+        unclaim_fn(job)
+        return None
+
+    def release(self, job):
+        with self._cond:
+            c, m = demand(job.get('cpus'), job.get('memory_mb'), self.total)
+            self._used = (self._used[0] - c, self._used[1] - m)
+            self._running -= 1
+            self._cond.notify_all()
+
+    def wait(self, shutdown_event, timeout):
+        """Sleep until some job releases its resources (or ``timeout``)."""
+        with self._cond:
+            if not shutdown_event.is_set():
+                self._cond.wait(timeout)
+
+
+def limit_child(memory_mb):
+    """preexec_fn applying a job's memory request as RLIMIT_AS (POSIX only).
+
+    CPU requests are not enforced: rlimits can only cap CPU seconds, not cores."""
+    if not memory_mb:
+        return None
+    import resource
+
+    def _apply():
+        limit = int(memory_mb) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    return _apply
@@ -0,0 +1,85 @@
+import random
+
+import config
+
+
+JITTER_MODES = ('none', 'full', 'decorrelated')
+
+# keys of a per-job retry policy; any key left out falls back to the config defaults
+POLICY_KEYS = ('base', 'factor', 'max_delay', 'jitter', 'retry_on')
+
+
+def validate(policy):
+    """Normalize a user-supplied policy dict (enqueue/job-file); raises ValueError."""
+    if not policy:
+        return None
+    unknown = set(policy) - set(POLICY_KEYS)
+    if unknown:
+        raise ValueError(f"unknown retry policy key(s): {', '.join(sorted(unknown))}")
+    out = {}
+    for key in ('base', 'factor', 'max_delay'):
+        if policy.get(key) is not None:
+            try:
+                out[key] = float(policy[key])
+            except (TypeError, ValueError):
+                raise ValueError(f'retry policy {key} must be a number')
+            if out[key] < 0:
+                raise ValueError(f'retry policy {key} must not be negative')
+    if policy.get('jitter') is not None:
+        if policy['jitter'] not in JITTER_MODES:
+            raise ValueError(f"retry policy jitter must be one of {', '.join(JITTER_MODES)}")
+        out['jitter'] = policy['jitter']
+    if policy.get('retry_on') is not None:
+        codes = policy['retry_on']
+        if isinstance(codes, str):
+            codes = [c for c in codes.replace(' ', '').split(',') if c]
+        try:
+            out['retry_on'] = sorted({int(c) for c in codes})
+        except (TypeError, ValueError):
+            raise ValueError('retry policy retry_on must be a list of exit codes')
+    return out or None
+
+
+def resolve(policy=None):
+    """Merge a job's policy over the configured defaults."""
+    out = {
+        'base': float(config.get_config('backoff_base')),
+        'factor': float(config.get_config('retry_factor')),
+        'max_delay': float(config.get_config('retry_max_delay')),
+        'jitter': config.get_config('retry_jitter'),
+        'retry_on': None,
+    }
+    for k, v in (policy or {}).items():
+        if v is not None:
+            out[k] = v
+    return out
+
+
+def is_retryable(policy, exit_code):
+    """Jobs with a retry_on list only retry on those exit codes; anything else goes straight to the DLQ."""
+    codes = policy.get('retry_on')
+    return not codes or exit_code in codes
+
+
+def next_delay(policy, attempt, last_delay=None, rng=random):
+    """Seconds to wait before retry number ``attempt`` (1-based).
+
+    The exponential delay is ``factor * base ** attempt`` capped at
+    ``max_delay``. ``full`` jitter picks uniformly in [0, that], spreading a
+    burst of simultaneous failures over the whole window; ``decorrelated``
+    picks in [factor * base, 3 * previous delay] (capped), so retries of
+    different jobs drift apart over time.
+    """
+    base, factor, cap = policy['base'], policy['factor'], policy['max_delay']
+    try:
+        exp = min(cap, factor * base ** attempt)
+    except OverflowError:
+        exp = cap
+    jitter = policy.get('jitter') or 'none'
+    if jitter == 'full':
+        return rng.uniform(0, exp)
+    if jitter == 'decorrelated':
+        lo = min(cap, factor * base)
+        prev = last_delay if last_delay else lo
+        return min(cap, rng.uniform(lo, max(lo, prev * 3)))
+    return exp
@@ -0,0 +1,165 @@
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+
+import job_storage as store
+from cron import CronExpr
+
+
+MISFIRE_POLICIES = ('fire_once', 'fire_all', 'skip')
+
+# upper bound on catch-up instances created by the fire_all policy in one go
+MAX_CATCHUP = 100
+
+
+def first_fire(cron=None, interval_seconds=None, now=None):
+    """Initial next_fire_at for a new schedule."""
+    now = now or datetime.utcnow()
+    if cron:
+        return CronExpr(cron).next_after(now)
+    return now + timedelta(seconds=int(interval_seconds))
+
+
+def due_fire_times(schedule, now, misfire_grace):
+    """Return (fire times to materialize, next fire time after ``now``).
+
+    A fire is a misfire when it is more than ``misfire_grace`` seconds late,
+    e.g. after the workers were down. ``fire_once`` runs one catch-up instance,
+    ``fire_all`` runs every missed instance (up to MAX_CATCHUP) and ``skip``
+    runs none; on-time fires always run."""
+    fire = store.parse_iso(schedule['next_fire_at'])
+    late = (now - fire).total_seconds() > misfire_grace
+    policy = schedule.get('misfire_policy') or 'fire_once'
+
+    if schedule.get('cron'):
+        cron = CronExpr(schedule['cron'])
+        nxt = cron.next_after(now)
+        if policy == 'fire_all' and late:
+            times = [fire]
+            while len(times) < MAX_CATCHUP:
+                t = cron.next_after(times[-1])
+                if t > now:
+                    break
+                times.append(t)
+        else:
+            times = [fire]
+    else:
+        interval = timedelta(seconds=int(schedule['interval_seconds']))
+        missed = int((now - fire) / interval)
+        nxt = fire + interval * (missed + 1)
+        if policy == 'fire_all' and late:
+            times = [fire + interval * i for i in range(min(missed + 1, MAX_CATCHUP))]
+        else:
+            times = [fire]
+
+    if late and policy == 'skip':
+        times = []
+    return times, nxt
+
+
+class Scheduler(threading.Thread):
+    """Materialize recurring schedules into jobs just in time.
+
+    Schedules are kept in a min-heap keyed by next fire time, so the thread
+    sleeps until the earliest one is due. New, changed and disabled schedules
+    are picked up through an indexed ``updated_at >= ?`` query every
+    ``refresh_interval`` seconds rather than by rescanning the table. Each
+    fire goes through job_storage.fire_schedule, a compare-and-swap on
+    next_fire_at, so any number of worker processes can run a Scheduler and
+    each fire time is materialized exactly once.
+    """
+
+    def __init__(self, shutdown_event, refresh_interval=5.0, misfire_grace=60, db_path=None, on_fire=None):
+        super().__init__(name='scheduler', daemon=True)
+        self.shutdown_event = shutdown_event
+        self.refresh_interval = refresh_interval
+        self.misfire_grace = misfire_grace
+        self.db_path = db_path
+        # called after jobs are materialized, e.g. to wake idle workers
+        self.on_fire = on_fire
+        self._schedules = {}
+        self._heap = []
+        self._since = ''
+        self._failed = set()
+
+    def _track(self, s):
+        if not s['enabled']:
+            self._schedules.pop(s['id'], None)
+            return
+        current = self._schedules.get(s['id'])
+        if current and current['next_fire_at'] == s['next_fire_at']:
+            self._schedules[s['id']] = s
+            return
+        self._schedules[s['id']] = s
+        # stale heap entries are skipped when popped
+        heapq.heappush(self._heap, (s['next_fire_at'], s['id']))
+
+    def refresh(self):
+        rows = store.schedules_changed_since(self._since, db_path=self.db_path)
+        for sid in list(self._failed):
+            self._failed.discard(sid)
+            s = store.get_schedule(sid, db_path=self.db_path)
+            if s is not None:
+                self._track(s)
+        for s in rows:
+            self._track(s)
+        if rows:
+            # overlap the window a little so rows committed with a slightly older
+            # updated_at by another process are not missed
+            last = store.parse_iso(rows[-1]['updated_at']) - timedelta(seconds=2)
+            self._since = max(self._since, store.schedule_ts(last))
+
+    def _fire(self, s, now):
+        times, nxt = due_fire_times(s, now, self.misfire_grace)
+        jobs = []
+        for t in times:
+            job_id = f"{s['id']}@{store.schedule_ts(t)}"
+            jobs.append(store.new_job(s['command'], job_id=job_id, max_retries=s['max_retries']))
+        new_next = store.schedule_ts(nxt)
+        if store.fire_schedule(s['id'], s['next_fire_at'], new_next, jobs, db_path=self.db_path):
+            s = dict(s, next_fire_at=new_next)
+            self._track(s)
+            if jobs and self.on_fire is not None:
+                self.on_fire()
+        else:
+            # another process fired it (or it was disabled); reload just this one
+            fresh = store.get_schedule(s['id'], db_path=self.db_path)
+            if fresh is None:
+                self._schedules.pop(s['id'], None)
+            else:
+                self._track(fresh)
+
+    def run_pending(self, now=None):
+        """Fire every schedule due at ``now``; returns seconds until the next one (or None)."""
+        now = now or datetime.utcnow()
+        now_ts = store.schedule_ts(now)
+        while self._heap and self._heap[0][0] <= now_ts:
+            fire_at, sid = heapq.heappop(self._heap)
+            s = self._schedules.get(sid)
+            if s is None or s['next_fire_at'] != fire_at:
+                continue
+            try:
+                self._fire(s, now)
+            except Exception:
+                # e.g. the DB stayed locked; reload it on the next refresh
+                self._schedules.pop(sid, None)
+                self._failed.add(sid)
+        if not self._heap:
+            return None
+        return max(0.0, (store.parse_iso(self._heap[0][0]) - datetime.utcnow()).total_seconds())
+
+    def run(self):
+        next_refresh = 0.0
+        while not self.shutdown_event.is_set():
+            if time.monotonic() >= next_refresh:
+                try:
+                    self.refresh()
+                except Exception:
+                    pass
+                next_refresh = time.monotonic() + self.refresh_interval
+            wait = self.run_pending()
+            timeout = max(0.0, next_refresh - time.monotonic())
+            if wait is not None:
+                timeout = min(timeout, wait)
+            self.shutdown_event.wait(timeout)
@@ -0,0 +1,243 @@
+"""Streaming export/import of the job queue (``queuectl export`` / ``queuectl import``).
+
+An export is JSON Lines, gzip-compressed when the path ends in ``.gz``: a
+header line ``{"format": "queuectl-jobs", "version": 1, "fields": [...]}``
+followed by one job per line, with the job's latest result under
+``result`` when one is recorded. Rows are streamed from one read
+transaction, so the file is a consistent snapshot of the selected jobs and
+memory use does not grow with the queue. The trade-off: for as long as the
+export runs, that snapshot pins the WAL - checkpoints cannot move past it,
+so the -wal file grows with everything written meanwhile and is only
+truncated (see checkpointer.py) once the export has finished.
+
+A full snapshot (``export --full``) is instead a copy of the whole database
+made with SQLite's online backup API; unlike copying the live file it is
+consistent even while workers are writing, and it can be used as a DB as is.
+It is copied in one step: a stepped backup starts over whenever another
+connection writes in between, so on a busy queue it would never finish.
+Like an export, it pins the WAL until it is done.
+
+Import reads either JSONL form (gzip is detected from the content) and
+inserts in chunks, one transaction per chunk, with an ``on_conflict``
+policy for ids that already exist; a job's result is only imported along
+with the job. Jobs exported while processing are imported as pending, with
+no lease owner, since no worker of the target DB is running them.
+"""
+import gzip
+import json
+import sqlite3
+import sys
+
+import job_storage as store
+
+
+FORMAT = 'queuectl-jobs'
+VERSION = 1
+
+# rows per fetch on export and per transaction on import
+CHUNK = 10000
+
+GZIP_LEVEL = 6
+
+# on_conflict policy -> INSERT verb
+CONFLICT_POLICIES = {
+    'skip': 'INSERT OR IGNORE',
+    'replace': 'INSERT OR REPLACE',
+    'fail': 'INSERT',
+}
+
+_RESULT_FIELDS = ('exit_code', 'output', 'truncated', 'finished_at', 'timed_out')
+
+
+def _open_write(path):
+    if path == '-':
+        return sys.stdout
+    if path.endswith('.gz'):
+        return gzip.open(path, 'wt', encoding='utf-8', compresslevel=GZIP_LEVEL)
+    return open(path, 'w', encoding='utf-8')
+
+
+def _open_read(path):
+    if path == '-':
+        return sys.stdin
+    with open(path, 'rb') as f:
+        magic = f.read(2)
+    if magic == b'\x1f\x8b':
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def export_jobs(path, states=None, since=None, before=None, db_path=None, on_chunk=None):
+    """Write matching jobs (see job_storage.job_filter) to ``path`` as JSONL; returns the count.
+
+    ``on_chunk(done)`` is called every CHUNK jobs."""
+    where, params = store.job_filter(states, since, before)
+    # no column name appears in both tables, so the filter needs no qualifying
+    result_cols = ', '.join(f'r.{c}' for c in _RESULT_FIELDS)
+    job_cols = ', '.join(f'j.{c}' for c in store.JOB_FIELDS)
+    conn = store._get_conn(db_path)
+    out = _open_write(path)
+    n = 0
+    try:
+        out.write(json.dumps({'format': FORMAT, 'version': VERSION, 'fields': list(store.JOB_FIELDS)}) + '\n')
+        cursor = conn.cursor()
+        # a single statement reads one WAL snapshot from start to finish
+        cursor.execute(
+            f"SELECT {job_cols}, {result_cols} FROM jobs j LEFT JOIN job_results r ON r.job_id = j.id "
+            f"WHERE {where} "
+            "ORDER BY j.rowid",
+            params
+        )
+        width = len(store.JOB_FIELDS)
+        while True:
+            rows = cursor.fetchmany(CHUNK)
+            if not rows:
+                break
+            lines = []
+            for row in rows:
+                job = store._job_row(row[:width])
+                if row[width + 3] is not None:
+                    job['result'] = dict(zip(_RESULT_FIELDS, row[width:]))
+                    job['result']['truncated'] = bool(job['result']['truncated'])
+                    job['result']['timed_out'] = bool(job['result']['timed_out'])
+                lines.append(json.dumps(job, separators=(',', ':')))
+            out.write('\n'.join(lines) + '\n')
+            n += len(rows)
+            if on_chunk is not None:
+                on_chunk(n)
+    finally:
+        conn.close()
+        if out is not sys.stdout:
+            out.close()
+        else:
+            out.flush()
+    return n
+
+
+def backup(path, db_path=None, on_progress=None):
+    """Copy the whole database to ``path`` with the online backup API.
+
+    ``on_progress(remaining, total)`` receives the page counts once the copy is done."""
+    src = store._get_conn(db_path)
+    dest = sqlite3.connect(path)
+    try:
+        # one step, i.e. one read snapshot: writers in WAL mode are not held up by it
+        src.backup(dest, pages=-1, progress=(lambda status, remaining, total: on_progress(remaining, total))
+                   if on_progress else None)
+    finally:
+        dest.close()
+        src.close()
+
+
+def _job_from_record(rec, now):
+    """A full job row from an exported (or hand-written) record; raises ValueError."""
+    if not isinstance(rec, dict) or not rec.get('id') or not rec.get('command'):
+        raise ValueError('every job needs an id and a command')
+    job = {f: rec.get(f) for f in store.JOB_FIELDS}
+    job['state'] = job['state'] or 'pending'
+    if job['state'] == 'processing':
+        # the worker that held it is not coming for it here: run it again
+        # (the attempt it was on is not counted, as when a lease expires)
+        job['state'] = 'pending'
+    job['attempts'] = job['attempts'] or 0
+    if job['max_retries'] is None:
+        job['max_retries'] = 3
+    job['created_at'] = job['created_at'] or now
+    job['updated_at'] = job['updated_at'] or now
+    return job
+
+
+def _records(f):
+    """Job records of an export stream, skipping the header line."""
+    for lineno, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            raise ValueError(f'line {lineno}: not valid JSON')
+        if lineno == 1 and rec.get('format') == FORMAT:
+            if rec.get('version', VERSION) > VERSION:
+                raise ValueError(f"export version {rec['version']} is newer than this queuectl supports")
+            continue
+        yield lineno, rec
+
+
+def import_jobs(path, on_conflict='skip', chunk_size=CHUNK, db_path=None, on_chunk=None):
+    """Insert the jobs of an export file, ``chunk_size`` per transaction.
+
+    ``on_conflict`` says what happens to ids that already exist: ``skip``
+    keeps the existing job, ``replace`` overwrites it and ``fail`` raises
+    sqlite3.IntegrityError (chunks committed before stay imported). A job's
+    result is only written along with the job itself. ``on_chunk(read)`` is
+    called after each commit.
+    Returns (jobs read, jobs written)."""
+    if on_conflict not in CONFLICT_POLICIES:
+        raise ValueError(f"on_conflict must be one of {', '.join(CONFLICT_POLICIES)}")
+    verb = CONFLICT_POLICIES[on_conflict]
+    job_sql = store._JOB_INSERT.replace('INSERT', verb, 1)
+    result_sql = (f"{verb} INTO job_results (job_id, {', '.join(_RESULT_FIELDS)}) "
+                  f"VALUES (?, {', '.join('?' * len(_RESULT_FIELDS))})")
+    now = store.current_time()
+    conn = store._get_conn(db_path)
+    # WAL + NORMAL cannot corrupt the DB; a crash may only lose the last chunks
+    conn.execute('PRAGMA synchronous=NORMAL')
+
+    def _flush(jobs, results):
+        def _work():
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                if on_conflict == 'skip':
+                    # row by row, to learn which jobs were skipped: their existing
+                    # results must not be swapped for the imported ones
+                    inserted = [conn.execute(job_sql, job).rowcount == 1 for job in jobs]
+                    written = sum(inserted)
+                    rows = [r for r, ok in zip(results, inserted) if r is not None and ok]
+                else:
+                    # executemany's rowcount is the total over all rows
+                    written = conn.executemany(job_sql, jobs).rowcount
+                    rows = [r for r in results if r is not None]
+                conn.executemany(result_sql, rows)
+                conn.commit()
+                return written
+            except Exception:
+                conn.rollback()
+                raise
+        return store._retry_on_lock(_work, op='import_jobs')
+
+    f = _open_read(path)
+    read = written = 0
+    try:
+        jobs, results = [], []
+        for lineno, rec in _records(f):
+            try:
+                job = _job_from_record(rec, now)
+            except ValueError as e:
+                raise ValueError(f'line {lineno}: {e}')
+            jobs.append(store._job_values(job))
+            res = rec.get('result')
+            # one entry per job, so results line up with the jobs actually inserted
+            results.append((job['id'], res.get('exit_code'), res.get('output'), int(bool(res.get('truncated'))),
+                            res.get('finished_at') or now, int(bool(res.get('timed_out')))) if res else None)
+            if len(jobs) >= chunk_size:
+                written += _flush(jobs, results)
+                read += len(jobs)
+                jobs, results = [], []
+                if on_chunk is not None:
+                    on_chunk(read)
+        if jobs:
+            written += _flush(jobs, results)
+            read += len(jobs)
+            if on_chunk is not None:
+                on_chunk(read)
+        if written:
+            # keep job_results within its usual bound
+            conn.execute("DELETE FROM job_results WHERE rowid <= (SELECT MAX(rowid) FROM job_results) - ?",
+                         (store.RESULT_RETENTION,))
+            conn.commit()
+    finally:
+        conn.close()
+        if f is not sys.stdin:
+            f.close()
+    return read, written
@@ -0,0 +1,590 @@
+import heapq
+import itertools
+import os
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta
+
+import job_storage as store
+import resources
+
+
+_JOB_FIELDS = store.JOB_FIELDS
+
+
+class StorageBackend:
+    """Job storage protocol used by workers, the DLQ helpers and the CLI.
+
+    Job dicts carry the fields in _JOB_FIELDS. Methods mirror the
+    module-level functions of job_storage, which is the reference
+    implementation (SQLiteBackend).
+    """
+
+    name = None
+
+    def init(self):
+        """Create storage if needed."""
+        raise NotImplementedError
+
+    def add_job(self, job):
+        raise NotImplementedError
+
+    def add_jobs(self, jobs):
+        """Insert many jobs; return None or an error string per job."""
+        raise NotImplementedError
+
+    def get_job(self, job_id):
+        raise NotImplementedError
+
+    def claim_job(self, free=None, total=None, queues=None, tenant=None):
+        """Atomically move the oldest runnable pending job to 'processing' and return it (or None).
+
+        With ``free``/``total`` (cpus, memory_mb) capacity only a job that fits
+        is taken, as picked by resources.choose. With ``queues`` only those
+        queues are tried, in order. With ``tenant`` that tenant's jobs are
+        preferred, falling back to anyone's."""
+        raise NotImplementedError
+
+    def claim_batch(self, limit, queues=None):
+        """Atomically move up to ``limit`` of the oldest runnable batchable jobs to 'processing'; returns a list."""
+        raise NotImplementedError
+
+    def mark_job_completed(self, job_id, result=None):
+        """Mark a job completed, recording ``result`` (exit_code/output/truncated) if given."""
+        raise NotImplementedError
+
+    def mark_job_failed(self, job_id, attempts, max_retries, backoff_base=2, delay=None, retryable=True, result=None):
+        """Increment attempts and either reschedule with backoff (``delay`` seconds if given) or mark dead."""
+        raise NotImplementedError
+
+    def apply_acks(self, acks):
+        """Apply completed/failed acks (see job_storage.apply_acks) as one unit."""
+        raise NotImplementedError
+
+    def retry_dead_job(self, job_id):
+        """Move a dead job back to pending; True if it was dead."""
+        raise NotImplementedError
+
+    def requeue_job(self, job_id):
+        """Move a processing job back to pending without counting an attempt; True if it was processing."""
+        raise NotImplementedError
+
+    def lease_jobs(self, job_ids, owner):
+        """Record which remote worker holds these processing jobs (see coordinator.py)."""
+        raise NotImplementedError
+
+    def leased_jobs(self):
+        """{job id: owner} recorded by lease_jobs for jobs still processing."""
+        raise NotImplementedError
+
+    def bulk_update(self, action, state=None, since=None, before=None, command_like=None, dry_run=False,
+                    chunk_size=store.BULK_CHUNK, on_chunk=None):
+        """Retry/cancel/requeue/purge every matching job in chunks; see job_storage.bulk_update."""
+        raise NotImplementedError
+
+    def list_jobs_by_state(self, state=None):
+        raise NotImplementedError
+
+    def get_result(self, job_id):
+        """Outcome of the job's latest run (see job_storage.get_result), or None."""
+        raise NotImplementedError
+
+    def get_stats(self):
+        """Mapping of state -> job count."""
+        raise NotImplementedError
+
+    def get_queue_stats(self):
+        """Mapping of queue -> {state: count} for pending and processing jobs."""
+        raise NotImplementedError
+
+    def pending_tenants(self):
+        """Tenants that have pending jobs."""
+        raise NotImplementedError
+
+    def get_tenant_stats(self):
+        """Mapping of tenant -> {'pending', 'processing', 'waiting_since'} (see job_storage.get_tenant_stats)."""
+        raise NotImplementedError
+
+    def next_pending_run_at(self, queues=None):
+        """Earliest runnable time of a pending job (in ``queues`` if given): None if none, datetime.min if one is runnable now."""
+        raise NotImplementedError
+
+
+class SQLiteBackend(StorageBackend):
+    """The SQLite implementation in job_storage.
+
+    With db_path None every call resolves job_storage.DB_PATH at call time."""
+
+    name = 'sqlite'
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path
+
+    def init(self):
+        store.init_db(db_path=self.db_path)
+
+    def add_job(self, job):
+        store.add_job(job, db_path=self.db_path)
+
+    def add_jobs(self, jobs):
+        return store.add_jobs(jobs, db_path=self.db_path)
+
+    def get_job(self, job_id):
+        return store.get_job(job_id, db_path=self.db_path)
+
+    def claim_job(self, free=None, total=None, queues=None, tenant=None):
+        kwargs = {}
+        if free is not None:
+            kwargs.update(free=free, total=total)
+        if queues:
+            kwargs['queues'] = queues
+        if tenant:
+            kwargs['tenant'] = tenant
+        return store.claim_job(db_path=self.db_path, **kwargs)
+
+    def claim_batch(self, limit, queues=None):
+        if queues:
+            return store.claim_batch(limit, db_path=self.db_path, queues=queues)
+        return store.claim_batch(limit, db_path=self.db_path)
+
+    def mark_job_completed(self, job_id, result=None):
+        store.mark_job_completed(job_id, db_path=self.db_path, result=result)
+
+    def mark_job_failed(self, job_id, attempts, max_retries, backoff_base=2, delay=None, retryable=True, result=None):
+        store.mark_job_failed(job_id, attempts, max_retries, backoff_base=backoff_base, db_path=self.db_path,
+                              delay=delay, retryable=retryable, result=result)
+
+    def apply_acks(self, acks):
+        return store.apply_acks(acks, db_path=self.db_path)
+
+    def retry_dead_job(self, job_id):
+        return store.retry_dead_job(job_id, db_path=self.db_path)
+
+    def requeue_job(self, job_id):
+        return store.requeue_job(job_id, db_path=self.db_path)
+
+    def lease_jobs(self, job_ids, owner):
+        store.lease_jobs(job_ids, owner, db_path=self.db_path)
+
+    def leased_jobs(self):
+        return store.leased_jobs(db_path=self.db_path)
+
+    def bulk_update(self, action, state=None, since=None, before=None, command_like=None, dry_run=False,
+                    chunk_size=store.BULK_CHUNK, on_chunk=None):
+        return store.bulk_update(action, state=state, since=since, before=before, command_like=command_like,
+                                 dry_run=dry_run, chunk_size=chunk_size, on_chunk=on_chunk, db_path=self.db_path)
+
+    def list_jobs_by_state(self, state=None):
+        return store.list_jobs_by_state(state, db_path=self.db_path)
+
+    def get_result(self, job_id):
+        return store.get_result(job_id, db_path=self.db_path)
+
+    def get_stats(self):
+        return store.get_stats(db_path=self.db_path)
+
+    def get_queue_stats(self):
+        return store.get_queue_stats(db_path=self.db_path)
+
+    def pending_tenants(self):
+        return store.pending_tenants(db_path=self.db_path)
+
+    def get_tenant_stats(self):
+        return store.get_tenant_stats(db_path=self.db_path)
+
+    def next_pending_run_at(self, queues=None):
+        if queues:
+            return store.next_pending_run_at(db_path=self.db_path, queues=queues)
+        return store.next_pending_run_at(db_path=self.db_path)
+
+
+class MemoryBackend(StorageBackend):
+    """Process-local in-memory backend for tests, benchmarks and ephemeral pipelines.
+
+    Each (queue, tenant) pair keeps its runnable pending jobs in a heap
+    ordered by created_at and its delayed ones in a heap keyed by
+    next_run_at; other states are plain id sets. A claim promotes due delayed
+    jobs and pops the oldest ready heap head, so it is O(log n) (times the number of heaps)
+    under one short lock. Heap entries are invalidated lazily: each job
+    remembers the sequence number of its live entry. Nothing is persisted.
+    """
+
+    name = 'memory'
+
+    def __init__(self):
+        # imported here so the CLI fast path (sqlite only) stays free of threading
+        import threading
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._by_state = defaultdict(set)
+        # (queue, tenant) -> heap
+        self._ready = defaultdict(list)
+        self._delayed = defaultdict(list)
+        self._entry = {}
+        self._seq = itertools.count()
+        # job id -> result, oldest first; bounded like the SQLite job_results table
+        self._results = OrderedDict()
+        # processing job id -> remote worker holding its lease
+        self._lease_owners = {}
+
+    def init(self):
+        pass
+
+    # callers must hold self._lock for the helpers below
+    def _set_state(self, job, state):
+        self._by_state[job['state']].discard(job['id'])
+        self._lease_owners.pop(job['id'], None)
+        job['state'] = state
+        self._by_state[state].add(job['id'])
+        if state == 'pending':
+            seq = next(self._seq)
+            self._entry[job['id']] = seq
+            run_at = store.parse_iso(job['next_run_at']) if job.get('next_run_at') else None
+            if run_at is not None and run_at > datetime.utcnow():
+                heapq.heappush(self._delayed[_heap_key(job)], (run_at, seq, job['id']))
+            else:
+                heapq.heappush(self._ready[_heap_key(job)], (job['created_at'], seq, job['id']))
+        else:
+            self._entry.pop(job['id'], None)
+
+    def _live(self, entry):
+        return self._entry.get(entry[2]) == entry[1]
+
+    def _promote_due(self, now):
+        for key, delayed in self._delayed.items():
+            while delayed and delayed[0][0] <= now:
+                entry = heapq.heappop(delayed)
+                if self._live(entry):
+                    job = self._jobs[entry[2]]
+                    heapq.heappush(self._ready[key], (job['created_at'], entry[1], entry[2]))
+
+    def _heads(self, heaps, queues, tenant=None):
+        """Live-headed heaps of ``queues`` (all queues if None) and ``tenant`` (any if None), dropping stale heads."""
+        selected = [heap for (queue, owner), heap in heaps.items()
+                    if (queues is None or queue in queues) and (tenant is None or owner == tenant)]
+        out = []
+        for heap in selected:
+            while heap and not self._live(heap[0]):
+                heapq.heappop(heap)
+            if heap:
+                out.append(heap)
+        return out
+
+    def _pop_oldest(self, queues, tenant=None):
+        heads = self._heads(self._ready, queues, tenant)
+        if not heads:
+            return None
+        return heapq.heappop(min(heads, key=lambda h: h[0]))
+
+    def _insert(self, job):
+        if job['id'] in self._jobs:
+            return 'UNIQUE constraint failed: jobs.id'
+        row = {k: job.get(k) for k in _JOB_FIELDS}
+        row['queue'] = row['queue'] or store.DEFAULT_QUEUE
+        row['tenant'] = row['tenant'] or store.DEFAULT_TENANT
+        state = row['state']
+        row['state'] = None
+        self._jobs[row['id']] = row
+        self._set_state(row, state)
+        return None
+
+    def add_job(self, job):
+        with self._lock:
+            err = self._insert(job)
+        if err:
+            raise ValueError(err)
+
+    def add_jobs(self, jobs):
+        with self._lock:
+            return [self._insert(job) for job in jobs]
+
+    def get_job(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _choose_fitting(self, now, free, total, queues=None, tenant=None):
+        # pop the oldest CLAIM_WINDOW live entries, choose one and push the rest back
+        window = []
+        while len(window) < resources.CLAIM_WINDOW:
+            entry = self._pop_oldest(queues, tenant)
+            if entry is None:
+                break
+            window.append(entry)
+        candidates = []
+        for entry in window:
+            job = self._jobs[entry[2]]
+            since = max(job['created_at'], job.get('next_run_at') or '')
+            candidates.append((job['id'], job.get('cpus'), job.get('memory_mb'), since))
+        starved_before = store._now_iso(now - timedelta(seconds=resources.STARVATION_SECONDS))
+        chosen = resources.choose(candidates, free, total, starved_before)
+        for entry in window:
+            if entry[2] != chosen:
+                heapq.heappush(self._ready[_heap_key(self._jobs[entry[2]])], entry)
+        return chosen
+
+    def claim_job(self, free=None, total=None, queues=None, tenant=None):
+        with self._lock:
+            now = datetime.utcnow()
+            self._promote_due(now)
+            for queue, owner in itertools.product(queues or (None,), (tenant, None) if tenant else (None,)):
+                only = None if queue is None else (queue,)
+                if free is not None:
+                    job_id = self._choose_fitting(now, free, total, only, owner)
+                else:
+                    entry = self._pop_oldest(only, owner)
+                    job_id = entry[2] if entry else None
+                if job_id is not None:
+                    job = self._jobs[job_id]
+                    job['updated_at'] = store.current_time()
+                    self._set_state(job, 'processing')
+                    return dict(job)
+            return None
+
+    def claim_batch(self, limit, queues=None):
+        # non-batchable jobs popped on the way are pushed back; at most
+        # CLAIM_WINDOW of them are looked past, like a fitting claim
+        with self._lock:
+            self._promote_due(datetime.utcnow())
+            claimed, skipped = [], []
+            for queue in queues or (None,):
+                only = None if queue is None else (queue,)
+                while len(claimed) < limit and len(skipped) < resources.CLAIM_WINDOW:
+                    entry = self._pop_oldest(only)
+                    if entry is None:
+                        break
+                    job = self._jobs[entry[2]]
+                    (claimed if job.get('batchable') else skipped).append(entry)
+            for entry in skipped:
+                heapq.heappush(self._ready[_heap_key(self._jobs[entry[2]])], entry)
+            now = store.current_time()
+            jobs = []
+            for entry in claimed:
+                job = self._jobs[entry[2]]
+                job['updated_at'] = now
+                self._set_state(job, 'processing')
+                jobs.append(dict(job))
+            return jobs
+
+    def _record_result(self, job_id, result, now):
+        self._results.pop(job_id, None)
+        self._results[job_id] = {
+            'job_id': job_id, 'exit_code': result.get('exit_code'), 'output': result.get('output'),
+            'truncated': bool(result.get('truncated')), 'finished_at': store._now_iso(now),
+            'timed_out': bool(result.get('timed_out')),
+        }
+        while len(self._results) > store.RESULT_RETENTION:
+            self._results.popitem(last=False)
+
+    def _complete(self, job_id, now, result=None):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+        job['updated_at'] = store._now_iso(now)
+        self._set_state(job, 'completed')
+        if result is not None:
+            self._record_result(job_id, result, now)
+
+    def _fail(self, job_id, attempts, max_retries, backoff_base, now, delay=None, retryable=True, result=None):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+        if result is not None:
+            self._record_result(job_id, result, now)
+        attempts_local = attempts + 1
+        job['attempts'] = attempts_local
+        job['updated_at'] = store._now_iso(now)
+        if attempts_local > max_retries or not retryable:
+            self._set_state(job, 'dead')
+        else:
+            if delay is None:
+                delay = backoff_base ** attempts_local
+            job['next_run_at'] = store._now_iso(now + timedelta(seconds=delay))
+            job['last_retry_delay'] = delay
+            self._set_state(job, 'pending')
+
+    def mark_job_completed(self, job_id, result=None):
+        with self._lock:
+            self._complete(job_id, datetime.utcnow(), result=result)
+
+    def mark_job_failed(self, job_id, attempts, max_retries, backoff_base=2, delay=None, retryable=True, result=None):
+        with self._lock:
+            self._fail(job_id, attempts, max_retries, backoff_base, datetime.utcnow(), delay=delay, retryable=retryable,
+                       result=result)
+
+    def apply_acks(self, acks):
+        with self._lock:
+            now = datetime.utcnow()
+            for ack in acks:
+                if ack['op'] == 'completed':
+                    self._complete(ack['job_id'], now, result=ack.get('result'))
+                else:
+                    self._fail(ack['job_id'], ack['attempts'], ack['max_retries'], ack['backoff_base'], now,
+                               delay=ack.get('delay'), retryable=ack.get('retryable', True), result=ack.get('result'))
+        return [None] * len(acks)
+
+    def retry_dead_job(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['state'] != 'dead':
+                return False
+            job['attempts'] = 0
+            job['next_run_at'] = None
+            job['last_retry_delay'] = None
+            job['updated_at'] = store.current_time()
+            self._set_state(job, 'pending')
+            return True
+
+    def requeue_job(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['state'] != 'processing':
+                return False
+            job['updated_at'] = store.current_time()
+            self._set_state(job, 'pending')
+            return True
+
+    def lease_jobs(self, job_ids, owner):
+        with self._lock:
+            for job_id in job_ids:
+                if job_id in self._by_state['processing']:
+                    self._lease_owners[job_id] = owner
+
+    def leased_jobs(self):
+        with self._lock:
+            return dict(self._lease_owners)
+
+    def _bulk_matches(self, state, since, before, command_like):
+        since = since and since.isoformat(timespec='seconds')
+        before = before and before.isoformat(timespec='seconds')
+        pattern = command_like and _like_regex(command_like)
+        return [
+            job_id for job_id, job in self._jobs.items()
+            if job['state'] == state
+            and (since is None or job['updated_at'] >= since)
+            and (before is None or job['updated_at'] < before)
+            and (pattern is None or pattern.match(job['command']))
+        ]
+
+    def _bulk_apply(self, action, job):
+        if action == 'purge':
+            del self._jobs[job['id']]
+            self._by_state[job['state']].discard(job['id'])
+            self._results.pop(job['id'], None)
+            return
+        if action == 'retry':
+            job['attempts'] = 0
+            job['next_run_at'] = None
+            job['last_retry_delay'] = None
+        job['updated_at'] = store.current_time()
+        self._set_state(job, 'cancelled' if action == 'cancel' else 'pending')
+
+    def bulk_update(self, action, state=None, since=None, before=None, command_like=None, dry_run=False,
+                    chunk_size=store.BULK_CHUNK, on_chunk=None):
+        state = store.bulk_filter(action, state)
+        with self._lock:
+            # insertion order plays the part of SQLite's rowid order
+            matches = self._bulk_matches(state, since, before, command_like)
+        if dry_run:
+            return len(matches)
+        done = 0
+        for i in range(0, len(matches), chunk_size):
+            with self._lock:
+                changed = []
+                for job_id in matches[i:i + chunk_size]:
+                    job = self._jobs.get(job_id)
+                    if job is not None and job['state'] == state:
+                        self._bulk_apply(action, job)
+                        changed.append(job_id)
+            done += len(changed)
+            if on_chunk is not None and changed:
+                on_chunk(changed, done, len(matches))
+        return done
+
+    def list_jobs_by_state(self, state=None):
+        with self._lock:
+            ids = self._by_state.get(state, ()) if state else self._jobs.keys()
+            jobs = [dict(self._jobs[i]) for i in ids]
+        jobs.sort(key=lambda j: j['created_at'])
+        return jobs
+
+    def get_result(self, job_id):
+        with self._lock:
+            result = self._results.get(job_id)
+            return dict(result) if result else None
+
+    def get_stats(self):
+        with self._lock:
+            return {state: len(ids) for state, ids in self._by_state.items() if ids}
+
+    def get_queue_stats(self):
+        with self._lock:
+            stats = {}
+            for state in ('pending', 'processing'):
+                for job_id in self._by_state.get(state, ()):
+                    counts = stats.setdefault(self._jobs[job_id]['queue'], {})
+                    counts[state] = counts.get(state, 0) + 1
+            return stats
+
+    def pending_tenants(self):
+        with self._lock:
+            return sorted({self._jobs[job_id]['tenant'] for job_id in self._by_state.get('pending', ())})
+
+    def get_tenant_stats(self):
+        now = store.current_time()
+        with self._lock:
+            stats = {}
+            for state in ('pending', 'processing'):
+                for job_id in self._by_state.get(state, ()):
+                    job = self._jobs[job_id]
+                    t = stats.setdefault(job['tenant'], {'pending': 0, 'processing': 0, 'waiting_since': None})
+                    t[state] += 1
+                    since = max(job['created_at'], job.get('next_run_at') or '')
+                    if state == 'pending' and since <= now and (t['waiting_since'] is None or since < t['waiting_since']):
+                        t['waiting_since'] = since
+            return stats
+
+    def next_pending_run_at(self, queues=None):
+        with self._lock:
+            self._promote_due(datetime.utcnow())
+            if self._heads(self._ready, queues):
+                return datetime.min
+            delayed = self._heads(self._delayed, queues)
+            return min(h[0][0] for h in delayed) if delayed else None
+
+
+def _heap_key(job):
+    return job['queue'], job['tenant']
+
+
+def _like_regex(pattern):
+    """SQL LIKE pattern (ASCII case-insensitive, no escapes) as a compiled regex."""
+    import re
+    parts = ('.*' if c == '%' else '.' if c == '_' else re.escape(c) for c in pattern)
+    return re.compile(''.join(parts) + r'\Z', re.IGNORECASE | re.DOTALL)
+
+
+BACKENDS = {
+    'sqlite': SQLiteBackend,
+    'memory': MemoryBackend,
+}
+
+_instances = {}
+
+
+def get_backend(name=None):
+    """Return the configured backend (QUEUECTL_BACKEND env, else the storage_backend config key).
+
+    Instances are shared per process so that, for example, an in-memory
+    queue is seen by every worker thread."""
+    if name is None:
+        name = os.environ.get('QUEUECTL_BACKEND')
+    if name is None:
+        import config
+        name = config.get_config('storage_backend')
+    if name not in BACKENDS:
+        raise ValueError(f"unknown storage backend {name!r} (choose from {', '.join(sorted(BACKENDS))})")
+    backend = _instances.get(name)
+    if backend is None:
+        # setdefault is atomic, so racing threads still end up sharing one instance
+        backend = _instances.setdefault(name, BACKENDS[name]())
+    return backend
@@ -0,0 +1,186 @@
+"""Tenants and weighted fair claiming across them.
+
+Every job belongs to one tenant (``default`` unless enqueued with
+``--tenant``). With the ``fair`` tenant policy (opt-in, or implied by
+configuring ``tenant_weights``; the default is oldest-first) the worker
+threads of a process share a FairScheduler that runs deficit round-robin
+over the tenants with pending work: when its turn comes a tenant's deficit
+grows by its weight (``tenant_weights`` config, default 1), each job claimed
+for it costs 1, and the turn passes on once the deficit is used up. A claim
+takes the oldest runnable job of the tenant whose turn it is through the
+``(state, tenant, created_at)`` index and, in the same transaction, falls
+back to the oldest runnable job of anyone through ``(state, created_at)``,
+so no capacity idles. One team
+enqueueing 500k jobs then only gets its weighted share of claims while other
+tenants have work, instead of delaying them all until its backlog drains.
+
+The tenants with pending work are found with a loose index scan (one index
+seek per tenant) at most once per REFRESH_SECONDS per process, not per claim.
+
+Claim wait times (runnable-since to claim) are counted per tenant in each
+process and published with the contention counters; ``queuectl tenants``
+adds them up next to the current per-tenant backlog.
+
+This module is imported by the CLI fast path, so it avoids threading at
+import time and takes its counter lock from the builtin _thread module.
+"""
+import _thread
+import re
+import time
+
+
+DEFAULT_TENANT = 'default'
+
+# claim policies across tenants: weighted fair, or plain oldest-first
+POLICIES = ('fair', 'fifo')
+
+# seconds between refreshes of the set of tenants with pending work
+REFRESH_SECONDS = 1.0
+
+_NAME = re.compile(r'^[A-Za-z0-9_.@-]{1,64}$')
+
+_lock = _thread.allocate_lock()
+_waits = {}
+
+
+def validate_name(name):
+    """Return the tenant name, or raise ValueError."""
+    if name is None:
+        return DEFAULT_TENANT
+    if not isinstance(name, str) or not _NAME.match(name):
+        raise ValueError(f'invalid tenant name {name!r}: use 1-64 letters, digits, "_", "-", "." or "@"')
+    return name
+
+
+def parse_weights(spec):
+    """``a:4,b`` (or a {name: weight} dict) -> {'a': 4, 'b': 1}; raises ValueError."""
+    if isinstance(spec, dict):
+        items = [(name, str(weight)) for name, weight in spec.items()]
+    else:
+        items = [part.strip().partition(':')[::2] for part in spec.split(',') if part.strip()]
+    weights = {}
+    for name, weight in items:
+        name = validate_name(name.strip())
+        try:
+            weight = int(weight) if weight else 1
+        except ValueError:
+            raise ValueError(f'invalid weight for tenant {name!r}: {weight!r}')
+        if weight < 1:
+            raise ValueError(f'weight for tenant {name!r} must be at least 1')
+        weights[name] = weight
+    return weights
+
+
+def configured_weights():
+    """The ``tenant_weights`` config as {name: weight}."""
+    import config
+    return parse_weights(config.get_config('tenant_weights') or {})
+
+
+def record_wait(tenant, seconds):
+    """Count one claim of ``tenant``'s job that had been runnable for ``seconds``."""
+    with _lock:
+        w = _waits.get(tenant)
+        if w is None:
+            w = _waits[tenant] = {'claims': 0, 'wait': 0.0, 'max_wait': 0.0}
+        w['claims'] += 1
+        w['wait'] += seconds
+        if seconds > w['max_wait']:
+            w['max_wait'] = seconds
+
+
+def wait_snapshot():
+    with _lock:
+        return {t: dict(w) for t, w in _waits.items()}
+
+
+def reset_waits():
+    with _lock:
+        _waits.clear()
+
+
+def wait_totals(snapshots):
+    """Per-tenant sums of the ``tenant_waits`` of several published snapshots."""
+    out = {}
+    for data in snapshots:
+        for tenant, w in (data.get('tenant_waits') or {}).items():
+            t = out.setdefault(tenant, {'claims': 0, 'wait': 0.0, 'max_wait': 0.0})
+            t['claims'] += w.get('claims', 0)
+            t['wait'] += w.get('wait', 0.0)
+            t['max_wait'] = max(t['max_wait'], w.get('max_wait', 0.0))
+    return out
+
+
+class FairScheduler:
+    """Deficit round-robin over the tenants with pending work, shared by the threads of a process."""
+
+    def __init__(self, backend, weights=None, refresh=REFRESH_SECONDS):
+        # imported here so the CLI fast path stays free of threading
+        import threading
+        self.backend = backend
+        self.weights = dict(weights or {})
+        self.refresh = refresh
+        self._ring = []
+        self._pos = 0
+        self._deficit = {}
+        self._fetched_at = None
+        self._lock = threading.Lock()
+
+    def _weight(self, tenant):
+        return self.weights.get(tenant, 1)
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._fetched_at is not None and now - self._fetched_at < self.refresh:
+            return
+        try:
+            active = self.backend.pending_tenants()
+        except Exception:
+            # keep the old ring; claims fall back to oldest-first anyway
+            return
+        self._fetched_at = now
+        current = self._ring[self._pos] if self._ring else None
+        known = set(self._ring)
+        active_set = set(active)
+        self._ring = [t for t in self._ring if t in active_set] + [t for t in active if t not in known]
+        for tenant in list(self._deficit):
+            if tenant not in active_set:
+                del self._deficit[tenant]
+        for tenant in self._ring:
+            self._deficit.setdefault(tenant, 0)
+        if current in active_set:
+            self._pos = self._ring.index(current)
+        else:
+            # start over: the next turn goes to the first tenant, with its quantum
+            self._pos = len(self._ring) - 1 if self._ring else 0
+
+    def next_tenant(self):
+        """Tenant whose turn it is, or None when there is nobody to be fair between."""
+        with self._lock:
+            self._refresh()
+            if len(self._ring) < 2:
+                return None
+            while True:
+                tenant = self._ring[self._pos]
+                if self._deficit[tenant] >= 1:
+                    return tenant
+                self._pos = (self._pos + 1) % len(self._ring)
+                self._deficit[self._ring[self._pos]] += self._weight(self._ring[self._pos])
+
+    def charge(self, chosen, served):
+        """Account a claim made on ``chosen``'s turn that returned a job of ``served`` (None if empty)."""
+        with self._lock:
+            if served in self._deficit:
+                self._deficit[served] -= 1
+            if served != chosen and chosen in self._deficit:
+                # nothing runnable for it: like an emptied DRR queue it leaves
+                # the ring (and forfeits its deficit) until the next refresh
+                idx = self._ring.index(chosen)
+                del self._ring[idx]
+                del self._deficit[chosen]
+                if idx < self._pos:
+                    self._pos -= 1
+                elif idx == self._pos:
+                    # back onto the predecessor, so the successor gets its quantum when the turn moves on
+                    self._pos = idx - 1
+                self._pos = self._pos % len(self._ring) if self._ring else 0
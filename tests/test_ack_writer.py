@@ -0,0 +1,81 @@
+import threading
+
+import job_storage as store
+from ack_writer import AckWriter
+from storage_backend import SQLiteBackend
+
+
+def _add(db_path, job_id, max_retries=1):
+    job = store.new_job('echo hi', job_id=job_id, max_retries=max_retries)
+    store.add_job(job, db_path=db_path)
+
+
+def test_acks_from_many_threads_share_commits(tmp_path):
+    db_path = str(tmp_path / 'queuectl.db')
+    store.init_db(db_path=db_path)
+    for i in range(64):
+        _add(db_path, f'job-{i}')
+    claimed = [store.claim_job(db_path=db_path) for _ in range(64)]
+
+    writer = AckWriter(db_path=db_path, max_wait=0.01)
+
+    def ack(job):
+        n = int(job['id'].split('-')[1])
+        if n % 2 == 0:
+            writer.completed(job['id'])
+        else:
+            writer.failed(job['id'], job['attempts'], job['max_retries'], backoff_base=1)
+
+    threads = [threading.Thread(target=ack, args=(j,)) for j in claimed]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    writer.close()
+
+    assert len(store.list_jobs_by_state('completed', db_path=db_path)) == 32
+    retried = store.list_jobs_by_state('pending', db_path=db_path)
+    assert len(retried) == 32
+    assert all(j['attempts'] == 1 and j['next_run_at'] for j in retried)
+    assert writer.committer.batches < 64
+
+
+def test_non_durable_acks_are_flushed_on_close(tmp_path):
+    db_path = str(tmp_path / 'queuectl.db')
+    store.init_db(db_path=db_path)
+    _add(db_path, 'job-dead', max_retries=0)
+    job = store.claim_job(db_path=db_path)
+
+    writer = AckWriter(db_path=db_path, durable=False)
+    writer.failed(job['id'], job['attempts'], job['max_retries'])
+    writer.close()
+
+    assert [j['id'] for j in store.list_jobs_by_state('dead', db_path=db_path)] == ['job-dead']
+
+
+class _PoisonedBackend(SQLiteBackend):
+    """Fails every apply_acks call that includes the job 'poison'."""
+
+    def apply_acks(self, acks):
+        if any(a['job_id'] == 'poison' for a in acks):
+            raise RuntimeError('disk I/O error')
+        return super().apply_acks(acks)
+
+
+def test_failed_non_durable_batch_is_retried_per_ack(tmp_path, capsys):
+    db_path = str(tmp_path / 'queuectl.db')
+    store.init_db(db_path=db_path)
+    for job_id in ('ok-1', 'poison', 'ok-2'):
+        _add(db_path, job_id)
+        store.claim_job(db_path=db_path)
+
+    writer = AckWriter(durable=False, max_wait=0.2, backend=_PoisonedBackend(db_path))
+    for job_id in ('ok-1', 'poison', 'ok-2'):
+        writer.completed(job_id)
+    writer.close()
+
+    assert sorted(j['id'] for j in store.list_jobs_by_state('completed', db_path=db_path)) == ['ok-1', 'ok-2']
+    assert store.get_job('poison', db_path=db_path)['state'] == 'processing'
+    err = capsys.readouterr().err
+    assert 'Ack batch of 3 failed (disk I/O error)' in err
+    assert 'Ack for job poison failed: disk I/O error; it stays processing' in err
@@ -0,0 +1,136 @@
+import threading
+import time
+
+import pytest
+
+import batch_runner
+import config
+import job_storage as store
+import job_waiter
+import log_store
+from fast_cli import build_enqueue_job
+from storage_backend import MemoryBackend, SQLiteBackend
+from worker import IdleWaiter, Worker
+
+
+pytestmark = pytest.mark.skipif(not batch_runner.supported(), reason='batch mode needs a POSIX shell')
+
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def backend(request, tmp_path):
+    if request.param == 'sqlite':
+        b = SQLiteBackend(str(tmp_path / 'queuectl.db'))
+    else:
+        b = MemoryBackend()
+    b.init()
+    return b
+
+
+def _add(backend, job_id, command='true', batchable=True, **kw):
+    fields = {'batchable': 1} if batchable else {}
+    backend.add_job(store.new_job(command, job_id=job_id, **fields, **kw))
+    time.sleep(0.001)
+
+
+def test_claim_batch_takes_only_batchable_jobs_oldest_first(backend):
+    _add(backend, 'plain', batchable=False)
+    for i in range(5):
+        _add(backend, f'b{i}')
+    _add(backend, 'other', queue='other')
+
+    jobs = backend.claim_batch(3)
+    assert [j['id'] for j in jobs] == ['b0', 'b1', 'b2']
+    assert all(j['state'] == 'processing' for j in jobs)
+    # queues are drained in the given order
+    assert [j['id'] for j in backend.claim_batch(10, queues=['other', 'default'])] == ['other', 'b3', 'b4']
+    assert backend.claim_batch(10) == []
+    assert backend.claim_job()['id'] == 'plain'
+
+
+def test_runner_keeps_output_and_status_per_command():
+    runner = batch_runner.ShellRunner()
+    try:
+        assert runner.run('echo out; echo err >&2') == (0, 'out\n', 'err\n')
+        assert runner.run('cd /; X=1; exit 3') == (3, '', '')
+        # the previous job's exit, cd and variables stayed in its subshell
+        rc, out, _ = runner.run('pwd; echo "${X:-unset}"')
+        assert rc == 0 and out.splitlines()[1] == 'unset'
+        rc, _, err = runner.run("echo 'unterminated")
+        assert rc != 0 and err
+        assert runner.spawned == 1
+    finally:
+        runner.close()
+
+
+def test_runner_timeout_kills_shell_and_continues():
+    runner = batch_runner.ShellRunner()
+    try:
+        started = time.monotonic()
+        rc, out, err = runner.run('echo started; sleep 10', timeout=0.3)
+        assert (rc, out, runner.timed_out) == (batch_runner.TIMEOUT_EXIT_CODE, 'started\n', True)
+        assert 'timed out after 0.3s' in err
+        assert time.monotonic() - started < 5
+        assert runner.run('echo next') == (0, 'next\n', '')
+        assert not runner.timed_out
+        assert runner.spawned == 2
+    finally:
+        runner.close()
+
+
+def test_batchable_jobs_cannot_request_resources():
+    assert build_enqueue_job(command='true', batchable=True)['batchable'] == 1
+    with pytest.raises(ValueError):
+        build_enqueue_job(command='true', batchable=True, cpus=1)
+
+
+def test_batch_worker_acks_each_job_separately(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'DB_PATH', str(tmp_path / 'queuectl.db'))
+    monkeypatch.setattr(config, '_CFG_PATH', str(tmp_path / 'queuectl_config.json'))
+    store.init_db()
+    backend = SQLiteBackend()
+    for i in range(20):
+        _add(backend, f'ok-{i}', f'echo {i}')
+    _add(backend, 'bad', 'echo failing; exit 4', max_retries=0)
+    _add(backend, 'flaky', 'exit 5', retry_policy={'base': 60, 'jitter': 'none'})
+    _add(backend, 'single', 'echo alone', batchable=False)
+
+    shutdown = threading.Event()
+    claims = []
+    real_claim_batch = backend.claim_batch
+
+    def counting_claim_batch(limit, queues=None):
+        jobs = real_claim_batch(limit)
+        if jobs:
+            claims.append(len(jobs))
+        return jobs
+
+    monkeypatch.setattr(backend, 'claim_batch', counting_claim_batch)
+    w = Worker(shutdown, poll_interval=0.05, backend=backend, idle_waiter=IdleWaiter(), batch_size=8)
+    w.start()
+    try:
+        for i in range(20):
+            assert job_waiter.wait_for(f'ok-{i}', timeout=10)['state'] == 'completed'
+        assert job_waiter.wait_for('bad', timeout=10)['state'] == 'dead'
+        assert job_waiter.wait_for('single', timeout=10)['state'] == 'completed'
+        for _ in range(100):
+            if store.get_job('flaky')['attempts'] == 1:
+                break
+            time.sleep(0.05)
+        spawned = w.batch_runner.spawned
+    finally:
+        shutdown.set()
+        w.join(timeout=5)
+
+    assert claims == [8, 8, 6]
+    assert spawned == 1
+    assert store.get_result('ok-7')['output'] == '7\n'
+    bad = store.get_result('bad')
+    assert (bad['exit_code'], bad['output']) == (4, 'failing\n')
+    # a failure in a batch is retried on its own schedule
+    flaky = store.get_job('flaky')
+    assert (flaky['state'], flaky['attempts']) == ('pending', 1)
+    assert store.get_result('single')['output'] == 'alone\n'
+    # one log record per job, though the batch was written at once
+    logs = log_store.get_default()
+    assert logs.read('ok-3').endswith('rc=0\nOUT:\n3\n\n')
+    assert 'attempt=1 rc=4' in logs.read('bad')
@@ -0,0 +1,119 @@
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import job_storage as store
+from storage_backend import MemoryBackend, SQLiteBackend
+
+MAIN_PY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def backend(request, tmp_path):
+    if request.param == 'sqlite':
+        b = SQLiteBackend(str(tmp_path / 'queuectl.db'))
+    else:
+        b = MemoryBackend()
+    b.init()
+    return b
+
+
+def _kill(backend, job_id, command='false'):
+    backend.add_job(store.new_job(command, job_id=job_id, max_retries=0))
+    time.sleep(0.001)
+
+
+def _dead(backend, n, command='false', prefix='d'):
+    for i in range(n):
+        _kill(backend, f'{prefix}{i}', command)
+    while True:
+        job = backend.claim_job()
+        if job is None:
+            break
+        backend.mark_job_failed(job['id'], job['attempts'], job['max_retries'])
+
+
+def test_retry_all_in_chunks(backend):
+    _dead(backend, 7)
+    chunks = []
+    assert backend.bulk_update('retry', dry_run=True) == 7
+    assert backend.get_stats() == {'dead': 7}
+
+    n = backend.bulk_update('retry', chunk_size=3, on_chunk=lambda ids, done, total: chunks.append((len(ids), done, total)))
+    assert n == 7
+    assert chunks == [(3, 3, 7), (3, 6, 7), (1, 7, 7)]
+    assert backend.get_stats() == {'pending': 7}
+    job = backend.get_job('d0')
+    assert job['attempts'] == 0 and job['next_run_at'] is None
+
+
+def test_filters(backend):
+    _dead(backend, 3, command='backup --db a', prefix='b')
+    _dead(backend, 2, command='echo x', prefix='e')
+    assert backend.bulk_update('retry', command_like='BACKUP%', dry_run=True) == 3
+    assert backend.bulk_update('retry', command_like='%db _') == 3
+    assert backend.get_stats() == {'pending': 3, 'dead': 2}
+
+    future = datetime.utcnow() + timedelta(hours=1)
+    assert backend.bulk_update('retry', since=future) == 0
+    assert backend.bulk_update('retry', before=future) == 2
+    assert backend.bulk_update('retry', since=store.parse_cutoff('1h')) == 0
+
+
+def test_cancel_requeue_and_purge(backend):
+    for i in range(4):
+        backend.add_job(store.new_job('true', job_id=f'p{i}'))
+        time.sleep(0.001)
+    claimed = backend.claim_job()['id']
+    assert backend.bulk_update('cancel', command_like='true') == 3
+    assert backend.get_stats() == {'processing': 1, 'cancelled': 3}
+    assert backend.claim_job() is None
+
+    assert backend.bulk_update('requeue') == 1
+    assert backend.claim_job()['id'] == claimed
+    backend.mark_job_completed(claimed, result={'exit_code': 0, 'output': 'ok'})
+
+    with pytest.raises(ValueError):
+        backend.bulk_update('purge', state='pending')
+    assert backend.bulk_update('purge', state='cancelled', chunk_size=2) == 3
+    assert backend.bulk_update('purge', state='completed') == 1
+    assert backend.get_stats() == {}
+    assert backend.get_result(claimed) is None
+
+
+def test_parse_cutoff():
+    now = datetime(2025, 1, 2, 12, 0, 0)
+    assert store.parse_cutoff('90s', now) == now - timedelta(seconds=90)
+    assert store.parse_cutoff('2h', now) == now - timedelta(hours=2)
+    assert store.parse_cutoff('2025-01-01T00:00:00Z') == datetime(2025, 1, 1)
+    assert store.parse_cutoff('2025-01-01T02:00:00+02:00') == datetime(2025, 1, 1)
+    with pytest.raises(ValueError):
+        store.parse_cutoff('yesterday')
+
+
+def test_cli(tmp_path):
+    db_path = str(tmp_path / 'queuectl.db')
+    backend = SQLiteBackend(db_path)
+    backend.init()
+    _dead(backend, 5)
+    env = dict(os.environ, QUEUECTL_DB_PATH=db_path)
+
+    def run(*args):
+        return subprocess.run([sys.executable, MAIN_PY] + list(args), cwd=str(tmp_path), env=env,
+                              capture_output=True, text=True, timeout=60)
+
+    proc = run('dlq', 'retry', '--all', '--dry-run')
+    assert proc.returncode == 0 and proc.stdout == '5 job(s) would be retried\n'
+    assert run('dlq', 'retry').returncode != 0
+
+    proc = run('dlq', 'retry', '--all', '--chunk-size', '2')
+    assert proc.stdout == 'Retried 5 job(s)\n'
+    assert 'retried 4/5' in proc.stderr
+    proc = run('cancel', '--command-like', 'false')
+    assert proc.stdout == 'Cancelled 5 job(s)\n'
+    assert run('purge', 'cancelled').stdout == 'Purged 5 job(s)\n'
+    assert backend.get_stats() == {}
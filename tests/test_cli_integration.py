@@ -167,12 +167,11 @@ def test_job_timeout_behavior(tmp_path):
         w.daemon = True
         w.start()
 
-        # wait for job to be retried (attempts increase or moved to dead)
+        # wait for job to be retried (attempts increase or moved to dead); a
+        # freshly enqueued job is pending too, so wait for the attempt itself
         for _ in range(80):
-            dead = store.list_jobs_by_state('dead', db_path=os.path.join(cwd, 'queuectl.db'))
-            failed = store.list_jobs_by_state('failed', db_path=os.path.join(cwd, 'queuectl.db'))
-            pending = store.list_jobs_by_state('pending', db_path=os.path.join(cwd, 'queuectl.db'))
-            if any(j['id'] == job_id for j in dead) or any(j['id'] == job_id for j in pending) or any(j['id'] == job_id for j in failed):
+            job = store.get_job(job_id, db_path=os.path.join(cwd, 'queuectl.db'))
+            if job['attempts'] >= 1 or job['state'] == 'dead':
                 break
             time.sleep(0.1)
 
@@ -184,5 +183,8 @@ def test_job_timeout_behavior(tmp_path):
         js = [j for j in all_jobs if j['id'] == job_id]
         assert len(js) == 1
         assert js[0]['attempts'] >= 1
+        # recorded as a timeout, not an ordinary failure
+        res = store.get_result(job_id, db_path=os.path.join(cwd, 'queuectl.db'))
+        assert res['timed_out'] and res['exit_code'] == 124
     finally:
         os.chdir('..')
@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import job_storage as store
+
+MAIN_PY = str(Path(__file__).resolve().parents[1] / 'main.py')
+
+# modules the hot commands must never pull in
+HEAVY = {'click', 'multiprocessing', 'subprocess', 'threading', 'worker', 'dead_letter_queue', 'log_store'}
+
+
+def _imported_modules(args, cwd):
+    env = os.environ.copy()
+    env['QUEUECTL_DB_PATH'] = str(cwd / 'queuectl.db')
+    proc = subprocess.run([sys.executable, '-X', 'importtime', MAIN_PY] + args,
+                          cwd=str(cwd), env=env, capture_output=True, text=True, check=True)
+    mods = set()
+    for line in proc.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            mods.add(line.rsplit('|', 1)[1].strip())
+    return proc.stdout, mods
+
+
+def test_status_skips_heavy_imports(tmp_path):
+    store.init_db(db_path=str(tmp_path / 'queuectl.db'))
+    out, mods = _imported_modules(['status'], tmp_path)
+    assert out.startswith('Job counts by state:')
+    assert not HEAVY & mods
+
+
+def test_enqueue_skips_heavy_imports(tmp_path):
+    store.init_db(db_path=str(tmp_path / 'queuectl.db'))
+    out, mods = _imported_modules(['enqueue', '--id', 'fast-1', '--command', 'echo hi', '--max-retries=2'], tmp_path)
+    assert out.strip() == 'Enqueued job: fast-1'
+    assert not HEAVY & mods
+    assert store.get_job('fast-1', db_path=str(tmp_path / 'queuectl.db'))['max_retries'] == 2
+
+
+def test_unparsed_options_fall_back_to_click(tmp_path):
+    store.init_db(db_path=str(tmp_path / 'queuectl.db'))
+    out, mods = _imported_modules(['enqueue', '--help'], tmp_path)
+    assert '--command-file' in out
+    assert 'click' in mods
@@ -0,0 +1,171 @@
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import config
+import contention
+import job_storage as store
+import job_waiter
+from storage_backend import MemoryBackend
+from worker import Worker
+
+
+@pytest.fixture(autouse=True)
+def _fresh_counters():
+    contention.reset()
+    yield
+    contention.reset()
+
+
+def _locked():
+    return sqlite3.OperationalError('database is locked')
+
+
+def test_busy_is_told_apart_from_real_errors(tmp_path):
+    db = str(tmp_path / 'x.db')
+    holder = sqlite3.connect(db)
+    holder.execute('CREATE TABLE t (a)')
+    holder.execute('BEGIN IMMEDIATE')
+    other = sqlite3.connect(db, timeout=0)
+    with pytest.raises(sqlite3.OperationalError) as busy:
+        other.execute('BEGIN IMMEDIATE')
+    assert store.is_busy(busy.value)
+    with pytest.raises(sqlite3.OperationalError) as missing:
+        other.execute('SELECT * FROM nope')
+    assert not store.is_busy(missing.value)
+    holder.rollback()
+
+
+def test_retry_on_lock_counts_retries_and_gives_up():
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise _locked()
+        return 'ok'
+
+    assert store._retry_on_lock(flaky, backoff=0.001, op='flaky') == 'ok'
+    c = contention.snapshot()['flaky']
+    assert (c['calls'], c['busy'], c['retries'], c['gave_up'], c['errors']) == (1, 2, 2, 0, 0)
+    assert 0 < c['wait'] <= 0.003
+
+    def always_locked():
+        raise _locked()
+
+    with pytest.raises(store.DatabaseBusy):
+        store._retry_on_lock(always_locked, retries=3, backoff=0.001)
+    c = contention.snapshot()['test_retry_on_lock_counts_retries_and_gives_up']
+    assert (c['busy'], c['retries'], c['gave_up']) == (3, 2, 1)
+
+
+def test_real_errors_are_not_retried():
+    calls = []
+
+    def broken():
+        calls.append(1)
+        raise sqlite3.OperationalError('no such table: jobs')
+
+    with pytest.raises(sqlite3.OperationalError):
+        store._retry_on_lock(broken, op='broken')
+    assert len(calls) == 1
+    assert contention.snapshot()['broken']['errors'] == 1
+
+
+def test_claim_surfaces_contention_and_errors(tmp_path, monkeypatch):
+    db = str(tmp_path / 'queuectl.db')
+    store.init_db(db)
+    store.add_job(store.new_job('true', job_id='a'), db_path=db)
+    monkeypatch.setattr(store, 'CLAIM_BUSY_TIMEOUT_MS', 5)
+    holder = sqlite3.connect(db)
+    holder.execute('BEGIN IMMEDIATE')
+    try:
+        with pytest.raises(store.DatabaseBusy):
+            store.claim_job(db_path=db)
+    finally:
+        holder.rollback()
+    assert contention.snapshot()['claim_job']['gave_up'] == 1
+    assert store.claim_job(db_path=db)['id'] == 'a'
+
+    # a broken DB is an error, not an empty queue
+    with pytest.raises(sqlite3.OperationalError):
+        store.claim_job(db_path=str(tmp_path / 'empty.db'))
+
+
+def test_empty_claims_do_not_take_the_write_lock(tmp_path, monkeypatch):
+    db = str(tmp_path / 'queuectl.db')
+    store.init_db(db)
+    later = store._now_iso(datetime.utcnow() + timedelta(hours=1))
+    store.add_job(store.new_job('true', job_id='later', next_run_at=later), db_path=db)
+    store.add_job(store.new_job('true', job_id='other', queue='other'), db_path=db)
+    monkeypatch.setattr(store, 'CLAIM_BUSY_TIMEOUT_MS', 5)
+    holder = sqlite3.connect(db)
+    holder.execute('BEGIN IMMEDIATE')
+    try:
+        # nothing runnable: answered from a read while someone else holds the write lock
+        assert store.claim_job(db_path=db, queues=['default']) is None
+        assert store.claim_batch(10, db_path=db) == []
+        assert contention.busy_count('claim_job') == 0
+        # something runnable: the claim still needs the lock
+        with pytest.raises(store.DatabaseBusy):
+            store.claim_job(db_path=db)
+    finally:
+        holder.rollback()
+    assert store.claim_job(db_path=db)['id'] == 'other'
+
+
+def test_throttle_backs_off_and_recovers():
+    t = contention.ClaimThrottle()
+    assert t.delay() == 0.0
+    for _ in range(3):
+        t.after(t.start(), failed=True)
+    assert t.pause == pytest.approx(4 * t.MIN_PAUSE)
+    assert 0 <= t.delay() <= t.pause
+    for _ in range(3):
+        t.after(t.start())
+    assert t.pause == 0.0
+    for _ in range(20):
+        t.after(t.start(), failed=True)
+    assert t.pause == t.MAX_PAUSE
+
+
+def test_worker_throttles_instead_of_dying(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'DB_PATH', str(tmp_path / 'queuectl.db'))
+    monkeypatch.setattr(config, '_CFG_PATH', str(tmp_path / 'queuectl_config.json'))
+    backend = MemoryBackend()
+    backend.add_job(store.new_job('true', job_id='a'))
+    real_claim = backend.claim_job
+    failures = []
+
+    def contended_claim(free=None, total=None):
+        if len(failures) < 3:
+            failures.append(1)
+            raise store.DatabaseBusy('database is locked')
+        return real_claim(free, total)
+
+    backend.claim_job = contended_claim
+    throttle = contention.ClaimThrottle()
+    shutdown = threading.Event()
+    w = Worker(shutdown, poll_interval=0.05, backend=backend, claim_throttle=throttle)
+    w.start()
+    try:
+        assert job_waiter.wait_for('a', timeout=10, backend=backend)['state'] == 'completed'
+    finally:
+        shutdown.set()
+        w.join(timeout=5)
+    assert throttle.saturated >= 3
+
+
+def test_published_snapshots_add_up(tmp_path):
+    stats_dir = str(tmp_path / 'stats')
+    contention.record('claim_job', 0.5, busy=2, retries=2, wait=0.1)
+    contention.publish(stats_dir, {'claim_pause': 0.02, 'saturated_claims': 1})
+    snapshots = contention.read_all(stats_dir)
+    assert len(snapshots) == 1 and snapshots[0]['alive']
+    totals = contention.totals(snapshots + snapshots)
+    assert totals['claim_job']['busy'] == 4
+    assert totals['claim_job']['calls'] == 2
+    # only snapshots of exited processes are cleared
+    assert contention.clear(stats_dir) == 0
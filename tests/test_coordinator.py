@@ -0,0 +1,163 @@
+import threading
+import time
+
+import pytest
+
+import config
+import job_storage as store
+import job_waiter
+from coordinator import Coordinator, CoordinatorError, RemoteBackend
+from worker import Worker
+
+
+@pytest.fixture
+def coord(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'DB_PATH', str(tmp_path / 'queuectl.db'))
+    monkeypatch.setattr(config, '_CFG_PATH', str(tmp_path / 'queuectl_config.json'))
+    store.init_db()
+    c = Coordinator(address='127.0.0.1:0', lease_seconds=5, token='')
+    c.start()
+    yield c
+    c.stop()
+
+
+def test_remote_workers_run_jobs(coord):
+    ids = [f'job-{i}' for i in range(6)]
+    for job_id in ids:
+        store.add_job(store.new_job(f'echo {job_id}', job_id=job_id))
+
+    backend = RemoteBackend(coord.address, lease_batch=3)
+    shutdown = threading.Event()
+    workers = [Worker(shutdown, poll_interval=0.05, backend=backend) for _ in range(2)]
+    for w in workers:
+        w.start()
+    try:
+        for job_id in ids:
+            assert job_waiter.wait_for(job_id, timeout=30)['state'] == 'completed'
+    finally:
+        shutdown.set()
+        for w in workers:
+            w.join(timeout=5)
+        backend.close()
+
+    assert store.get_result('job-4')['output'] == 'job-4\n'
+    assert not coord._leases
+
+
+def test_expired_lease_is_requeued_and_late_ack_rejected(coord):
+    store.add_job(store.new_job('true', job_id='a'))
+    resp = coord.handle_request({'op': 'claim', 'worker': 'w1', 'max': 5})
+    assert [j['id'] for j in resp['jobs']] == ['a']
+    assert store.get_job('a')['state'] == 'processing'
+
+    assert coord.expire_leases(now=time.monotonic() + 60) == ['a']
+    assert store.get_job('a')['state'] == 'pending'
+    assert store.get_job('a')['attempts'] == 0
+
+    resp = coord.handle_request({'op': 'ack', 'worker': 'w1', 'acks': [{'op': 'completed', 'job_id': 'a'}]})
+    assert resp['results'] == ['lease expired or held by another worker']
+    assert store.get_job('a')['state'] == 'pending'
+    assert coord.handle_request({'op': 'heartbeat', 'worker': 'w1', 'jobs': ['a']})['lost'] == ['a']
+
+
+def test_close_releases_prefetched_jobs(coord):
+    for i in range(3):
+        store.add_job(store.new_job('true', job_id=f'j{i}'))
+        time.sleep(0.001)
+    backend = RemoteBackend(coord.address, lease_batch=3)
+    job = backend.claim_job()
+    assert job['id'] == 'j0'
+    assert store.get_stats() == {'processing': 3}
+    backend.close()
+    assert store.get_stats() == {'processing': 1, 'pending': 2}
+
+
+def test_token_is_required(coord):
+    coord.token = 'secret'
+    store.add_job(store.new_job('true', job_id='a'))
+    with pytest.raises(CoordinatorError):
+        RemoteBackend(coord.address, token='wrong')._call('next_run_at')
+    assert RemoteBackend(coord.address, token='secret').next_pending_run_at() is not None
+
+
+def test_remote_batch_claim_leases_batchable_jobs(coord):
+    store.add_job(store.new_job('true', job_id='plain'))
+    for i in range(3):
+        store.add_job(store.new_job('true', job_id=f'b{i}', batchable=1))
+    backend = RemoteBackend(coord.address)
+    try:
+        assert [j['id'] for j in backend.claim_batch(2)] == ['b0', 'b1']
+        assert set(coord._leases) == {'b0', 'b1'}
+        backend.apply_acks([{'op': 'completed', 'job_id': 'b0'}, {'op': 'completed', 'job_id': 'b1'}])
+    finally:
+        backend.close()
+    assert store.get_job('b1')['state'] == 'completed'
+    assert store.get_job('plain')['state'] == 'pending'
+
+
+def test_restarted_coordinator_takes_over_leases(coord):
+    store.add_job(store.new_job('true', job_id='a'))
+    store.add_job(store.new_job('true', job_id='b'))
+    assert len(coord.handle_request({'op': 'claim', 'worker': 'w1', 'max': 2})['jobs']) == 2
+    coord.stop()
+
+    restarted = Coordinator(address='127.0.0.1:0', lease_seconds=5, token='')
+    assert restarted.restore_leases() == 2
+    # w1 is still running both: its heartbeat and ack are accepted as before
+    assert restarted.handle_request({'op': 'heartbeat', 'worker': 'w1', 'jobs': ['a', 'b']})['lost'] == []
+    resp = restarted.handle_request({'op': 'ack', 'worker': 'w1', 'acks': [{'op': 'completed', 'job_id': 'a'}]})
+    assert resp['results'] == [None]
+    assert store.get_job('a')['state'] == 'completed'
+    assert restarted.handle_request({'op': 'heartbeat', 'worker': 'w2', 'jobs': ['b']})['lost'] == ['b']
+    # w1 went away while the coordinator was down: b is not stranded
+    assert restarted.expire_leases(now=time.monotonic() + 60) == ['b']
+    assert store.get_job('b')['state'] == 'pending'
+    restarted.acks.close()
+
+    # claimed locally now, so no coordinator may take it over
+    assert store.claim_job()['id'] == 'b'
+    assert store.leased_jobs() == {}
+
+
+def test_rejected_ack_is_reported(coord, capsys):
+    store.add_job(store.new_job('true', job_id='a'))
+    backend = RemoteBackend(coord.address)
+    try:
+        assert backend.claim_job()['id'] == 'a'
+        coord.expire_leases(now=time.monotonic() + 60)
+        backend.mark_job_completed('a')
+    finally:
+        backend.close()
+    assert 'Ack for job a rejected by coordinator: lease expired' in capsys.readouterr().err
+    assert store.get_job('a')['state'] == 'pending'
+
+
+def test_worker_survives_acks_that_keep_failing(coord, monkeypatch, capsys):
+    store.add_job(store.new_job('true', job_id='a'))
+    backend = RemoteBackend(coord.address)
+    monkeypatch.setattr(backend, 'ACK_ATTEMPTS', 1)
+    failures = []
+    real_call = backend._call
+
+    def flaky_call(op, **kw):
+        # the coordinator is unreachable for acks, e.g. while it restarts
+        if op == 'ack' and len(failures) < 3:
+            failures.append(op)
+            raise OSError('connection refused')
+        return real_call(op, **kw)
+
+    monkeypatch.setattr(backend, '_call', flaky_call)
+    shutdown = threading.Event()
+    w = Worker(shutdown, poll_interval=0.05, backend=backend)
+    w.start()
+    try:
+        assert job_waiter.wait_for('a', timeout=30)['state'] == 'completed'
+        assert w.is_alive()
+    finally:
+        shutdown.set()
+        w.join(timeout=5)
+        backend.close()
+    assert len(failures) == 3
+    # each failed run was handed back rather than left processing
+    assert store.get_job('a')['attempts'] == 0
+    assert 'could not record the outcome of job a: connection refused' in capsys.readouterr().err
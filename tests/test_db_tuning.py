@@ -0,0 +1,96 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import config
+import job_storage as store
+from checkpointer import WalCheckpointer
+
+
+MAIN_PY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+
+
+@pytest.fixture(autouse=True)
+def _default_profile():
+    yield
+    store.set_db_profile()
+
+
+def _pragma(conn, name):
+    return conn.execute(f'PRAGMA {name}').fetchone()[0]
+
+
+def test_profiles_apply_to_new_connections(tmp_path):
+    db = str(tmp_path / 'queuectl.db')
+    store.set_db_profile('balanced')
+    conn = store._get_conn(db)
+    assert _pragma(conn, 'synchronous') == 1
+    assert _pragma(conn, 'temp_store') == 2
+    assert _pragma(conn, 'cache_size') == store.PROFILES['balanced']['cache_size']
+    conn.close()
+
+    store.set_db_profile('durable')
+    stats = store.get_db_stats(db)
+    assert (stats['profile'], stats['synchronous'], stats['journal_mode']) == ('durable', 'FULL', 'wal')
+    with pytest.raises(ValueError):
+        store.set_db_profile('fast')
+
+
+def test_profile_comes_from_env_then_config(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, '_CFG_PATH', str(tmp_path / 'queuectl_config.json'))
+    monkeypatch.delenv('QUEUECTL_DB_PROFILE', raising=False)
+    assert store.db_profile() == 'durable'
+    config.set_config('db_profile', 'throughput')
+    assert store.db_profile() == 'throughput'
+    monkeypatch.setenv('QUEUECTL_DB_PROFILE', 'balanced')
+    assert store.db_profile() == 'balanced'
+    with pytest.raises(ValueError):
+        config.set_config('db_profile', 'fast')
+
+
+def test_checkpointer_truncates_wal_once_old_readers_finish(tmp_path):
+    db = str(tmp_path / 'queuectl.db')
+    store.init_db(db)
+    writer = store._get_conn(db)
+    # SQLite's own checkpoints would reset the WAL as soon as the reader goes
+    writer.execute('PRAGMA wal_autocheckpoint=0')
+    reader = sqlite3.connect(db)
+    reader.execute('BEGIN')
+    reader.execute('SELECT COUNT(*) FROM jobs').fetchone()
+    for i in range(200):
+        writer.execute(store._JOB_INSERT, store._job_values(store.new_job('true', job_id=f'j{i}')))
+        writer.commit()
+    assert store.wal_size(db) > 0
+
+    cp = WalCheckpointer(threading.Event(), max_bytes=1, db_path=db)
+    cp.run_once()
+    # the reader still needs the old pages: nothing can be truncated yet
+    assert cp.snapshot()['busy'] == 1 and store.wal_size(db) > 0
+    reader.rollback()
+    cp.run_once()
+    stats = cp.snapshot()
+    assert (stats['runs'], stats['truncations'], stats['wal_bytes']) == (2, 1, 0)
+    assert store.wal_size(db) == 0
+    assert writer.execute('SELECT COUNT(*) FROM jobs').fetchone()[0] == 200
+    reader.close()
+    writer.close()
+
+
+def test_db_commands(tmp_path):
+    db = str(tmp_path / 'queuectl.db')
+    store.init_db(db)
+    env = dict(os.environ, QUEUECTL_DB_PATH=db, QUEUECTL_DB_PROFILE='throughput')
+
+    def run(*args):
+        return subprocess.run([sys.executable, MAIN_PY] + list(args), cwd=str(tmp_path), env=env,
+                              capture_output=True, text=True, timeout=60)
+
+    proc = run('db', 'checkpoint', '--mode', 'passive')
+    assert proc.returncode == 0 and proc.stdout.startswith('Checkpointed ')
+    stats = json.loads(run('db', 'stats', '--json').stdout)
+    assert (stats['profile'], stats['synchronous'], stats['checkpoints']) == ('throughput', 'OFF', {})
@@ -0,0 +1,87 @@
+import threading
+
+import pytest
+
+import job_storage as store
+from enqueue_client import EnqueueClient, EnqueueError
+from enqueue_daemon import EnqueueDaemon
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    db_path = str(tmp_path / 'queuectl.db')
+    store.init_db(db_path=db_path)
+    d = EnqueueDaemon(address=str(tmp_path / 'q.sock'), db_path=db_path, max_wait=0.005)
+    d.start()
+    yield d, db_path
+    d.stop()
+
+
+def test_concurrent_enqueues_are_group_committed(daemon):
+    d, db_path = daemon
+    ids = []
+    lock = threading.Lock()
+
+    def producer(n):
+        with EnqueueClient(d.address) as c:
+            for i in range(25):
+                job_id = c.enqueue('echo hi', job_id=f'p{n}-{i}', max_retries=1)
+                with lock:
+                    ids.append(job_id)
+
+    threads = [threading.Thread(target=producer, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    pending = store.list_jobs_by_state('pending', db_path=db_path)
+    assert {j['id'] for j in pending} == set(ids)
+    assert len(ids) == 200
+    # concurrent producers share commits
+    assert d.committer.batches < 200
+
+
+def test_enqueue_many_reports_per_job_errors(daemon):
+    d, db_path = daemon
+    with EnqueueClient(d.address) as c:
+        c.enqueue('echo one', job_id='dup')
+        results = c.enqueue_many([
+            {'command': 'echo two', 'id': 'fresh', 'delay': 60},
+            {'command': 'echo three', 'id': 'dup'},
+            {'id': 'no-command'},
+        ])
+        with pytest.raises(EnqueueError):
+            c.enqueue('echo again', job_id='dup')
+
+    assert results[0] == {'ok': True, 'id': 'fresh'}
+    assert not results[1]['ok'] and 'UNIQUE' in results[1]['error']
+    assert not results[2]['ok']
+    job = store.get_job('fresh', db_path=db_path)
+    assert job['next_run_at'] is not None
+
+
+def test_token_and_non_local_binding(tmp_path, monkeypatch):
+    monkeypatch.delenv('QUEUECTL_DAEMON_TOKEN', raising=False)
+    db_path = str(tmp_path / 'queuectl.db')
+    store.init_db(db_path=db_path)
+    # anyone who can connect could run shell commands on the worker hosts
+    with pytest.raises(ValueError, match='without a token'):
+        EnqueueDaemon(address='0.0.0.0:0', db_path=db_path)
+    EnqueueDaemon(address='127.0.0.1:0', db_path=db_path).committer.close()
+
+    d = EnqueueDaemon(address='0.0.0.0:0', db_path=db_path, token='secret')
+    d.start()
+    try:
+        address = f'127.0.0.1:{d._server.server_address[1]}'
+        with EnqueueClient(address, token='wrong') as c:
+            with pytest.raises(EnqueueError, match='invalid token'):
+                c.enqueue('echo hi')
+            with pytest.raises(EnqueueError, match='invalid token'):
+                c.enqueue_many([{'command': 'echo hi'}])
+        monkeypatch.setenv('QUEUECTL_DAEMON_TOKEN', 'secret')
+        with EnqueueClient(address) as c:
+            assert c.enqueue('echo hi', job_id='ok') == 'ok'
+    finally:
+        d.stop()
+    assert [j['id'] for j in store.list_jobs_by_state('pending', db_path=db_path)] == ['ok']
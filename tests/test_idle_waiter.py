@@ -0,0 +1,110 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import job_storage as store
+import config
+import worker as worker_mod
+
+
+def test_delayed_job_starts_on_time_without_polling(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'queuectl.db')
+    monkeypatch.setattr(store, 'DB_PATH', db_path)
+    monkeypatch.setattr(config, '_CFG_PATH', str(tmp_path / 'queuectl_config.json'))
+    store.init_db(db_path=db_path)
+
+    claims = []
+    real_claim = store.claim_job
+
+    def counting_claim(db_path=None):
+        job = real_claim(db_path)
+        claims.append((time.time(), job))
+        return job
+
+    monkeypatch.setattr(store, 'claim_job', counting_claim)
+
+    due_epoch = time.time() + 0.8
+    due = datetime.utcnow() + timedelta(seconds=0.8)
+    store.add_job(store.new_job('python -c "pass"', job_id='delayed', next_run_at=due.isoformat() + 'Z'), db_path=db_path)
+
+    stop = threading.Event()
+    waiter = worker_mod.IdleWaiter()
+    workers = [worker_mod.Worker(shutdown_event=stop, poll_interval=10, idle_waiter=waiter) for _ in range(4)]
+    for w in workers:
+        w.daemon = True
+        w.start()
+
+    claimed_at = None
+    for _ in range(40):
+        hits = [t for t, job in claims if job and job['id'] == 'delayed']
+        if hits:
+            claimed_at = hits[0]
+            break
+        time.sleep(0.05)
+    stop.set()
+    waiter.notify()
+    for w in workers:
+        w.join(timeout=5)
+
+    assert claimed_at is not None
+    assert claimed_at - due_epoch < 0.3
+    # 4 idle threads with a 10s poll interval: one empty claim each, then the due claim(s)
+    assert len(claims) <= 10
+
+
+def test_next_pending_run_at(tmp_path):
+    db_path = str(tmp_path / 'queuectl.db')
+    store.init_db(db_path=db_path)
+    assert store.next_pending_run_at(db_path=db_path) is None
+
+    later = datetime.utcnow() + timedelta(hours=1)
+    store.add_job(store.new_job('echo', job_id='later', next_run_at=later.isoformat() + 'Z'), db_path=db_path)
+    assert store.next_pending_run_at(db_path=db_path) == later
+
+    store.add_job(store.new_job('echo', job_id='now'), db_path=db_path)
+    assert store.next_pending_run_at(db_path=db_path) == datetime.min
+
+
+def test_offset_run_at_is_stored_as_utc_and_waited_for(tmp_path):
+    from fast_cli import build_enqueue_job
+    from storage_backend import MemoryBackend, SQLiteBackend
+
+    job = build_enqueue_job(command='true', run_at='2025-11-09T14:00:00+02:00')
+    assert job['next_run_at'] == '2025-11-09T12:00:00.000000Z'
+
+    later = datetime.utcnow() + timedelta(hours=1)
+    # rows written before run times were normalized (or imported) may still carry an offset
+    raw = (later.replace(microsecond=0) + timedelta(hours=2)).isoformat() + '+02:00'
+    for backend in (SQLiteBackend(str(tmp_path / 'queuectl.db')), MemoryBackend()):
+        backend.init()
+        backend.add_job(store.new_job('true', job_id='offset', next_run_at=raw))
+        assert backend.next_pending_run_at() == later.replace(microsecond=0)
+        waiter = worker_mod.IdleWaiter()
+        assert not waiter.due_now(backend, 0.05)
+        waiter.wait(threading.Event(), 0.05, backend)
+
+
+def test_whole_second_run_times_compare_correctly(tmp_path):
+    from enqueue_daemon import _job_from_request
+    from fast_cli import build_enqueue_job
+
+    db_path = str(tmp_path / 'queuectl.db')
+    store.init_db(db_path=db_path)
+    store.add_job(store.new_job('true', job_id='retry'), db_path=db_path)
+    store.claim_job(db_path=db_path)
+    # a retry due on a whole second: isoformat() would drop the fraction, and
+    # "...:00Z" sorts after "...:00.5Z", so it would look not yet due
+    due = datetime.utcnow().replace(microsecond=0) - timedelta(seconds=5)
+    conn = store._get_conn(db_path)
+    store._fail(conn.cursor(), 'retry', 0, 3, 2, due, delay=0)
+    conn.commit()
+    conn.close()
+    assert store.get_job('retry', db_path=db_path)['next_run_at'] == due.isoformat() + '.000000Z'
+    # enqueue --delay writes the same fixed-width form
+    assert len(build_enqueue_job(command='true', delay=0)['next_run_at']) == len(store.schedule_ts())
+    assert len(_job_from_request({'command': 'true', 'delay': 0})['next_run_at']) == len(store.schedule_ts())
+
+    conn = store._get_conn(db_path)
+    where, params = store._runnable(store._now_iso(due + timedelta(seconds=0.5)))
+    assert conn.execute(f"SELECT id FROM jobs WHERE {where}", params).fetchall() == [('retry',)]
+    conn.close()
@@ -0,0 +1,98 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import config
+import job_storage as store
+import job_waiter
+from worker import Worker
+
+MAIN_PY = str(Path(__file__).resolve().parents[1] / 'main.py')
+
+
+def _setup(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'queuectl.db')
+    monkeypatch.setattr(store, 'DB_PATH', db_path)
+    monkeypatch.setattr(config, '_CFG_PATH', str(tmp_path / 'queuectl_config.json'))
+    store.init_db()
+    return db_path
+
+
+def test_results_are_recorded_and_bounded(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    monkeypatch.setattr(store, 'RESULT_RETENTION', 3)
+    for i in range(5):
+        store.add_job(store.new_job('true', job_id=f'job-{i}'))
+        store.claim_job()
+        store.mark_job_completed(f'job-{i}', result={'exit_code': 0, 'output': f'out {i}\n'})
+    assert store.get_result('job-0') is None
+    assert store.get_result('job-1') is None
+    res = store.get_result('job-4')
+    assert res['exit_code'] == 0 and res['output'] == 'out 4\n' and not res['truncated']
+
+
+def test_worker_caps_stored_output(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    config.set_config('result_max_bytes', 10)
+    store.add_job(store.new_job("printf '0123456789abcdef'; exit 3", job_id='big', max_retries=0))
+    shutdown = threading.Event()
+    w = Worker(shutdown, poll_interval=0.05)
+    w.start()
+    try:
+        job = job_waiter.wait_for('big', timeout=10)
+    finally:
+        shutdown.set()
+        w.join(timeout=5)
+    assert job['state'] == 'dead'
+    res = store.get_result('big')
+    assert res == dict(res, exit_code=3, output='0123456789', truncated=True)
+
+
+def test_wait_is_woken_by_notification(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    store.add_job(store.new_job('true', job_id='j1'))
+
+    def finish():
+        time.sleep(0.2)
+        store.claim_job()
+        store.mark_job_completed('j1')
+        job_waiter.notify(['j1'])
+
+    threading.Thread(target=finish).start()
+    start = time.monotonic()
+    # a long recheck interval means only the notification can return this quickly
+    job = job_waiter.wait_for('j1', timeout=10, recheck=30)
+    assert job['state'] == 'completed'
+    assert time.monotonic() - start < 5
+    assert os.listdir(job_waiter.default_dir()) == []
+
+
+def test_enqueue_wait_cli(tmp_path, monkeypatch):
+    db_path = _setup(tmp_path, monkeypatch)
+    env = dict(os.environ, QUEUECTL_DB_PATH=db_path)
+    cmd = [sys.executable, MAIN_PY, 'enqueue', '--id', 'rpc-1', '--command', 'echo pong', '--wait', '--timeout', '20']
+
+    shutdown = threading.Event()
+    w = Worker(shutdown, poll_interval=0.05)
+    w.start()
+    try:
+        proc = subprocess.run(cmd, cwd=str(tmp_path), env=env, capture_output=True, text=True, timeout=60)
+    finally:
+        shutdown.set()
+        w.join(timeout=5)
+    assert proc.returncode == 0
+    assert proc.stdout == 'pong\n'
+    assert 'Enqueued job: rpc-1' in proc.stderr
+
+    out = subprocess.run([sys.executable, MAIN_PY, 'result', 'rpc-1', '--output-only'], cwd=str(tmp_path), env=env,
+                         capture_output=True, text=True, timeout=60)
+    assert out.stdout == 'pong\n'
+
+    # nobody is working the queue now
+    cmd = [sys.executable, MAIN_PY, 'enqueue', '--command', 'echo late', '--wait', '--timeout', '0.3']
+    proc = subprocess.run(cmd, cwd=str(tmp_path), env=env, capture_output=True, text=True, timeout=60)
+    assert proc.returncode == 124
+    assert 'Timed out' in proc.stderr
@@ -0,0 +1,101 @@
+import gzip
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+
+import config
+import job_storage as store
+import job_waiter
+import log_store
+from worker import Worker
+
+
+MAIN_PY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+
+
+def test_append_and_read_by_attempt(tmp_path):
+    ls = log_store.LogStore(log_dir=str(tmp_path / 'logs'))
+    ls.append('job-a', 1, log_store.format_record(1, 1, 'first\n', ''))
+    ls.append('job-b', 1, log_store.format_record(1, 0, 'other\n', ''))
+    ls.append('job-a', 2, log_store.format_record(2, 0, 'second\n', 'warn\n'))
+
+    assert ls.attempts('job-a') == [1, 2]
+    assert 'first' in ls.read('job-a', 1)
+    latest = ls.read('job-a')
+    assert 'attempt=2 rc=0' in latest and 'second' in latest and 'warn' in latest
+    assert ls.read('missing') is None
+
+    # a handful of jobs share one segment file instead of one file per job
+    segments = [n for n in os.listdir(tmp_path / 'logs') if n.startswith('segment-')]
+    assert segments == ['segment-000001.log']
+
+
+def test_rotation_compresses_sealed_segments(tmp_path):
+    ls = log_store.LogStore(log_dir=str(tmp_path / 'logs'), segment_bytes=256)
+    for i in range(20):
+        ls.append(f'job-{i}', 1, log_store.format_record(1, 0, f'output {i}\n' * 5, ''))
+
+    names = sorted(os.listdir(tmp_path / 'logs'))
+    sealed = [n for n in names if n.endswith('.log.gz')]
+    assert sealed
+    # each sealed segment is still a valid gzip stream
+    with gzip.open(tmp_path / 'logs' / sealed[0], 'rb') as f:
+        assert b'output 0' in f.read()
+    for i in range(20):
+        assert f'output {i}' in ls.read(f'job-{i}', 1)
+
+
+def test_dlq_retry_keeps_earlier_runs(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'queuectl.db')
+    monkeypatch.setattr(store, 'DB_PATH', db_path)
+    monkeypatch.setattr(config, '_CFG_PATH', str(tmp_path / 'queuectl_config.json'))
+    monkeypatch.delenv('QUEUECTL_LOG_DIR', raising=False)
+    store.init_db()
+    flag = tmp_path / 'flag'
+    store.add_job(store.new_job(f'if [ -e {flag} ]; then echo second run; else touch {flag}; echo first run; exit 1; fi',
+                                job_id='flaky', max_retries=0))
+    env = dict(os.environ, QUEUECTL_DB_PATH=db_path)
+
+    def cli(*args):
+        return subprocess.run([sys.executable, MAIN_PY] + list(args), cwd=str(tmp_path), env=env,
+                              capture_output=True, text=True, timeout=60, check=True).stdout
+
+    def work(until):
+        shutdown = threading.Event()
+        w = Worker(shutdown, poll_interval=0.05)
+        w.start()
+        try:
+            assert job_waiter.wait_for('flaky', timeout=30)['state'] == until
+        finally:
+            shutdown.set()
+            w.join(timeout=5)
+
+    work('dead')
+    assert 'Retried job' in cli('dlq', 'retry', 'flaky')
+    work('completed')
+
+    # the retry ran as attempt 1 again; the first run's output is still there
+    out = cli('logs', 'flaky')
+    assert out.index('first run') < out.index('second run')
+    assert out.count('attempt=1') == 2
+    assert 'first run' in cli('logs', 'flaky', '--attempt', '1')
+
+
+def test_old_index_is_migrated(tmp_path):
+    log_dir = tmp_path / 'logs'
+    log_dir.mkdir()
+    conn = sqlite3.connect(str(log_dir / 'index.db'))
+    conn.execute('CREATE TABLE records (job_id TEXT NOT NULL, attempt INTEGER NOT NULL, segment TEXT NOT NULL, '
+                 'offset INTEGER NOT NULL, length INTEGER NOT NULL, compressed INTEGER NOT NULL DEFAULT 0, '
+                 'created_at TEXT NOT NULL, PRIMARY KEY (job_id, attempt))')
+    (log_dir / 'segment-000001.log').write_bytes(b'old output\n')
+    conn.execute("INSERT INTO records VALUES ('job-a', 1, 'segment-000001.log', 0, 11, 0, 'x')")
+    conn.commit()
+    conn.close()
+
+    ls = log_store.LogStore(log_dir=str(log_dir))
+    ls.append('job-a', 1, 'new output\n')
+    assert ls.attempts('job-a') == [1, 1]
+    assert [ls.read('job-a', run=run) for run, _ in ls.runs('job-a')] == ['old output\n', 'new output\n']
@@ -0,0 +1,120 @@
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+import config
+import job_storage as store
+import job_waiter
+import queues
+from storage_backend import MemoryBackend, SQLiteBackend
+from worker import Worker
+
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def backend(request, tmp_path):
+    if request.param == 'sqlite':
+        b = SQLiteBackend(str(tmp_path / 'queuectl.db'))
+    else:
+        b = MemoryBackend()
+    b.init()
+    return b
+
+
+def _add(backend, job_id, queue=None, **kw):
+    fields = {'queue': queue} if queue else {}
+    backend.add_job(store.new_job('true', job_id=job_id, **fields, **kw))
+    time.sleep(0.001)
+
+
+def test_parse_and_validate():
+    assert queues.parse('a, b:3') == {'a': 1, 'b': 3}
+    assert queues.validate_name(None) == 'default'
+    for bad in ('', 'a:0', 'a:x', 'no spaces'):
+        with pytest.raises(ValueError):
+            queues.parse(bad)
+
+
+def test_selector_follows_weights():
+    selector = queues.QueueSelector({'big': 1, 'small': 4})
+    orders = [selector.order() for _ in range(50)]
+    assert Counter(o[0] for o in orders) == {'small': 40, 'big': 10}
+    assert all(sorted(o) == ['big', 'small'] for o in orders)
+
+
+def test_claim_only_from_subscribed_queues(backend):
+    _add(backend, 'd1')
+    _add(backend, 'b1', 'batch')
+    _add(backend, 'i1', 'interactive')
+    _add(backend, 'i2', 'interactive')
+
+    assert backend.claim_job(queues=['nope']) is None
+    # the first queue with a runnable job wins
+    assert backend.claim_job(queues=['interactive', 'batch'])['id'] == 'i1'
+    assert backend.claim_job(queues=['batch', 'interactive'])['id'] == 'b1'
+    assert backend.claim_job(queues=['batch', 'interactive'])['id'] == 'i2'
+    assert backend.claim_job(queues=['batch'], free=(1.0, 1024), total=(1.0, 1024)) is None
+    assert backend.get_job('d1')['queue'] == 'default'
+    assert backend.claim_job()['id'] == 'd1'
+
+
+def test_idle_lookup_and_depth_per_queue(backend):
+    _add(backend, 'b1', 'batch')
+    _add(backend, 'later', 'interactive', next_run_at=store._now_iso(datetime.utcnow() + timedelta(hours=1)))
+    assert backend.next_pending_run_at(['batch']) == datetime.min
+    due = backend.next_pending_run_at(['interactive'])
+    assert due > datetime.utcnow()
+    assert backend.next_pending_run_at(['other']) is None
+
+    backend.claim_job(queues=['batch'])
+    assert backend.get_queue_stats() == {'batch': {'processing': 1}, 'interactive': {'pending': 1}}
+
+
+def test_claim_uses_queue_index(tmp_path):
+    db = str(tmp_path / 'queuectl.db')
+    store.init_db(db)
+    conn = sqlite3.connect(db)
+    for queue, index in (('small', 'idx_jobs_queue_state_created'), (None, 'idx_jobs_state_created')):
+        where, params = store._runnable(store._now_iso(), queue)
+        # both the plain and the resource-aware (windowed) claim query
+        for limit in (1, 32):
+            plan = str(conn.execute(f"EXPLAIN QUERY PLAN SELECT id, cpus, memory_mb FROM jobs WHERE {where} "
+                                    f"ORDER BY created_at LIMIT {limit}", params).fetchall())
+            # walked in created_at order, not sorted
+            assert index in plan and 'TEMP B-TREE' not in plan
+
+
+def test_existing_jobs_migrate_to_default_queue(tmp_path):
+    db = str(tmp_path / 'old.db')
+    conn = sqlite3.connect(db)
+    conn.execute('CREATE TABLE jobs (id TEXT PRIMARY KEY, command TEXT NOT NULL, state TEXT NOT NULL, '
+                 'attempts INTEGER NOT NULL DEFAULT 0, max_retries INTEGER NOT NULL, created_at TEXT NOT NULL, '
+                 'updated_at TEXT NOT NULL)')
+    conn.execute("INSERT INTO jobs VALUES ('old', 'true', 'pending', 0, 3, 'x', 'x')")
+    conn.commit()
+    conn.close()
+    store.init_db(db)
+    assert store.get_job('old', db_path=db)['queue'] == 'default'
+    assert store.claim_job(db_path=db, queues=['default'])['id'] == 'old'
+
+
+def test_dedicated_worker_leaves_other_queues_alone(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'DB_PATH', str(tmp_path / 'queuectl.db'))
+    monkeypatch.setattr(config, '_CFG_PATH', str(tmp_path / 'queuectl_config.json'))
+    store.init_db()
+    store.add_job(store.new_job('true', job_id='slow', queue='batch'))
+    store.add_job(store.new_job('true', job_id='fast', queue='interactive'))
+
+    shutdown = threading.Event()
+    w = Worker(shutdown, poll_interval=0.05, queue_selector=queues.QueueSelector({'interactive': 1}))
+    w.start()
+    try:
+        assert job_waiter.wait_for('fast', timeout=10)['state'] == 'completed'
+        time.sleep(0.2)
+    finally:
+        shutdown.set()
+        w.join(timeout=5)
+    assert store.get_job('slow')['state'] == 'pending'
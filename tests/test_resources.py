@@ -0,0 +1,116 @@
+import os
+import sys
+import threading
+
+import pytest
+
+import config
+import job_storage as store
+import job_waiter
+import resources
+from worker import Worker
+
+
+def test_choose_prefers_fifo_then_best_fit():
+    total = (4.0, 4096)
+    jobs = [('head', 3, 0, 'b'), ('small', 1, 0, 'c'), ('medium', 2, 512, 'd'), ('none', None, None, 'e')]
+    assert resources.choose(jobs, (4.0, 4096), total) == 'head'
+    # head does not fit: backfill the candidate that fills the free space best
+    assert resources.choose(jobs, (2.0, 4096), total) == 'medium'
+    assert resources.choose(jobs, (0.5, 4096), total) == 'none'
+    # a starved head blocks backfilling until capacity frees up
+    assert resources.choose(jobs, (2.0, 4096), total, starved_before='c') is None
+    # requests larger than the whole pool are clamped, so they run alone
+    assert resources.choose([('huge', 64, 10 ** 6, 'a')], total, total) == 'huge'
+    assert resources.choose([('huge', 64, 10 ** 6, 'a')], (3.5, 4096), total) is None
+
+
+def test_claims_run_outside_the_pool_lock():
+    pool = resources.ResourcePool(cpus=2, memory_mb=1024)
+    pool.claim(lambda free, total: {'id': 'running', 'cpus': 1})
+    inside = threading.Barrier(2, timeout=5)
+
+    def slow_claim(free, total):
+        # both claims are in flight at once, and a release is not held up by them
+        inside.wait()
+        if threading.current_thread().name == 'first':
+            pool.release({'id': 'running', 'cpus': 1})
+        inside.wait()
+        return {'id': threading.current_thread().name, 'cpus': 1}
+
+    results = {}
+    threads = [threading.Thread(target=lambda: results.update({threading.current_thread().name: pool.claim(slow_claim)}),
+                                name=name) for name in ('first', 'second')]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=10)
+    assert {k: v['id'] for k, v in results.items()} == {'first': 'first', 'second': 'second'}
+    assert pool.free() == (0.0, 1024)
+
+
+def test_job_that_no_longer_fits_is_handed_back():
+    pool = resources.ResourcePool(cpus=2, memory_mb=1024)
+    handed_back = []
+
+    def claim_then_lose_race(free, total):
+        assert free == (2.0, 1024)
+        # another thread reserved capacity while this claim ran
+        pool.claim(lambda free, total: {'id': 'other', 'cpus': 1.5})
+        return {'id': 'late', 'cpus': 1}
+
+    assert pool.claim(claim_then_lose_race, handed_back.append) is None
+    assert [j['id'] for j in handed_back] == ['late']
+    assert pool.free() == (0.5, 1024)
+    # jobs without requests always fit
+    assert pool.claim(lambda free, total: {'id': 'plain'}, handed_back.append)['id'] == 'plain'
+
+
+def _run_workers(n, pool, job_ids, **kw):
+    shutdown = threading.Event()
+    workers = [Worker(shutdown, poll_interval=0.05, resource_pool=pool, **kw) for _ in range(n)]
+    for w in workers:
+        w.start()
+    try:
+        for job_id in job_ids:
+            job_waiter.wait_for(job_id, timeout=30)
+    finally:
+        shutdown.set()
+        for w in workers:
+            w.join(timeout=5)
+
+
+def test_pool_never_oversubscribes(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'DB_PATH', str(tmp_path / 'queuectl.db'))
+    monkeypatch.setattr(config, '_CFG_PATH', str(tmp_path / 'queuectl_config.json'))
+    store.init_db()
+    cmd = f'{sys.executable} -c "import time; print(time.time()); time.sleep(0.3); print(time.time())"'
+    ids = [f'job-{i}' for i in range(4)]
+    for job_id in ids:
+        store.add_job(store.new_job(cmd, job_id=job_id, cpus=1))
+
+    pool = resources.ResourcePool(cpus=2, memory_mb=1024)
+    _run_workers(4, pool, ids)
+
+    spans = []
+    for job_id in ids:
+        assert store.get_job(job_id)['state'] == 'completed'
+        start, end = map(float, store.get_result(job_id)['output'].split())
+        spans.append((start, end))
+    for start, _ in spans:
+        assert sum(1 for s, e in spans if s <= start < e) <= 2
+    assert pool.free() == (2.0, 1024)
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='rlimits are POSIX only')
+def test_memory_request_is_enforced(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'DB_PATH', str(tmp_path / 'queuectl.db'))
+    monkeypatch.setattr(config, '_CFG_PATH', str(tmp_path / 'queuectl_config.json'))
+    store.init_db()
+    hog = f'{sys.executable} -c "b = bytearray(1024 * 1024 * 1024)"'
+    store.add_job(store.new_job(hog, job_id='hog', max_retries=0, memory_mb=256))
+
+    _run_workers(1, resources.ResourcePool(cpus=1, memory_mb=4096), ['hog'], enforce_limits=True)
+    assert store.get_job('hog')['state'] == 'dead'
+    # the allocation raised MemoryError instead of succeeding
+    assert store.get_result('hog')['exit_code'] == 1
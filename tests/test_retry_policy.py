@@ -0,0 +1,76 @@
+import random
+import threading
+
+import pytest
+
+import config
+import job_storage as store
+import retry_policy
+from fast_cli import build_enqueue_job
+from worker import Worker
+
+
+def _policy(**overrides):
+    policy = {'base': 2.0, 'factor': 1.0, 'max_delay': 60.0, 'jitter': 'none', 'retry_on': None}
+    policy.update(overrides)
+    return policy
+
+
+def test_delay_is_capped_and_survives_huge_attempts():
+    policy = _policy()
+    assert [retry_policy.next_delay(policy, n) for n in (1, 2, 3)] == [2.0, 4.0, 8.0]
+    assert retry_policy.next_delay(policy, 10) == 60.0
+    assert retry_policy.next_delay(policy, 100000) == 60.0
+
+
+def test_jitter_spreads_delays_within_bounds():
+    rng = random.Random(7)
+    full = [retry_policy.next_delay(_policy(jitter='full'), 4, rng=rng) for _ in range(200)]
+    assert all(0 <= d <= 16 for d in full)
+    assert len({round(d, 3) for d in full}) > 150
+
+    prev = None
+    for n in range(1, 20):
+        prev = retry_policy.next_delay(_policy(jitter='decorrelated'), n, prev, rng=rng)
+        assert 2.0 <= prev <= 60.0
+
+
+def test_validate_rejects_bad_policies():
+    assert retry_policy.validate({'retry_on': '75, 111'}) == {'retry_on': [75, 111]}
+    assert retry_policy.validate({}) is None
+    for bad in ({'jitter': 'sometimes'}, {'base': 'x'}, {'max_delay': -1}, {'tries': 3}):
+        with pytest.raises(ValueError):
+            retry_policy.validate(bad)
+
+
+def test_enqueue_policy_is_stored_and_drives_retries(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'queuectl.db')
+    monkeypatch.setattr(store, 'DB_PATH', db_path)
+    monkeypatch.setattr(config, '_CFG_PATH', str(tmp_path / 'queuectl_config.json'))
+    store.init_db()
+
+    retry = build_enqueue_job('retry-me', 'exit 75', max_retries=5,
+                              retry_policy={'base': 3, 'jitter': 'none', 'retry_on': '75'})
+    fatal = build_enqueue_job('fatal', 'exit 1', max_retries=5, retry_policy={'retry_on': '75'})
+    store.add_job(retry)
+    store.add_job(fatal)
+    assert store.get_job('retry-me')['retry_policy'] == {'base': 3.0, 'jitter': 'none', 'retry_on': [75]}
+
+    shutdown = threading.Event()
+    w = Worker(shutdown, poll_interval=0.05)
+    w.start()
+    try:
+        for _ in range(100):
+            if store.get_job('fatal')['state'] == 'dead' and store.get_job('retry-me')['attempts'] == 1:
+                break
+            shutdown.wait(0.05)
+    finally:
+        shutdown.set()
+        w.join(timeout=5)
+
+    # exit code 1 is not in retry_on, so no retries were spent on it
+    assert store.get_job('fatal')['state'] == 'dead'
+    assert store.get_job('fatal')['attempts'] == 1
+    job = store.get_job('retry-me')
+    assert job['state'] == 'pending'
+    assert job['last_retry_delay'] == 3.0
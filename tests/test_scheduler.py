@@ -0,0 +1,80 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import job_storage as store
+from cron import CronExpr
+from scheduler import Scheduler, due_fire_times
+
+
+def test_cron_next_after():
+    base = datetime(2025, 1, 31, 23, 58, 30)
+    assert CronExpr('*/5 * * * *').next_after(base) == datetime(2025, 2, 1, 0, 0)
+    assert CronExpr('@hourly').next_after(base) == datetime(2025, 2, 1, 0, 0)
+    assert CronExpr('30 9 * * 1-5').next_after(datetime(2025, 1, 31, 10, 0)) == datetime(2025, 2, 3, 9, 30)
+    # both day fields restricted: either may match
+    assert CronExpr('0 0 13 * 5').next_after(datetime(2025, 1, 1)) == datetime(2025, 1, 3)
+    with pytest.raises(ValueError):
+        CronExpr('61 * * * *')
+    with pytest.raises(ValueError):
+        CronExpr('0 0 30 2 *').next_after(base)
+
+
+def test_misfire_policies():
+    now = datetime(2025, 1, 1, 12, 0, 30)
+    sched = {'interval_seconds': 60, 'next_fire_at': store.schedule_ts(now - timedelta(minutes=10))}
+
+    times, nxt = due_fire_times(dict(sched, misfire_policy='fire_once'), now, misfire_grace=60)
+    assert len(times) == 1 and nxt == datetime(2025, 1, 1, 12, 1, 30)
+    times, _ = due_fire_times(dict(sched, misfire_policy='fire_all'), now, misfire_grace=60)
+    assert len(times) == 11
+    times, nxt = due_fire_times(dict(sched, misfire_policy='skip'), now, misfire_grace=60)
+    assert times == [] and nxt > now
+
+    on_time = {'cron': '* * * * *', 'misfire_policy': 'skip', 'next_fire_at': store.schedule_ts(datetime(2025, 1, 1, 12, 0))}
+    times, nxt = due_fire_times(on_time, now, misfire_grace=60)
+    assert times == [datetime(2025, 1, 1, 12, 0)] and nxt == datetime(2025, 1, 1, 12, 1)
+
+
+def test_concurrent_schedulers_materialize_each_fire_once(tmp_path):
+    db_path = str(tmp_path / 'queuectl.db')
+    store.init_db(db_path=db_path)
+    now = datetime.utcnow()
+    for i in range(20):
+        store.add_schedule({
+            'id': f's{i}', 'command': 'echo tick', 'interval_seconds': 3600, 'max_retries': 0,
+            'next_fire_at': store.schedule_ts(now - timedelta(seconds=1)),
+        }, db_path=db_path)
+
+    stop = threading.Event()
+    schedulers = [Scheduler(stop, db_path=db_path) for _ in range(4)]
+    for s in schedulers:
+        s.refresh()
+    threads = [threading.Thread(target=s.run_pending) for s in schedulers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    jobs = store.list_jobs_by_state('pending', db_path=db_path)
+    assert sorted(j['id'].split('@')[0] for j in jobs) == sorted(f's{i}' for i in range(20))
+    # every scheduler now agrees on the next fire and has nothing due
+    for s in schedulers:
+        wait = s.run_pending()
+        assert wait is not None and wait > 3000
+
+
+def test_disabled_schedule_is_dropped_on_refresh(tmp_path):
+    db_path = str(tmp_path / 'queuectl.db')
+    store.init_db(db_path=db_path)
+    store.add_schedule({
+        'id': 'gone', 'command': 'echo', 'cron': '* * * * *', 'max_retries': 0,
+        'next_fire_at': store.schedule_ts(datetime.utcnow() - timedelta(seconds=1)),
+    }, db_path=db_path)
+    sched = Scheduler(threading.Event(), db_path=db_path)
+    sched.refresh()
+    assert store.disable_schedule('gone', db_path=db_path)
+    sched.refresh()
+    assert sched.run_pending() is None
+    assert store.list_jobs_by_state(None, db_path=db_path) == []
@@ -0,0 +1,168 @@
+import gzip
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import job_storage as store
+import snapshot
+
+MAIN_PY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / 'queuectl.db')
+    store.init_db(path)
+    return path
+
+
+def _seed(db, n=5):
+    for i in range(n):
+        store.add_job(store.new_job(f'echo {i}', job_id=f'j{i}', retry_policy={'base': 3}), db_path=db)
+        time.sleep(0.001)
+    store.claim_job(db_path=db)
+    store.mark_job_completed('j0', db_path=db, result={'exit_code': 0, 'output': 'zero\n'})
+
+
+def test_round_trip_gzip(tmp_path, db):
+    _seed(db)
+    path = str(tmp_path / 'jobs.jsonl.gz')
+    assert snapshot.export_jobs(path, db_path=db) == 5
+    with gzip.open(path, 'rt') as f:
+        header = json.loads(f.readline())
+    assert header['format'] == 'queuectl-jobs' and 'retry_policy' in header['fields']
+
+    other = str(tmp_path / 'other.db')
+    store.init_db(other)
+    assert snapshot.import_jobs(path, db_path=other, chunk_size=2) == (5, 5)
+    assert store.list_jobs_by_state(db_path=other) == store.list_jobs_by_state(db_path=db)
+    assert store.get_job('j3', db_path=other)['retry_policy'] == {'base': 3}
+    assert store.get_result('j0', db_path=other)['output'] == 'zero\n'
+
+
+def test_filters_and_conflicts(tmp_path, db):
+    _seed(db)
+    path = str(tmp_path / 'pending.jsonl')
+    assert snapshot.export_jobs(path, states=['pending'], db_path=db) == 4
+    assert snapshot.export_jobs(path, since=datetime.utcnow() + timedelta(hours=1), db_path=db) == 0
+    assert snapshot.export_jobs(path, states=['pending', 'completed'], db_path=db) == 5
+
+    store.mark_job_completed('j1', db_path=db)
+    # existing ids are kept by default, overwritten with replace
+    assert snapshot.import_jobs(path, db_path=db) == (5, 0)
+    assert store.get_job('j1', db_path=db)['state'] == 'completed'
+    assert snapshot.import_jobs(path, on_conflict='replace', db_path=db) == (5, 5)
+    assert store.get_job('j1', db_path=db)['state'] == 'pending'
+    with pytest.raises(sqlite3.IntegrityError):
+        snapshot.import_jobs(path, on_conflict='fail', db_path=db)
+
+
+def test_skipped_jobs_keep_their_results(tmp_path, db):
+    _seed(db, 2)
+    path = str(tmp_path / 'jobs.jsonl')
+    snapshot.export_jobs(path, db_path=db)
+
+    other = str(tmp_path / 'other.db')
+    store.init_db(other)
+    store.add_job(store.new_job('echo mine', job_id='j0'), db_path=other)
+    assert snapshot.import_jobs(path, db_path=other, chunk_size=1) == (2, 1)
+    # j0 was skipped, so the exported result must not be attached to the local job
+    assert store.get_job('j0', db_path=other)['command'] == 'echo mine'
+    assert store.get_result('j0', db_path=other) is None
+    assert snapshot.import_jobs(path, on_conflict='replace', db_path=other) == (2, 2)
+    assert store.get_result('j0', db_path=other)['output'] == 'zero\n'
+
+
+def test_import_hand_written_jobs(tmp_path, db):
+    path = tmp_path / 'seed.jsonl'
+    path.write_text('{"id": "a", "command": "echo a"}\n\n{"id": "b", "command": "echo b", "max_retries": 0}\n')
+    assert snapshot.import_jobs(str(path), db_path=db) == (2, 2)
+    job = store.get_job('b', db_path=db)
+    assert job['state'] == 'pending' and job['max_retries'] == 0
+    assert store.claim_job(db_path=db)['id'] == 'a'
+
+    path.write_text('{"id": "c"}\n')
+    with pytest.raises(ValueError, match='line 1'):
+        snapshot.import_jobs(str(path), db_path=db)
+
+
+def test_full_backup_is_a_usable_db(tmp_path, db):
+    _seed(db, 3)
+    dest = str(tmp_path / 'copy.db')
+    pages = []
+    snapshot.backup(dest, db_path=db, on_progress=lambda remaining, total: pages.append(remaining))
+    assert pages and pages[-1] == 0
+    assert store.get_stats(db_path=dest) == {'pending': 2, 'completed': 1}
+
+
+def test_full_backup_finishes_while_jobs_are_written(tmp_path, db):
+    conn = store._get_conn(db)
+    # bigger than a few thousand pages, so a stepped copy would need many steps
+    conn.executemany(store._JOB_INSERT, [store._job_values(store.new_job('x' * 4000, job_id=f'big-{i}'))
+                                         for i in range(5000)])
+    conn.commit()
+    conn.close()
+
+    stop = threading.Event()
+
+    def write():
+        n = 0
+        while not stop.is_set():
+            store.add_job(store.new_job('true', job_id=f'live-{n}'), db_path=db)
+            n += 1
+            time.sleep(0.001)
+
+    writer = threading.Thread(target=write, daemon=True)
+    writer.start()
+    dest = str(tmp_path / 'copy.db')
+    copier = threading.Thread(target=snapshot.backup, args=(dest,), kwargs={'db_path': db}, daemon=True)
+    try:
+        copier.start()
+        copier.join(timeout=30)
+        assert not copier.is_alive()
+    finally:
+        stop.set()
+        writer.join(timeout=5)
+    assert store.get_stats(db_path=dest)['pending'] >= 5000
+
+
+def test_cli_pipe(tmp_path, db):
+    _seed(db, 3)
+    target = str(tmp_path / 'target.db')
+    env_src = dict(os.environ, QUEUECTL_DB_PATH=db)
+    env_dst = dict(os.environ, QUEUECTL_DB_PATH=target)
+    exported = subprocess.run([sys.executable, MAIN_PY, 'export', '-', '--state', 'pending'], env=env_src,
+                              cwd=str(tmp_path), capture_output=True, text=True, timeout=60)
+    assert exported.returncode == 0 and 'Exported 2 job(s)' in exported.stderr
+    imported = subprocess.run([sys.executable, MAIN_PY, 'import', '-'], input=exported.stdout, env=env_dst,
+                              cwd=str(tmp_path), capture_output=True, text=True, timeout=60)
+    assert imported.stdout == 'Imported 2 of 2 job(s)\n'
+    assert store.get_stats(db_path=target) == {'pending': 2}
+
+
+def test_processing_jobs_import_as_pending(tmp_path, db):
+    _seed(db, 2)
+    # exported mid-run, while a coordinator held the lease
+    assert store.claim_job(db_path=db)['id'] == 'j1'
+    store.lease_jobs(['j1'], 'w1', db_path=db)
+    path = str(tmp_path / 'jobs.jsonl')
+    assert snapshot.export_jobs(path, states=['processing'], db_path=db) == 1
+
+    other = str(tmp_path / 'other.db')
+    store.init_db(other)
+    assert snapshot.import_jobs(path, db_path=other) == (1, 1)
+    assert store.get_job('j1', db_path=other)['state'] == 'pending'
+    assert store.leased_jobs(db_path=other) == {}
+    # replacing a job that is leased here drops the lease as well
+    store.claim_job(db_path=other)
+    store.lease_jobs(['j1'], 'w2', db_path=other)
+    assert snapshot.import_jobs(path, on_conflict='replace', db_path=other) == (1, 1)
+    assert store.leased_jobs(db_path=other) == {}
+    assert store.claim_job(db_path=other)['id'] == 'j1'
@@ -0,0 +1,182 @@
+"""Conformance tests every storage backend must pass."""
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import job_storage as store
+from storage_backend import MemoryBackend, SQLiteBackend, get_backend
+
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def backend(request, tmp_path):
+    if request.param == 'sqlite':
+        b = SQLiteBackend(str(tmp_path / 'queuectl.db'))
+    else:
+        b = MemoryBackend()
+    b.init()
+    return b
+
+
+def _job(job_id, **kw):
+    job = store.new_job(kw.pop('command', 'echo hi'), job_id=job_id, **kw)
+    # keep created_at strictly increasing so FIFO order is deterministic
+    time.sleep(0.001)
+    return job
+
+
+def test_add_list_get_and_stats(backend):
+    backend.add_job(_job('a'))
+    backend.add_job(_job('b'))
+    assert [j['id'] for j in backend.list_jobs_by_state('pending')] == ['a', 'b']
+    assert [j['id'] for j in backend.list_jobs_by_state()] == ['a', 'b']
+    assert backend.get_job('a')['command'] == 'echo hi'
+    assert backend.get_job('missing') is None
+    assert backend.get_stats() == {'pending': 2}
+    with pytest.raises(Exception):
+        backend.add_job(_job('a'))
+
+
+def test_add_jobs_reports_duplicates(backend):
+    backend.add_job(_job('a'))
+    errs = backend.add_jobs([_job('b'), _job('a'), _job('c')])
+    assert errs[0] is None and errs[1] and errs[2] is None
+    assert backend.get_stats() == {'pending': 3}
+
+
+def test_claim_is_fifo_and_exclusive(backend):
+    for i in range(30):
+        backend.add_job(_job(f'job-{i:02d}'))
+    assert backend.claim_job()['id'] == 'job-00'
+
+    claimed = []
+    lock = threading.Lock()
+
+    def claimer():
+        while True:
+            job = backend.claim_job()
+            if job is None:
+                return
+            with lock:
+                claimed.append(job['id'])
+
+    threads = [threading.Thread(target=claimer) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(claimed) == [f'job-{i:02d}' for i in range(1, 30)]
+    assert backend.get_stats() == {'processing': 30}
+
+
+def test_delayed_jobs_wait_until_due(backend):
+    assert backend.next_pending_run_at() is None
+    due = datetime.utcnow() + timedelta(seconds=0.3)
+    backend.add_job(_job('later', next_run_at=due.isoformat() + 'Z'))
+    assert backend.claim_job() is None
+    assert backend.next_pending_run_at() == due
+    time.sleep(0.35)
+    assert backend.claim_job()['id'] == 'later'
+    backend.add_job(_job('now'))
+    assert backend.next_pending_run_at() == datetime.min
+
+
+def test_fail_retry_dead_and_requeue(backend):
+    backend.add_job(_job('f', max_retries=1))
+    job = backend.claim_job()
+    backend.mark_job_failed(job['id'], job['attempts'], job['max_retries'], backoff_base=1)
+    retried = backend.get_job('f')
+    assert retried['state'] == 'pending' and retried['attempts'] == 1 and retried['next_run_at']
+    assert backend.claim_job() is None
+
+    backend.mark_job_failed('f', 1, 1, backoff_base=1)
+    assert backend.get_job('f')['state'] == 'dead'
+    assert [j['id'] for j in backend.list_jobs_by_state('dead')] == ['f']
+
+    assert backend.retry_dead_job('f') is True
+    assert backend.retry_dead_job('f') is False
+    job = backend.claim_job()
+    assert job['id'] == 'f' and job['attempts'] == 0
+    backend.mark_job_completed('f')
+    assert backend.get_stats() == {'completed': 1}
+
+
+def test_apply_acks(backend):
+    for i in range(3):
+        backend.add_job(_job(f'j{i}', max_retries=0))
+    for _ in range(3):
+        backend.claim_job()
+    backend.apply_acks([
+        {'op': 'completed', 'job_id': 'j0', 'result': {'exit_code': 0, 'output': 'ok\n'}},
+        {'op': 'failed', 'job_id': 'j1', 'attempts': 0, 'max_retries': 0, 'backoff_base': 2,
+         'result': {'exit_code': 7, 'output': '', 'truncated': False}},
+        {'op': 'completed', 'job_id': 'j2'},
+    ])
+    assert backend.get_stats() == {'completed': 2, 'dead': 1}
+    assert backend.get_result('j0')['output'] == 'ok\n'
+    assert backend.get_result('j1')['exit_code'] == 7
+    assert backend.get_result('j2') is None
+
+
+def test_claim_respects_capacity(backend):
+    for job_id, cpus in (('a', 2), ('b', 1), ('c', None)):
+        backend.add_job(_job(job_id, cpus=cpus))
+    total = (2.0, 1024)
+    assert backend.claim_job(free=(1.0, 1024), total=total)['id'] == 'b'
+    assert backend.claim_job(free=(0.0, 1024), total=total)['id'] == 'c'
+    assert backend.claim_job(free=(0.0, 1024), total=total) is None
+    assert backend.claim_job(free=total, total=total)['id'] == 'a'
+    assert backend.claim_job() is None
+
+
+def test_requeue_returns_claimed_job(backend):
+    backend.add_job(_job('a'))
+    assert backend.claim_job()['id'] == 'a'
+    assert backend.requeue_job('a') is True
+    job = backend.get_job('a')
+    assert job['state'] == 'pending' and job['attempts'] == 0
+    assert backend.requeue_job('a') is False
+    assert backend.claim_job()['id'] == 'a'
+
+
+def test_lease_owners_last_while_processing(backend):
+    backend.add_job(_job('a'))
+    backend.add_job(_job('b'))
+    backend.claim_job()
+    backend.lease_jobs(['a', 'b'], 'w1')
+    # b is not processing, so it has no lease to record
+    assert backend.leased_jobs() == {'a': 'w1'}
+    assert 'lease_owner' not in backend.get_job('a')
+    backend.requeue_job('a')
+    assert backend.leased_jobs() == {}
+
+
+def test_get_backend_selection(monkeypatch):
+    monkeypatch.setenv('QUEUECTL_BACKEND', 'memory')
+    assert get_backend() is get_backend('memory')
+    assert isinstance(get_backend(), MemoryBackend)
+    with pytest.raises(ValueError):
+        get_backend('nope')
+
+
+def test_worker_runs_on_memory_backend(tmp_path, monkeypatch):
+    import config
+    import worker as worker_mod
+    monkeypatch.setattr(store, 'DB_PATH', str(tmp_path / 'queuectl.db'))
+    monkeypatch.setattr(config, '_CFG_PATH', str(tmp_path / 'queuectl_config.json'))
+    backend = MemoryBackend()
+    backend.add_job(_job('ok', command='python -c "pass"'))
+    backend.add_job(_job('bad', command='python -c "import sys; sys.exit(3)"', max_retries=0))
+
+    stop = threading.Event()
+    w = worker_mod.Worker(shutdown_event=stop, poll_interval=0.05, backend=backend, idle_waiter=worker_mod.IdleWaiter())
+    w.daemon = True
+    w.start()
+    for _ in range(100):
+        if backend.get_stats() == {'completed': 1, 'dead': 1}:
+            break
+        time.sleep(0.05)
+    stop.set()
+    w.join(timeout=2)
+    assert backend.get_stats() == {'completed': 1, 'dead': 1}
@@ -0,0 +1,206 @@
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+import config
+import job_storage as store
+import job_waiter
+import tenants
+from fast_cli import build_enqueue_job
+from storage_backend import MemoryBackend, SQLiteBackend
+from worker import Worker, _make_fair_scheduler, _record_waits
+
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def backend(request, tmp_path):
+    if request.param == 'sqlite':
+        b = SQLiteBackend(str(tmp_path / 'queuectl.db'))
+    else:
+        b = MemoryBackend()
+    b.init()
+    return b
+
+
+def _add(backend, job_id, tenant=None, **kw):
+    fields = {'tenant': tenant} if tenant else {}
+    backend.add_job(store.new_job('true', job_id=job_id, **fields, **kw))
+    time.sleep(0.001)
+
+
+class _FixedTenants:
+    def __init__(self, active):
+        self.active = active
+
+    def pending_tenants(self):
+        return list(self.active)
+
+
+def test_parse_and_validate():
+    assert tenants.parse_weights('a:4, b') == {'a': 4, 'b': 1}
+    assert tenants.parse_weights({'a': 2}) == {'a': 2}
+    assert tenants.validate_name(None) == 'default'
+    for bad in ('a:0', 'a:x', 'no spaces'):
+        with pytest.raises(ValueError):
+            tenants.parse_weights(bad)
+    with pytest.raises(ValueError):
+        build_enqueue_job(command='true', tenant='bad name')
+    assert build_enqueue_job(command='true', tenant='team-a')['tenant'] == 'team-a'
+
+
+def test_scheduler_follows_weights():
+    fair = tenants.FairScheduler(_FixedTenants(['a', 'b', 'c']), {'a': 3}, refresh=0)
+    served = []
+    for _ in range(50):
+        t = fair.next_tenant()
+        fair.charge(t, t)
+        served.append(t)
+    assert Counter(served) == {'a': 30, 'b': 10, 'c': 10}
+    # one tenant alone: nobody to be fair between
+    assert tenants.FairScheduler(_FixedTenants(['a']), refresh=0).next_tenant() is None
+
+
+def test_scheduler_drops_tenants_without_runnable_jobs():
+    fair = tenants.FairScheduler(_FixedTenants(['a', 'b', 'c']), refresh=60)
+    assert fair.next_tenant() == 'a'
+    # a's jobs turned out to be delayed: the claim served b instead, and b pays for it
+    fair.charge('a', 'b')
+    served = []
+    for _ in range(4):
+        t = fair.next_tenant()
+        fair.charge(t, t)
+        served.append(t)
+    assert served == ['c', 'b', 'c', 'b']
+
+
+def test_claim_prefers_tenant_and_falls_back(backend):
+    _add(backend, 'big-1', 'big')
+    _add(backend, 'big-2', 'big')
+    _add(backend, 'small-1', 'small')
+    _add(backend, 'plain')
+
+    assert backend.claim_job(tenant='small')['id'] == 'small-1'
+    # nothing left for small: the oldest job of anyone instead
+    assert backend.claim_job(tenant='small')['id'] == 'big-1'
+    assert backend.claim_job(tenant='default')['id'] == 'plain'
+    assert backend.get_job('plain')['tenant'] == 'default'
+    assert backend.claim_job(tenant='small', queues=['other']) is None
+
+
+def test_pending_tenants_and_stats(backend):
+    for i in range(3):
+        _add(backend, f'a{i}', 'a')
+    _add(backend, 'b0', 'b')
+    _add(backend, 'c0', 'c')
+    assert sorted(backend.pending_tenants()) == ['a', 'b', 'c']
+
+    backend.claim_job(tenant='a')
+    backend.claim_job(tenant='c')
+    assert sorted(backend.pending_tenants()) == ['a', 'b']
+    stats = backend.get_tenant_stats()
+    assert {t: (s['pending'], s['processing']) for t, s in stats.items()} == {'a': (2, 1), 'b': (1, 0), 'c': (0, 1)}
+    assert stats['a']['waiting_since'] == backend.get_job('a1')['created_at']
+    assert stats['c']['waiting_since'] is None
+
+
+def test_claim_uses_tenant_index(tmp_path):
+    db = str(tmp_path / 'queuectl.db')
+    store.init_db(db)
+    conn = sqlite3.connect(db)
+    # the tenant's turn, then the fallback to anyone: both walked in age order
+    for tenant, index in (('a', 'idx_jobs_state_tenant_created'), (None, 'idx_jobs_state_created')):
+        where, params = store._runnable(store._now_iso(), tenant=tenant)
+        plan = str(conn.execute(f"EXPLAIN QUERY PLAN SELECT id FROM jobs WHERE {where} ORDER BY created_at LIMIT 1",
+                                params).fetchall())
+        assert index in plan and 'TEMP B-TREE' not in plan
+
+
+def test_existing_jobs_migrate_to_default_tenant(tmp_path):
+    db = str(tmp_path / 'old.db')
+    conn = sqlite3.connect(db)
+    conn.execute('CREATE TABLE jobs (id TEXT PRIMARY KEY, command TEXT NOT NULL, state TEXT NOT NULL, '
+                 'attempts INTEGER NOT NULL DEFAULT 0, max_retries INTEGER NOT NULL, created_at TEXT NOT NULL, '
+                 'updated_at TEXT NOT NULL)')
+    conn.execute("INSERT INTO jobs VALUES ('old', 'true', 'pending', 0, 3, 'x', 'x')")
+    conn.commit()
+    conn.close()
+    store.init_db(db)
+    assert store.get_job('old', db_path=db)['tenant'] == 'default'
+    assert store.pending_tenants(db_path=db) == ['default']
+
+
+def test_big_tenant_does_not_starve_small_one(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'DB_PATH', str(tmp_path / 'queuectl.db'))
+    monkeypatch.setattr(config, '_CFG_PATH', str(tmp_path / 'queuectl_config.json'))
+    store.init_db()
+    backend = SQLiteBackend()
+    for i in range(30):
+        _add(backend, f'big-{i}', 'big')
+    for i in range(3):
+        _add(backend, f'small-{i}', 'small')
+
+    served = []
+    real_claim = backend.claim_job
+
+    def recording_claim(**kw):
+        job = real_claim(**kw)
+        if job:
+            served.append(job['tenant'])
+        return job
+
+    monkeypatch.setattr(backend, 'claim_job', recording_claim)
+    fair = _make_fair_scheduler(backend, 'fair')
+    fair.refresh = 0
+    tenants.reset_waits()
+    shutdown = threading.Event()
+    w = Worker(shutdown, poll_interval=0.05, backend=backend, fair_scheduler=fair)
+    w.start()
+    try:
+        assert job_waiter.wait_for('small-2', timeout=10)['state'] == 'completed'
+    finally:
+        shutdown.set()
+        w.join(timeout=5)
+    # served in turns, not after the 30 older jobs of the big tenant
+    assert served[:6].count('small') == 3
+    assert tenants.wait_snapshot()['small']['claims'] == 3
+
+
+def test_fair_policy_is_opt_in(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, '_CFG_PATH', str(tmp_path / 'queuectl_config.json'))
+    backend = MemoryBackend()
+    # existing installs keep claiming oldest-first
+    assert _make_fair_scheduler(backend) is None
+    config.set_config('tenant_weights', 'team-a:4')
+    assert _make_fair_scheduler(backend).weights == {'team-a': 4}
+    assert _make_fair_scheduler(backend, 'fifo') is None
+    config.set_config('tenant_policy', 'fifo')
+    assert _make_fair_scheduler(backend) is None
+    assert _make_fair_scheduler(backend, 'fair') is not None
+
+
+def test_wait_accounting_tolerates_odd_timestamps():
+    tenants.reset_waits()
+    _record_waits([
+        {'created_at': '2020-01-01T00:00:00Z', 'next_run_at': '2020-01-01T02:00:00+02:00', 'tenant': 'a'},
+        {'created_at': 'garbage', 'next_run_at': None, 'tenant': 'b'},
+    ])
+    assert tenants.wait_snapshot()['a']['claims'] == 1
+    assert 'b' not in tenants.wait_snapshot()
+
+
+def test_job_with_offset_run_time_still_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'DB_PATH', str(tmp_path / 'queuectl.db'))
+    monkeypatch.setattr(config, '_CFG_PATH', str(tmp_path / 'queuectl_config.json'))
+    store.init_db()
+    # stored verbatim, as rows written before run times were normalized were
+    store.add_job(store.new_job('true', job_id='offset', next_run_at='2020-01-01T02:00:00+02:00'))
+    shutdown = threading.Event()
+    w = Worker(shutdown, poll_interval=0.05)
+    w.start()
+    try:
+        assert job_waiter.wait_for('offset', timeout=10)['state'] == 'completed'
+    finally:
+        shutdown.set()
+        w.join(timeout=5)
@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+
+import pytest
+
+import batch_runner
+import config
+import job_storage as store
+import job_waiter
+import worker
+from fast_cli import build_enqueue_job
+from worker import IdleWaiter, Worker, _run_shell
+
+
+pytestmark = pytest.mark.skipif(os.name != 'posix', reason='process groups are POSIX only')
+
+
+def _gone(pid, within=3.0):
+    """Whether ``pid`` has exited (a zombie waiting for its reaper counts) within ``within`` seconds."""
+    deadline = time.monotonic() + within
+    while time.monotonic() < deadline:
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                if f.read().rsplit(')', 1)[1].split()[0] == 'Z':
+                    return True
+        except FileNotFoundError:
+            return True
+        except OSError:
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                return True
+        time.sleep(0.05)
+    return False
+
+
+def test_timeout_stops_the_whole_process_group(tmp_path):
+    pidfile = tmp_path / 'pid'
+    started = time.monotonic()
+    rc, _, err, timed_out = _run_shell(f'sleep 30 & echo $! > {pidfile}; wait', timeout=0.5, grace=5)
+    assert (rc, timed_out) == (batch_runner.TIMEOUT_EXIT_CODE, True)
+    assert 'timed out after 0.5s' in err
+    # the shell honoured SIGTERM, so the grace period was not used up
+    assert time.monotonic() - started < 3
+    assert _gone(int(pidfile.read_text()))
+
+
+def test_sigterm_lets_the_job_clean_up_then_sigkill_follows():
+    rc, out, _, timed_out = _run_shell('trap "echo cleanup; exit 3" TERM; sleep 30 & wait', timeout=0.3, grace=5)
+    assert (rc, out, timed_out) == (batch_runner.TIMEOUT_EXIT_CODE, 'cleanup\n', True)
+
+    started = time.monotonic()
+    rc, _, _, timed_out = _run_shell('trap "" TERM; sleep 30', timeout=0.3, grace=0.5)
+    assert timed_out and time.monotonic() - started < 3
+
+
+def test_orphans_are_killed_when_the_job_ends():
+    started = time.monotonic()
+    # left behind holding the job's stdout: would block the worker for 30s
+    rc, out, _, timed_out = _run_shell('sleep 30 & echo $!')
+    assert (rc, timed_out) == (0, False)
+    assert time.monotonic() - started < 5
+    assert _gone(int(out))
+
+    rc, out, _, _ = _run_shell('sleep 30 >/dev/null 2>&1 & echo $!')
+    assert rc == 0 and _gone(int(out))
+
+
+def test_per_job_timeout_validation():
+    assert build_enqueue_job(command='true', job_timeout=2.5)['timeout'] == 2.5
+    for bad in (0, -1):
+        with pytest.raises(ValueError):
+            build_enqueue_job(command='true', job_timeout=bad)
+
+
+def test_per_job_timeout_overrides_config(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'DB_PATH', str(tmp_path / 'queuectl.db'))
+    monkeypatch.setattr(config, '_CFG_PATH', str(tmp_path / 'queuectl_config.json'))
+    store.init_db()
+    config.set_config('job_timeout', 60)
+    store.add_job(store.new_job('echo partial; sleep 30', job_id='slow', max_retries=0, timeout=0.3))
+    store.add_job(store.new_job('exit 3', job_id='failing', max_retries=0))
+
+    shutdown = threading.Event()
+    w = Worker(shutdown, poll_interval=0.05, idle_waiter=IdleWaiter())
+    w.start()
+    try:
+        assert job_waiter.wait_for('slow', timeout=10)['state'] == 'dead'
+        assert job_waiter.wait_for('failing', timeout=10)['state'] == 'dead'
+    finally:
+        shutdown.set()
+        w.join(timeout=5)
+    slow = store.get_result('slow')
+    assert (slow['exit_code'], slow['timed_out'], slow['output']) == (124, True, 'partial\n')
+    failing = store.get_result('failing')
+    assert (failing['exit_code'], failing['timed_out']) == (3, False)
+
+
+def test_orphan_check_without_waitid(monkeypatch):
+    # as on macOS before Python 3.13
+    monkeypatch.delattr(os, 'waitid', raising=False)
+    monkeypatch.setattr(worker, 'ORPHAN_CHECK_SECONDS', 0.1)
+    assert _run_shell('sleep 0.5; echo slow')[:2] == (0, 'slow\n')
+    started = time.monotonic()
+    rc, out, _, timed_out = _run_shell('sleep 30 & echo $!')
+    assert (rc, timed_out) == (0, False)
+    assert time.monotonic() - started < 5
+    assert _gone(int(out))
@@ -0,0 +1,114 @@
+import json
+import os
+import pstats
+import sqlite3
+import threading
+
+import config
+import job_storage as store
+import job_waiter
+import tracing
+from worker import Worker
+
+
+def _run_jobs(tmp_path, monkeypatch, n, **worker_kw):
+    monkeypatch.setattr(store, 'DB_PATH', str(tmp_path / 'queuectl.db'))
+    monkeypatch.setattr(config, '_CFG_PATH', str(tmp_path / 'queuectl_config.json'))
+    store.init_db()
+    ids = [f'job-{i}' for i in range(n)]
+    for job_id in ids:
+        store.add_job(store.new_job('sleep 0.1', job_id=job_id))
+    shutdown = threading.Event()
+    w = Worker(shutdown, poll_interval=0.05, **worker_kw)
+    w.start()
+    try:
+        for job_id in ids:
+            job_waiter.wait_for(job_id, timeout=30)
+    finally:
+        shutdown.set()
+        w.join(timeout=5)
+    return ids
+
+
+def test_jsonl_trace_has_every_phase(tmp_path, monkeypatch):
+    path = str(tmp_path / 'trace.jsonl')
+    tracer = tracing.Tracer(path)
+    ids = _run_jobs(tmp_path, monkeypatch, 3, tracer=tracer)
+    tracer.close()
+
+    records = [json.loads(line) for line in open(path)]
+    assert [r['job_id'] for r in records] == ids
+    for r in records:
+        assert list(r['phases']) == ['claim', 'spawn', 'run', 'log', 'ack']
+        assert r['phases']['run'] >= 100
+        assert r['rc'] == 0
+
+
+def test_chrome_trace_loads(tmp_path, monkeypatch):
+    path = str(tmp_path / 'trace.json')
+    tracer = tracing.Tracer(path)
+    assert tracer.fmt == 'chrome'
+    _run_jobs(tmp_path, monkeypatch, 2, tracer=tracer)
+    tracer.close()
+
+    text = open(path).read().rstrip().rstrip(',') + ']'
+    events = json.loads(text)
+    jobs = [e for e in events if e['name'] == 'job']
+    assert len(jobs) == 2
+    run = next(e for e in events if e['name'] == 'run')
+    assert jobs[0]['ts'] <= run['ts'] and run['dur'] <= jobs[0]['dur']
+
+
+def test_sampled_profiler_dumps(tmp_path, monkeypatch):
+    profile_dir = str(tmp_path / 'prof')
+    profiler = tracing.SampledProfiler(profile_dir, every=2)
+    _run_jobs(tmp_path, monkeypatch, 4, profiler=profiler)
+
+    dumps = os.listdir(profile_dir)
+    assert len(dumps) == 1
+    stats = pstats.Stats(os.path.join(profile_dir, dumps[0]))
+    assert any('_process' in func[2] for func in stats.stats)
+
+
+def test_idle_polls_do_not_use_up_profile_samples(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'DB_PATH', str(tmp_path / 'queuectl.db'))
+    monkeypatch.setattr(config, '_CFG_PATH', str(tmp_path / 'queuectl_config.json'))
+    store.init_db()
+    profiler = tracing.SampledProfiler(str(tmp_path / 'prof'), every=3)
+    sampled = []
+    real_stop = profiler.stop
+    monkeypatch.setattr(profiler, 'stop', lambda: (sampled.append(1), real_stop()))
+    shutdown = threading.Event()
+    w = Worker(shutdown, poll_interval=0.02, profiler=profiler)
+    w.start()
+    try:
+        # a dozen or more empty polls before any work shows up
+        shutdown.wait(0.5)
+        for i in range(3):
+            store.add_job(store.new_job('true', job_id=f'job-{i}'))
+        for i in range(3):
+            job_waiter.wait_for(f'job-{i}', timeout=30)
+    finally:
+        shutdown.set()
+        w.join(timeout=5)
+    assert len(sampled) == 1
+
+
+def test_lock_sleeps_are_attributed_to_the_job(tmp_path):
+    tracer = tracing.Tracer(str(tmp_path / 'trace.jsonl'))
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise sqlite3.OperationalError('database is locked')
+        return 'ok'
+
+    try:
+        trace = tracer.begin()
+        assert store._retry_on_lock(flaky, backoff=0.001) == 'ok'
+        # two jittered sleeps of at most 1ms and 2ms
+        assert 0 < trace.lock_sleep <= 0.003
+    finally:
+        tracer.close()
+    assert store.on_lock_sleep is None
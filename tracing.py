@@ -0,0 +1,178 @@
+"""Per-job phase timings and sampled profiles for ``worker-run --trace/--profile-dir``.
+
+A Worker with a Tracer opens a JobTrace when it starts claiming and marks
+each phase boundary (claim, spawn, run, log, ack); the finished trace is
+written with a single flushed write. A micro-batch (batch_runner.py) is
+traced as one record whose ``job_id`` is the list of its jobs' ids. Workers without a tracer skip all of this behind a
+single ``None`` check per phase, so tracing costs nothing when it is off.
+
+Two output formats:
+
+- ``jsonl``: one object per job, e.g.
+  ``{"job_id": "a", "pid": 1, "thread": "Thread-1", "start": 1700000000.1, "rc": 0,
+  "phases": {"claim": 1.2, "spawn": 3.4, ...}, "lock_sleep": 0.0}`` (milliseconds)
+- ``chrome``: Trace Event Format complete events, one per phase plus an
+  enclosing ``job`` event per thread, loadable in chrome://tracing or
+  Perfetto. The array is left unterminated, which the format allows, so
+  records can be appended by several threads and processes.
+"""
+import json
+import os
+import threading
+import time
+
+import job_storage as store
+
+
+FORMATS = ('jsonl', 'chrome')
+
+
+def format_for(path, fmt=None):
+    """Explicit format, else ``chrome`` for *.json files and ``jsonl`` otherwise."""
+    if fmt:
+        if fmt not in FORMATS:
+            raise ValueError(f"trace format must be one of {', '.join(FORMATS)}")
+        return fmt
+    return 'chrome' if path.endswith('.json') else 'jsonl'
+
+
+class JobTrace:
+    """Phase boundaries of one job on one thread."""
+
+    __slots__ = ('tracer', 'job_id', 'start', 'last', 'phases', 'rc', 'lock_sleep')
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+        self.job_id = None
+        self.start = self.last = time.perf_counter()
+        self.phases = []
+        self.rc = None
+        self.lock_sleep = 0.0
+        tracer._local.trace = self
+
+    def phase(self, name):
+        """Close the phase that ran since the previous mark."""
+        now = time.perf_counter()
+        self.phases.append((name, self.last, now))
+        self.last = now
+
+    def discard(self):
+        """Drop the trace, e.g. after an empty claim."""
+        self.tracer._local.trace = None
+
+    def finish(self):
+        self.tracer._local.trace = None
+        self.tracer.write(self)
+
+
+class Tracer:
+    """Append job traces to ``path``; shared by all worker threads of a process."""
+
+    def __init__(self, path, fmt=None):
+        self.fmt = format_for(path, fmt)
+        self.pid = os.getpid()
+        # perf_counter -> wall clock, for absolute timestamps
+        self._offset = time.time() - time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._file = open(path, 'a', encoding='utf-8')
+        if self.fmt == 'chrome' and self._file.tell() == 0:
+            self._file.write('[\n')
+        self._prev_hook = store.on_lock_sleep
+        store.on_lock_sleep = self._lock_sleep
+
+    def _lock_sleep(self, seconds):
+        trace = getattr(self._local, 'trace', None)
+        if trace is not None:
+            trace.lock_sleep += seconds
+
+    def begin(self):
+        return JobTrace(self)
+
+    def _lines(self, trace):
+        thread = threading.current_thread()
+        if self.fmt == 'jsonl':
+            yield json.dumps({
+                'job_id': trace.job_id,
+                'pid': self.pid,
+                'thread': thread.name,
+                'start': round(self._offset + trace.start, 6),
+                'rc': trace.rc,
+                'phases': {name: round((end - begin) * 1000, 3) for name, begin, end in trace.phases},
+                'lock_sleep': round(trace.lock_sleep * 1000, 3),
+            })
+            return
+        tid = thread.ident
+        end = trace.phases[-1][2] if trace.phases else trace.last
+        spans = [('job', trace.start, end)] + trace.phases
+        for name, begin, finish in spans:
+            event = {
+                'name': name, 'ph': 'X', 'pid': self.pid, 'tid': tid,
+                'ts': round((self._offset + begin) * 1e6), 'dur': round((finish - begin) * 1e6),
+            }
+            if name == 'job':
+                event['args'] = {'job_id': trace.job_id, 'rc': trace.rc, 'lock_sleep_ms': round(trace.lock_sleep * 1000, 3)}
+            yield json.dumps(event) + ','
+
+    def write(self, trace):
+        text = '\n'.join(self._lines(trace)) + '\n'
+        with self._lock:
+            self._file.write(text)
+            self._file.flush()
+
+    def close(self):
+        if store.on_lock_sleep == self._lock_sleep:
+            store.on_lock_sleep = self._prev_hook
+        with self._lock:
+            self._file.close()
+
+
+class SampledProfiler:
+    """cProfile every ``every``-th job of each worker thread.
+
+    Only loop iterations that claimed work are counted, and a sample covers
+    the job from its claim returning to its ack.
+
+    Each thread accumulates its samples in its own profile (cProfile only sees
+    the thread that enabled it) and dumps it to
+    ``<directory>/worker-<pid>-<thread>.prof`` every ``dump_every`` samples
+    and when the thread exits; inspect with ``python -m pstats``."""
+
+    def __init__(self, directory, every=100, dump_every=20):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.every = max(1, int(every))
+        self.dump_every = dump_every
+        self._local = threading.local()
+
+    def _state(self):
+        state = getattr(self._local, 'state', None)
+        if state is None:
+            import cProfile
+            state = self._local.state = {'profile': cProfile.Profile(), 'seen': 0, 'sampled': 0}
+        return state
+
+    def start(self):
+        """Maybe start profiling the current job; returns True if sampled."""
+        state = self._state()
+        state['seen'] += 1
+        if state['seen'] % self.every:
+            return False
+        state['profile'].enable()
+        return True
+
+    def stop(self):
+        state = self._state()
+        state['profile'].disable()
+        state['sampled'] += 1
+        if state['sampled'] % self.dump_every == 0:
+            self.dump()
+
+    def dump(self):
+        state = getattr(self._local, 'state', None)
+        if state is None or not state['sampled']:
+            return None
+        name = threading.current_thread().name.replace(os.sep, '_')
+        path = os.path.join(self.directory, f'worker-{os.getpid()}-{name}.prof')
+        state['profile'].dump_stats(path)
+        return path
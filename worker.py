@@ -1,86 +1,582 @@
+import os
+import sys
 import threading
 import time
+from datetime import datetime
 import subprocess
 import signal
-import os
 from multiprocessing import Process
 
-import job_storage as store
+import batch_runner
+import log_store
 import config
+import contention
+import job_storage as store
+import job_waiter
+import resources
+import retry_policy
+import tenants
+from ack_writer import AckWriter
+from scheduler import Scheduler
+from storage_backend import SQLiteBackend, get_backend
+
+
+# how often a running job is checked for having exited while leaving
+# processes behind that still hold its output pipes
+ORPHAN_CHECK_SECONDS = 1.0
+
+
+class IdleWaiter:
+    """Idle sleep shared by the worker threads of one process.
+
+    After an empty claim a worker sleeps until the earliest pending job's
+    next_run_at (delayed, scheduled or backed-off jobs), capped at the poll
+    interval so jobs enqueued by other processes are still noticed. The
+    earliest time comes from a read-only indexed MIN query that one thread
+    runs on behalf of all of them, so an idle pool issues no write
+    transactions between due times. notify() wakes every sleeper, e.g. after
+    an in-process enqueue or reschedule.
+    """
+
+    # back-off when a job looks due but the claim came back empty (someone else won it)
+    RECHECK_DELAY = 0.05
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._generation = 0
+        self._query_lock = threading.Lock()
+        self._deadline = None
+        self._fetched_at = None
+
+    def notify(self):
+        with self._cond:
+            self._generation += 1
+            self._fetched_at = None
+            self._cond.notify_all()
+
+    def _earliest(self, backend, max_age, queues=None):
+        with self._query_lock:
+            now = time.monotonic()
+            if self._fetched_at is not None and now - self._fetched_at < max_age:
+                return self._deadline
+            try:
+                self._deadline = backend.next_pending_run_at(queues) if queues else backend.next_pending_run_at()
+            except Exception:
+                # fall back to plain polling
+                self._deadline = None
+            self._fetched_at = now
+            return self._deadline
+
+    def due_now(self, backend, max_age, queues=None):
+        """True if some pending job (of ``queues``) is runnable right now (cached like wait())."""
+        deadline = self._earliest(backend, max_age, queues)
+        return deadline is not None and deadline <= datetime.utcnow()
+
+    def wait(self, shutdown_event, poll_interval, backend, queues=None):
+        with self._cond:
+            generation = self._generation
+        timeout = poll_interval
+        deadline = self._earliest(backend, poll_interval, queues)
+        if deadline is not None:
+            remaining = (deadline - datetime.utcnow()).total_seconds()
+            if remaining <= 0:
+                with self._query_lock:
+                    self._fetched_at = None
+                timeout = min(poll_interval, self.RECHECK_DELAY)
+            else:
+                timeout = min(poll_interval, remaining)
+        with self._cond:
+            if self._generation == generation and not shutdown_event.is_set():
+                self._cond.wait(timeout)
+
+
+_idle_waiter = IdleWaiter()
+
+# claim pacing shared by the worker threads of one process
+_claim_throttle = contention.ClaimThrottle()
 
 
 class Worker(threading.Thread):
-    def __init__(self, shutdown_event, poll_interval=1.0):
+    def __init__(self, shutdown_event, poll_interval=1.0, ack_writer=None, idle_waiter=None, backend=None,
+                 resource_pool=None, enforce_limits=False, tracer=None, profiler=None, claim_throttle=None,
+                 queue_selector=None, batch_size=None, fair_scheduler=None):
         super().__init__()
+        self.backend = backend or get_backend()
         self.shutdown_event = shutdown_event
         self.poll_interval = poll_interval
+        # optional AckWriter shared by all threads of this process
+        self.ack_writer = ack_writer
+        self.idle_waiter = idle_waiter or _idle_waiter
+        # optional ResourcePool shared by all threads of this process
+        self.resource_pool = resource_pool
+        # apply memory requests to the child as RLIMIT_AS
+        self.enforce_limits = enforce_limits
+        # optional tracing.Tracer / tracing.SampledProfiler (worker-run --trace / --profile-dir)
+        self.tracer = tracer
+        self.profiler = profiler
+        self.claim_throttle = claim_throttle or _claim_throttle
+        # optional queues.QueueSelector shared by all threads of this process; None takes every queue
+        self.queue_selector = queue_selector
+        self.queues = list(queue_selector.weights) if queue_selector is not None else None
+        # claim batchable jobs this many at a time and run them in one shell (see batch_runner.py)
+        self.batch_size = batch_size if batch_size and batch_size > 0 and batch_runner.supported() else None
+        self.batch_runner = None
+        # optional tenants.FairScheduler shared by all threads of this process; None claims oldest-first
+        self.fair_scheduler = fair_scheduler
+
+    def _claim_batch(self, order):
+        if order is None:
+            return self.backend.claim_batch(self.batch_size)
+        return self.backend.claim_batch(self.batch_size, queues=order)
+
+    def _claim(self, order, tenant=None):
+        kwargs = {}
+        if order is not None:
+            kwargs['queues'] = order
+        if tenant is not None:
+            kwargs['tenant'] = tenant
+        if self.resource_pool is None:
+            return self.backend.claim_job(**kwargs)
+        return self.resource_pool.claim(lambda free, total: self.backend.claim_job(free=free, total=total, **kwargs),
+                                        lambda job: self.backend.requeue_job(job['id']))
 
     def run(self):
+        try:
+            self._loop()
+        finally:
+            if self.batch_runner is not None:
+                self.batch_runner.close()
+            if self.profiler is not None:
+                self.profiler.dump()
+
+    def _loop(self):
         while not self.shutdown_event.is_set():
-            job = store.claim_job()
-            if not job:
-                # nothing to do; wait a bit
-                self.shutdown_event.wait(self.poll_interval)
+            pause = self.claim_throttle.delay()
+            if pause and self.shutdown_event.wait(pause):
+                break
+            trace = self.tracer.begin() if self.tracer is not None else None
+            token = self.claim_throttle.start()
+            order = self.queue_selector.order() if self.queue_selector is not None else None
+            tenant = self.fair_scheduler.next_tenant() if self.fair_scheduler is not None else None
+            try:
+                # batchable jobs first, so a batch worker still runs everything else one by one
+                batch = self._claim_batch(order) if self.batch_size else None
+                job = None if batch else self._claim(order, tenant)
+            except Exception as e:
+                # counted by contention; a busy DB is paced by the throttle, anything else by the poll interval
+                self.claim_throttle.after(token, failed=True)
+                if trace is not None:
+                    trace.discard()
+                if not isinstance(e, store.DatabaseBusy):
+                    self.shutdown_event.wait(self.poll_interval)
                 continue
-
-            job_id = job['id']
-            cmd = job['command']
-            attempts = job.get('attempts', 0)
-            max_retries = job.get('max_retries', 3)
-
-            # run the command in a shell, capture output and apply timeout
-            timeout_val = config.get_config('job_timeout')
-            if not timeout_val:
-                timeout_val = None
+            self.claim_throttle.after(token)
+            if tenant is not None and not batch:
+                self.fair_scheduler.charge(tenant, job['tenant'] if job else None)
+            if not batch and not job:
+                if trace is not None:
+                    trace.discard()
+                if (self.resource_pool is not None and self.resource_pool.busy()
+                        and self.idle_waiter.due_now(self.backend, self.poll_interval, self.queues)):
+                    # runnable jobs exist but none fit; wait for a running one to free capacity
+                    self.resource_pool.wait(self.shutdown_event, self.poll_interval)
+                else:
+                    # nothing to do; sleep until the next job is due (or poll_interval)
+                    self.idle_waiter.wait(self.shutdown_event, self.poll_interval, self.backend, self.queues)
+                continue
+            # only iterations that got work count towards the sampling rate,
+            # so idle polls neither use up nor dilute the profile
+            profiled = self.profiler is not None and self.profiler.start()
             try:
-                proc = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=timeout_val)
-                rc = proc.returncode
-                out = proc.stdout
-                err = proc.stderr
-            except subprocess.TimeoutExpired as e:
-                rc = 1
-                out = getattr(e, 'stdout', '') or ''
-                err = getattr(e, 'stderr', '') or ''
+                _record_waits(batch or [job])
+                if trace is not None:
+                    trace.job_id = [j['id'] for j in batch] if batch else job['id']
+                    trace.phase('claim')
+                if batch:
+                    self._process_batch(batch, trace)
+                else:
+                    self._process(job, trace)
             except Exception as e:
-                rc = 1
-                out = ''
-                err = str(e)
+                # typically an ack that could not be written; nothing restarts a dead worker thread
+                self._abandon(batch or [job], e)
+            finally:
+                if self.resource_pool is not None and job:
+                    self.resource_pool.release(job)
+                if profiled:
+                    self.profiler.stop()
+                if trace is not None:
+                    trace.finish()
 
-            # store outputs to a simple log file per job (append)
+    def _abandon(self, jobs, error):
+        """Report jobs whose run could not be recorded and hand them back to run again."""
+        ids = ', '.join(j['id'] for j in jobs)
+        print(f'Worker {self.name}: could not record the outcome of job {ids}: {error}; requeueing', file=sys.stderr)
+        for job in jobs:
             try:
-                log_dir = os.path.join(os.getcwd(), 'job_logs')
-                os.makedirs(log_dir, exist_ok=True)
-                with open(os.path.join(log_dir, f"{job_id}.log"), 'a', encoding='utf-8') as f:
-                    f.write(f"--- {time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())} attempt={attempts+1} rc={rc}\n")
-                    if out:
-                        f.write("OUT:\n" + out + "\n")
-                    if err:
-                        f.write("ERR:\n" + err + "\n")
+                # a no-op if the ack landed after all; if this fails too, a
+                # remote job's lease expires instead
+                self.backend.requeue_job(job['id'])
             except Exception:
-                # don't fail job for logging issues
                 pass
+        self.shutdown_event.wait(self.poll_interval)
+
+    def _process(self, job, trace=None):
+        """Run one claimed job and ack it; ``trace`` (a tracing.JobTrace) gets its phases marked."""
+        job_id = job['id']
+        cmd = job['command']
+        attempts = job.get('attempts', 0)
+        max_retries = job.get('max_retries', 3)
 
-            if rc == 0:
-                store.mark_job_completed(job_id)
+        # run the command in a shell, capture output and apply timeout
+        timeout_val = _job_timeout(job)
+        preexec = None
+        if self.enforce_limits and os.name == 'posix':
+            preexec = resources.limit_child(job.get('memory_mb'))
+        timed_out = False
+        try:
+            rc, out, err, timed_out = _run_shell(cmd, timeout_val, float(config.get_config('job_kill_grace')),
+                                                 preexec, trace)
+        except Exception as e:
+            rc = 1
+            out = ''
+            err = str(e)
+        if trace is not None:
+            trace.rc = rc
+            trace.phase('run')
+
+        # append outputs to the segmented log store
+        try:
+            log_store.get_default().append(job_id, attempts + 1, log_store.format_record(attempts + 1, rc, out, err))
+        except Exception:
+            # don't fail job for logging issues
+            pass
+        if trace is not None:
+            trace.phase('log')
+
+        if self.ack_writer is not None:
+            acks = self.ack_writer
+            complete = acks.completed
+        else:
+            acks = self.backend
+            complete = acks.mark_job_completed
+        result = _job_result(rc, out, timed_out)
+        if rc == 0:
+            complete(job_id, result=result)
+        else:
+            policy = retry_policy.resolve(job.get('retry_policy'))
+            backoff_base = config.get_config('backoff_base')
+            delay = retry_policy.next_delay(policy, attempts + 1, job.get('last_retry_delay'))
+            retryable = retry_policy.is_retryable(policy, rc)
+            fail = acks.failed if acks is self.ack_writer else acks.mark_job_failed
+            fail(job_id, attempts, max_retries, backoff_base=backoff_base, delay=delay, retryable=retryable,
+                 result=result)
+        if self.ack_writer is None:
+            # the AckWriter wakes `enqueue --wait` callers itself once its batch commits
+            job_waiter.notify([job_id])
+        if trace is not None:
+            trace.phase('ack')
+        if rc != 0:
+            # the retry may be due before whatever the idle threads are sleeping towards
+            self.idle_waiter.notify()
+
+
+    def _process_batch(self, jobs, trace=None):
+        """Run claimed batchable jobs one after another in this thread's shell, then log and ack them together."""
+        if self.batch_runner is None:
+            self.batch_runner = batch_runner.ShellRunner()
+        grace = float(config.get_config('job_kill_grace'))
+        runs = []
+        for job in jobs:
+            rc, out, err = self.batch_runner.run(job['command'], _job_timeout(job), grace)
+            runs.append((job, (rc, out, err), self.batch_runner.timed_out))
+        if trace is not None:
+            trace.rc = next((rc for _, (rc, _, _), _ in runs if rc != 0), 0)
+            trace.phase('run')
+
+        try:
+            log_store.get_default().append_many([
+                (job['id'], job.get('attempts', 0) + 1, log_store.format_record(job.get('attempts', 0) + 1, rc, out, err))
+                for job, (rc, out, err), _ in runs
+            ])
+        except Exception:
+            # don't fail jobs for logging issues
+            pass
+        if trace is not None:
+            trace.phase('log')
+
+        acks = [_ack_for(job, rc, out, timed_out) for job, (rc, out, _), timed_out in runs]
+        if self.ack_writer is not None:
+            if self.ack_writer.durable:
+                self.ack_writer.committer.submit_many(acks)
             else:
-                store.mark_job_failed(job_id, attempts, max_retries, backoff_base=config.get_config('backoff_base'))
+                for ack in acks:
+                    self.ack_writer.committer.submit(ack, wait=False)
+        else:
+            self.backend.apply_acks(acks)
+            job_waiter.notify([job['id'] for job in jobs])
+        if trace is not None:
+            trace.phase('ack')
+        if any(a['op'] == 'failed' for a in acks):
+            self.idle_waiter.notify()
+
+
+def _ack_for(job, rc, out, timed_out=False):
+    """apply_acks entry for one run of ``job``, with the same retry accounting as Worker._process."""
+    result = _job_result(rc, out, timed_out)
+    if rc == 0:
+        return {'op': 'completed', 'job_id': job['id'], 'result': result}
+    policy = retry_policy.resolve(job.get('retry_policy'))
+    attempts = job.get('attempts', 0)
+    return {
+        'op': 'failed', 'job_id': job['id'], 'attempts': attempts, 'max_retries': job.get('max_retries', 3),
+        'backoff_base': config.get_config('backoff_base'),
+        'delay': retry_policy.next_delay(policy, attempts + 1, job.get('last_retry_delay')),
+        'retryable': retry_policy.is_retryable(policy, rc), 'result': result,
+    }
+
+def _record_waits(jobs):
+    """Count how long each claimed job had been runnable, per tenant (see tenants.py)."""
+    now = datetime.utcnow()
+    for job in jobs:
+        # parse both: the later of the two is when the job became runnable
+        times = [store.parse_iso(job.get('created_at')), store.parse_iso(job.get('next_run_at'))]
+        times = [t for t in times if t is not None]
+        if not times:
+            continue
+        try:
+            wait = max(0.0, (now - max(times)).total_seconds())
+        except (TypeError, OverflowError):
+            # stats only: never let an odd timestamp stop the job from running
+            continue
+        tenants.record_wait(job.get('tenant') or tenants.DEFAULT_TENANT, wait)
+
+
+def _job_result(rc, out, timed_out=False):
+    """Result record for the job_results store: exit code plus stdout capped at result_max_bytes."""
+    if isinstance(out, bytes):
+        out = out.decode('utf-8', 'replace')
+    out = out or ''
+    cap = config.get_config('result_max_bytes')
+    data = out.encode('utf-8', 'replace')
+    truncated = len(data) > cap
+    if truncated:
+        out = data[:cap].decode('utf-8', 'ignore')
+    return {'exit_code': rc, 'output': out, 'truncated': truncated, 'timed_out': bool(timed_out)}
+
+
+def _job_timeout(job):
+    """Run time limit of ``job`` in seconds (its own, else job_timeout config), or None."""
+    return float(job.get('timeout') or config.get_config('job_timeout') or 0) or None
+
+
+def _signal_group(proc, sig):
+    """Send ``sig`` to the job's process group (just the shell where there are no sessions)."""
+    try:
+        if os.name == 'posix':
+            os.killpg(proc.pid, sig)
+        else:
+            proc.kill()
+    except OSError:
+        # the group is already gone
+        pass
+
+
+def _shell_exited(proc):
+    """Whether the job's shell has exited, without reaping it where waitid() allows.
+
+    Reaping is harmless here otherwise: this is only asked while something
+    still holds the job's pipes, and while any member of the group lives
+    its id cannot be handed out again, so killing the group stays safe."""
+    if os.name != 'posix' or not hasattr(os, 'waitid') or not hasattr(os, 'WNOWAIT'):
+        # e.g. macOS before Python 3.13
+        return proc.poll() is not None
+    try:
+        return os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None
+    except ChildProcessError:
+        return True
+
+
+def _collect(proc, timeout):
+    """Rest of the job's output; (None, None) if something still holds its pipes after ``timeout``."""
+    try:
+        return proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return None, None
+
+
+def _run_shell(cmd, timeout=None, grace=5.0, preexec=None, trace=None):
+    """Run ``cmd`` with the shell in a session of its own; returns (rc, stdout, stderr, timed_out).
+
+    The shell and everything it starts share one process group. Past
+    ``timeout`` seconds the group gets SIGTERM and, if anything is left
+    ``grace`` seconds later, SIGKILL; the job then exits with
+    batch_runner.TIMEOUT_EXIT_CODE. Processes the job leaves behind are killed when it
+    ends: straight away if they keep its output pipes open (which would
+    block this thread), and in any case once the shell has been reaped."""
+    # Popen + communicate rather than subprocess.run so that spawning and
+    # running can be timed separately
+    proc = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                            preexec_fn=preexec, start_new_session=os.name == 'posix')
+    if trace is not None:
+        trace.phase('spawn')
+    deadline = None if timeout is None else time.monotonic() + timeout
+    timed_out = orphans_killed = False
+    with proc:
+        while True:
+            wait = ORPHAN_CHECK_SECONDS
+            if deadline is not None:
+                wait = min(wait, max(0.0, deadline - time.monotonic()))
+            try:
+                out, err = proc.communicate(timeout=wait)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+            if deadline is not None and time.monotonic() >= deadline:
+                timed_out = True
+                _signal_group(proc, signal.SIGTERM)
+                out, err = _collect(proc, grace)
+                if out is None:
+                    _signal_group(proc, signal.SIGKILL)
+                    # a process that escaped into its own session may still hold the pipes
+                    out, err = _collect(proc, grace)
+                break
+            if _shell_exited(proc):
+                if orphans_killed:
+                    out = err = None
+                    break
+                # the job is over; what it started in the background must not keep this thread
+                _signal_group(proc, signal.SIGKILL)
+                orphans_killed = True
+        if out is None:
+            proc.stdout.close()
+            proc.stderr.close()
+            proc.wait()
+            out, err = '', 'output lost: a process outside the job\'s process group kept its pipes open\n'
+        # background processes that let go of the pipes but are still running
+        _signal_group(proc, signal.SIGKILL)
+    if timed_out:
+        err += f'queuectl: timed out after {timeout:g}s\n'
+        return batch_runner.TIMEOUT_EXIT_CODE, out, err, True
+    return proc.returncode, out, err, False
+
+
+def _make_backend(coordinator=None, lease_batch=1):
+    """The configured storage backend, or a RemoteBackend for worker-run --coordinator."""
+    if not coordinator:
+        return get_backend()
+    from coordinator import RemoteBackend
+    return RemoteBackend(coordinator, lease_batch=lease_batch)
+
+
+def _make_ack_writer(group_acks, backend=None):
+    if not group_acks:
+        return None
+    return AckWriter(
+        backend=backend or get_backend(),
+        max_batch=int(config.get_config('ack_batch_size')),
+        max_wait=float(config.get_config('ack_batch_ms')) / 1000.0,
+        durable=bool(config.get_config('ack_durable')),
+    )
+
+
+def _make_resource_pool(cpus=None, memory_mb=None, share=1):
+    """Capacity of one worker process: explicit values, else worker_cpus/worker_memory_mb
+    from config, else the whole host - split evenly across ``share`` processes."""
+    cpus = cpus or float(config.get_config('worker_cpus')) or resources.detect_cpus()
+    memory_mb = memory_mb or int(config.get_config('worker_memory_mb')) or resources.detect_memory_mb()
+    return resources.ResourcePool(cpus / share, memory_mb / share)
+
+
+def _make_queue_selector(queues=None):
+    """QueueSelector for a {name: weight} subscription, or None to take jobs from every queue."""
+    if not queues:
+        return None
+    from queues import QueueSelector
+    return QueueSelector(queues)
+
+
+def _make_fair_scheduler(backend, tenant_policy=None):
+    """FairScheduler for the ``fair`` tenant policy, or None for oldest-first.
+
+    The policy defaults to the tenant_policy config; left unset, configuring
+    tenant_weights opts in to fair claiming."""
+    policy = tenant_policy or config.get_config('tenant_policy')
+    weights = tenants.configured_weights()
+    if policy != 'fair' and (policy or not weights):
+        return None
+    return tenants.FairScheduler(backend, weights)
+
+
+def _make_tracing(trace=None, trace_format=None, profile_dir=None, profile_every=100):
+    """(Tracer or None, SampledProfiler or None) for worker-run --trace / --profile-dir."""
+    if not trace and not profile_dir:
+        return None, None
+    import tracing
+    tracer = tracing.Tracer(trace, trace_format) if trace else None
+    profiler = tracing.SampledProfiler(profile_dir, every=profile_every) if profile_dir else None
+    return tracer, profiler
+
+
+def _start_publisher(shutdown, checkpointer=None):
+    """Publish this process's lock-contention counters for `queuectl contention`."""
+    def _throttle():
+        extra = {'claim_pause': _claim_throttle.pause, 'saturated_claims': _claim_throttle.saturated,
+                 'tenant_waits': tenants.wait_snapshot()}
+        if checkpointer is not None:
+            extra['checkpoints'] = checkpointer.snapshot()
+        return extra
+    return contention.start_publisher(shutdown, _throttle)
+
+
+def _start_checkpointer(shutdown, backend):
+    """WalCheckpointer for a local SQLite DB, unless wal_checkpoint_seconds is 0."""
+    interval = float(config.get_config('wal_checkpoint_seconds') or 0)
+    if interval <= 0 or not isinstance(backend, SQLiteBackend):
+        return None
+    from checkpointer import WalCheckpointer
+    cp = WalCheckpointer(shutdown, interval=interval, max_bytes=int(config.get_config('wal_max_bytes')),
+                         db_path=backend.db_path)
+    cp.start()
+    return cp
+
+
+def _start_scheduler(shutdown):
+    sched = Scheduler(shutdown_event=shutdown, misfire_grace=float(config.get_config('schedule_misfire_grace')),
+                      on_fire=_idle_waiter.notify)
+    sched.start()
+    return sched
 
 
-def _run_foreground(count=1, poll_interval=1.0):
+def _run_foreground(count=1, poll_interval=1.0, group_acks=False, scheduler=True, cpus=None, memory_mb=None,
+                    enforce_limits=False, tracing=None, coordinator=None, lease_batch=None, queues=None, batch_size=None,
+                    tenant_policy=None):
     shutdown = threading.Event()
+    backend = _make_backend(coordinator, lease_batch or count)
+    fair = _make_fair_scheduler(backend, tenant_policy)
+    ack_writer = _make_ack_writer(group_acks, backend)
+    pool = _make_resource_pool(cpus, memory_mb)
+    tracer, profiler = _make_tracing(**(tracing or {}))
+    selector = _make_queue_selector(queues)
 
     def handle_sigint(sig, frame):
         shutdown.set()
+        _idle_waiter.notify()
 
     signal.signal(signal.SIGINT, handle_sigint)
     signal.signal(signal.SIGTERM, handle_sigint)
 
     threads = []
     for i in range(count):
-        w = Worker(shutdown_event=shutdown, poll_interval=poll_interval)
+        w = Worker(shutdown_event=shutdown, poll_interval=poll_interval, ack_writer=ack_writer, backend=backend,
+                   resource_pool=pool, enforce_limits=enforce_limits, tracer=tracer, profiler=profiler,
+                   queue_selector=selector, batch_size=batch_size, fair_scheduler=fair)
         w.daemon = True
         w.start()
         threads.append(w)
+    if scheduler:
+        _start_scheduler(shutdown)
+    checkpointer = None if coordinator else _start_checkpointer(shutdown, backend)
+    publisher = _start_publisher(shutdown, checkpointer)
 
     try:
         while not shutdown.is_set():
@@ -90,29 +586,87 @@ def _run_foreground(count=1, poll_interval=1.0):
 
     for t in threads:
         t.join()
+    if ack_writer is not None:
+        ack_writer.close()
+    if coordinator:
+        backend.close()
+    if tracer is not None:
+        tracer.close()
+    publisher.join(timeout=5)
 
 
-def _run_process_worker(poll_interval=1.0):
+def _run_process_worker(poll_interval=1.0, group_acks=False, cpus=None, memory_mb=None, share=1, enforce_limits=False,
+                        tracing=None, coordinator=None, lease_batch=None, queues=None, batch_size=None,
+                        tenant_policy=None):
     # helper run loop for a single process worker (used by Process target)
     shutdown = threading.Event()
-    w = Worker(shutdown_event=shutdown, poll_interval=poll_interval)
+    backend = _make_backend(coordinator, lease_batch or 1)
+    ack_writer = _make_ack_writer(group_acks, backend)
+    tracer, profiler = _make_tracing(**(tracing or {}))
+    w = Worker(shutdown_event=shutdown, poll_interval=poll_interval, ack_writer=ack_writer, backend=backend,
+               resource_pool=_make_resource_pool(cpus, memory_mb, share), enforce_limits=enforce_limits,
+               tracer=tracer, profiler=profiler, queue_selector=_make_queue_selector(queues), batch_size=batch_size,
+               fair_scheduler=_make_fair_scheduler(backend, tenant_policy))
     w.daemon = False
     w.start()
+    publisher = _start_publisher(shutdown)
     try:
         while True:
             time.sleep(0.5)
     except KeyboardInterrupt:
         shutdown.set()
         w.join()
+        publisher.join(timeout=5)
+        if ack_writer is not None:
+            ack_writer.close()
+        if coordinator:
+            backend.close()
+        if tracer is not None:
+            tracer.close()
 
 
-def start_workers(count=1, poll_interval=1.0, use_processes=False):
+def start_workers(count=1, poll_interval=1.0, use_processes=False, group_acks=False, scheduler=True,
+                  cpus=None, memory_mb=None, enforce_limits=None, tracing=None, coordinator=None, lease_batch=None,
+                  queues=None, batch_size=None, tenant_policy=None):
     """Start worker(s). If use_processes is True, spawn separate processes (one per worker).
-    Otherwise spawn threads in the current process."""
+    Otherwise spawn threads in the current process. With group_acks, job completions
+    and failures are batched through an AckWriter per process. With scheduler, a
+    Scheduler thread materializes recurring schedules into jobs. Jobs are only
+    started while their cpus/memory_mb requests fit the capacity (cpus,
+    memory_mb, default: config or the host), which is split across processes;
+    enforce_limits applies memory requests as rlimits. tracing holds the
+    keyword arguments of _make_tracing (trace file/format, profile directory
+    and sampling rate). With coordinator (host:port) jobs are leased from a
+    coordinator.Coordinator, lease_batch (default: one per thread) at a time,
+    instead of the local DB, and no scheduler runs here. queues ({name: weight})
+    subscribes the workers to those queues only (see queues.py). batch_size
+    claims batchable jobs that many at a time and runs them in one long-lived
+    shell per thread (see batch_runner.py). tenant_policy ('fair' or 'fifo',
+    default: config, else fair only when tenant_weights are set) chooses
+    between weighted fair claiming across tenants and plain oldest-first
+    (see tenants.py). Against a local SQLite DB a
+    WalCheckpointer keeps the write-ahead log small (see checkpointer.py)."""
+    if enforce_limits is None:
+        enforce_limits = bool(config.get_config('enforce_resource_limits'))
+    if coordinator:
+        # schedules live in the coordinator's DB
+        scheduler = False
     if use_processes and count > 1:
+        shutdown = threading.Event()
+        if scheduler:
+            _start_scheduler(shutdown)
+        # one checkpointer for the whole process tree, in the parent
+        checkpointer = None if coordinator else _start_checkpointer(shutdown, get_backend())
+        _start_publisher(shutdown, checkpointer)
+        if tracing and tracing.get('trace'):
+            # create the file (and Chrome trace header) once, before the children append to it
+            _make_tracing(tracing['trace'], tracing.get('trace_format'))[0].close()
         procs = []
         for i in range(count):
-            p = Process(target=_run_process_worker, args=(poll_interval,), daemon=False)
+            p = Process(target=_run_process_worker,
+                        args=(poll_interval, group_acks, cpus, memory_mb, count, enforce_limits, tracing,
+                              coordinator, lease_batch, queues, batch_size, tenant_policy),
+                        daemon=False)
             p.start()
             procs.append(p)
 
@@ -127,8 +681,12 @@ def start_workers(count=1, poll_interval=1.0, use_processes=False):
                 except Exception:
                     pass
         finally:
+            shutdown.set()
             for p in procs:
                 p.join()
     else:
         # single-process threaded workers
-        _run_foreground(count=count, poll_interval=poll_interval)
+        _run_foreground(count=count, poll_interval=poll_interval, group_acks=group_acks, scheduler=scheduler,
+                        cpus=cpus, memory_mb=memory_mb, enforce_limits=enforce_limits, tracing=tracing,
+                        coordinator=coordinator, lease_batch=lease_batch, queues=queues, batch_size=batch_size,
+                        tenant_policy=tenant_policy)